@@ -0,0 +1,116 @@
+# benchmarks/bench_http_clients.py
+"""
+Per-call latency of a fresh connection per request (the old requests.post path)
+versus the pooled keep-alive session the backends now share.
+
+    python benchmarks/bench_http_clients.py                      # local HTTP server
+    python benchmarks/bench_http_clients.py --url https://api.openai.com/v1/models \
+        --header "Authorization: Bearer $OPENAI_API_KEY" --method GET
+
+Against a real HTTPS endpoint the difference includes the TLS handshake.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from flashcard_lingua.backends.common import pooled_adapter  # noqa: E402
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    payload = b"\0" * 16384
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+    do_POST = _reply
+    do_GET = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def _measure(call, n: int, workers: int):
+    lat = []
+    lock = threading.Lock()
+
+    def one(_):
+        t0 = time.perf_counter()
+        r = call()
+        r.content
+        dt = time.perf_counter() - t0
+        with lock:
+            lat.append(dt)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(n)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "mean_ms": 1000 * statistics.mean(lat),
+        "p50_ms": 1000 * lat[len(lat) // 2],
+        "p95_ms": 1000 * lat[int(len(lat) * 0.95) - 1],
+        "calls_per_s": n / wall,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="Endpoint to call (default: a local test server)")
+    ap.add_argument("--method", default="POST", choices=["GET", "POST"])
+    ap.add_argument("--header", action="append", default=[], help="Extra header, 'Name: value'")
+    ap.add_argument("-n", type=int, default=200, help="Calls per variant")
+    ap.add_argument("--workers", type=int, default=4, help="Concurrent callers")
+    args = ap.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1/audio/speech"
+
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+    body = {"model": "bench", "voice": "alloy", "input": "selamat pagi"} if args.method == "POST" else None
+
+    session = requests.Session()
+    session.headers.update(headers)
+    session.mount("http://", pooled_adapter(args.workers))
+    session.mount("https://", pooled_adapter(args.workers))
+
+    variants = {
+        "per-call requests.post": lambda: requests.request(args.method, url, headers=headers, json=body, timeout=60),
+        "pooled session": lambda: session.request(args.method, url, json=body, timeout=60),
+    }
+
+    print(f"{args.n} calls per variant, {args.workers} workers → {url}")
+    print(f"{'variant':<26}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'calls/s':>10}")
+    for name, call in variants.items():
+        call()  # warm-up (DNS, first connection)
+        r = _measure(call, args.n, args.workers)
+        print(f"{name:<26}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['calls_per_s']:>10.1f}")
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
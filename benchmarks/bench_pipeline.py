@@ -0,0 +1,210 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end throughput of the deck pipeline on the in-process fake backend
+(BACKEND "fake"): cards per second, per-stage latency and peak memory for a
+cold cache, a warm cache and a resumed run, at several word-list sizes.
+
+    python benchmarks/bench_pipeline.py                                # 100, 10k, 100k words
+    python benchmarks/bench_pipeline.py --sizes 100,10000 --out bench.json
+    python benchmarks/bench_pipeline.py --sizes 10000 --compare bench.json
+
+Every scenario runs in a fresh child process (peak RSS is the child's own). The fake
+backend is seeded, so cards, injected errors and latencies are identical between
+runs; results are written as sorted JSON, so two versions can be diffed directly or
+with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ("cold", "warm", "resume")
+
+
+def _config(args) -> dict:
+    unlimited = {"rps": 100000, "max_rps": 100000, "burst": 1000}
+    return {
+        "BACKEND": "fake",
+        "FAKE_PROFILE": args.profile,
+        "FAKE_SEED": args.seed,
+        "FAKE_LATENCY_SCALE": args.latency_scale,
+        "FAKE_ERROR_RATE": {"text": {"429": args.error_rate, "503": args.error_rate / 2},
+                            "tts": {"429": args.error_rate}},
+        "FAKE_PAYLOAD": {"audio_bytes": args.audio_bytes, "example_words": 6},
+        "FAKE_RETRY_AFTER_MS": 5,
+        "SOURCE_LANG": "Indonesisch",
+        "TARGET_LANG": "Nederlands",
+        "OVERRIDE_TTS_BACKEND": "openai",
+        "MAX_CONCURRENCY": args.concurrency,
+        "GENERATE_BATCH_SIZE": args.batch_size,
+        "RATE_LIMITS": {"text": unlimited, "tts": unlimited, "translate": unlimited},
+        "CREATE_APKG": not args.no_apkg,
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def _child(workdir: Path) -> None:
+    """Run one job in workdir and write its summary to result.json."""
+    sys.path.insert(0, str(ROOT))
+    os.chdir(workdir)
+    from flashcard_lingua.config_loader import load_config
+    from flashcard_lingua.runner import run_job, setup_logging
+
+    cfg = load_config(Path("config.json"))
+    setup_logging(cfg)
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            stats = run_job(cfg, Path("words.txt"))
+        finally:
+            sys.stdout = stdout
+    stats["wall_s"] = time.perf_counter() - t0
+    Path("result.json").write_text(json.dumps(stats))
+
+
+def _run(workdir: Path) -> dict:
+    proc = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--child", str(workdir)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark child failed in {workdir} (exit {proc.returncode})")
+    stats = json.loads((workdir / "result.json").read_text())
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    stats["peak_rss_mb"] = rss
+    return stats
+
+
+def _prepare(workdir: Path, scenario: str) -> None:
+    out = workdir / "out"
+    if scenario == "warm":
+        # Cache and media stay; the deck is rebuilt from them
+        (out / "journal.jsonl").unlink(missing_ok=True)
+    elif scenario == "resume":
+        # Half the deck is in the journal, the other half has to be generated again
+        journal = out / "journal.jsonl"
+        lines = journal.read_text(encoding="utf-8").splitlines(keepends=True)
+        journal.write_text("".join(lines[: len(lines) // 2]), encoding="utf-8")
+        shutil.rmtree(workdir / "cache", ignore_errors=True)
+
+
+def _summary(scenario: str, size: int, runs: list) -> dict:
+    mid = sorted(runs, key=lambda r: r["wall_s"])[len(runs) // 2]
+    wall = statistics.median(r["wall_s"] for r in runs)
+    return {
+        "scenario": scenario,
+        "words": size,
+        "rows": mid["rows"],
+        "generated": mid["generated"],
+        "wall_s": round(wall, 3),
+        "cards_per_s": round(mid["rows"] / wall, 1) if wall else 0.0,
+        "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+        "stages": {
+            st["stage"]: {"avg_ms": st["avg_ms"], "max_ms": st["max_ms"], "utilization": st["utilization"]}
+            for st in mid.get("stages", [])
+        },
+    }
+
+
+def _env() -> dict:
+    try:
+        rev = subprocess.run(
+            ["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        rev = ""
+    return {"git": rev, "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def _compare(old: dict, new: dict) -> None:
+    key = lambda r: (r["scenario"], r["words"])  # noqa: E731
+    before = {key(r): r for r in old.get("results", [])}
+    print(f"\nvs {old.get('env', {}).get('git') or 'baseline'}:")
+    for r in new["results"]:
+        o = before.get(key(r))
+        if o is None:
+            continue
+        ratio = r["cards_per_s"] / o["cards_per_s"] if o["cards_per_s"] else float("inf")
+        print(
+            f"  {r['scenario']:>6} {r['words']:>7}: {o['cards_per_s']:>9.1f} → {r['cards_per_s']:>9.1f} cards/s "
+            f"({ratio:.2f}x), rss {o['peak_rss_mb']} → {r['peak_rss_mb']} MB"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="100,10000,100000", help="Comma-separated word-list sizes")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the median is reported")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--batch-size", type=int, default=1)
+    ap.add_argument("--profile", choices=["openai", "google"], default="openai")
+    ap.add_argument("--latency-scale", type=float, default=0.01, help="Multiplier on the profile's latencies")
+    ap.add_argument("--error-rate", type=float, default=0.01, help="Injected 429 rate (503 at half of it)")
+    ap.add_argument("--audio-bytes", type=int, default=2048)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--no-apkg", action="store_true")
+    ap.add_argument("--workdir", help="Keep the run directories here instead of a temp dir")
+    ap.add_argument("--out", help="Write results as JSON")
+    ap.add_argument("--compare", help="Earlier --out file to compare against")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        _child(Path(args.child))
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    scenarios = [s for s in args.scenarios.split(",") if s in SCENARIOS]
+    base = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    cfg = _config(args)
+    results = []
+    try:
+        for size in sizes:
+            runs = {s: [] for s in scenarios}
+            for rep in range(max(1, args.repeat)):
+                workdir = base / f"{size}-{rep}"
+                shutil.rmtree(workdir, ignore_errors=True)
+                workdir.mkdir(parents=True)
+                (workdir / "config.json").write_text(json.dumps(cfg))
+                (workdir / "words.txt").write_text("".join(f"kata{i}\n" for i in range(size)))
+                # cold always runs first: warm and resume start from its output
+                for scenario in ("cold",) + tuple(s for s in SCENARIOS[1:] if s in scenarios):
+                    _prepare(workdir, scenario)
+                    r = _run(workdir)
+                    if scenario in scenarios:
+                        runs[scenario].append(r)
+                        print(
+                            f"{scenario:>6} {size:>7} words: {r['rows'] / r['wall_s']:>9.1f} cards/s "
+                            f"({r['wall_s']:.2f}s, {r['generated']} generated, peak {r['peak_rss_mb']:.0f} MB)",
+                            flush=True,
+                        )
+            results += [_summary(s, size, runs[s]) for s in scenarios if runs.get(s)]
+    finally:
+        if not args.workdir:
+            shutil.rmtree(base, ignore_errors=True)
+
+    report = {"suite": "pipeline", "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "child", "workdir")},
+              "env": _env(), "results": results}
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Results: {args.out}")
+    if args.compare:
+        _compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
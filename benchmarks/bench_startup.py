@@ -0,0 +1,110 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start time of the command-line entry points, and which heavy dependencies they
+import before doing any work.
+
+    python benchmarks/bench_startup.py                      # --help of each entry point
+    python benchmarks/bench_startup.py --repeat 20 --budget-ms 300
+
+Each command runs --repeat times in a fresh interpreter; min and median wall-clock
+time are reported. A second run per module with -X importtime lists the slowest
+imports. With --budget-ms the script exits 1 if a median is over budget or if importing
+a module loads one of the lazily imported dependencies (tqdm, tenacity, genanki, the
+provider SDKs); .github/workflows/startup.yml runs it that way on every push and pull request.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+COMMANDS = {
+    "runner --help": ["-m", "flashcard_lingua.runner", "--help"],
+    "batch_runner --help": ["-m", "flashcard_lingua.batch_runner", "--help"],
+    "merge --help": ["-m", "flashcard_lingua.merge", "--help"],
+    "cache_pack --help": ["-m", "flashcard_lingua.cache_pack", "--help"],
+    "daemon --help": ["-m", "flashcard_lingua.daemon", "--help"],
+}
+
+# Only imported on the code paths that need them
+LAZY = ("tqdm", "tenacity", "genanki", "openai", "httpx", "requests", "google")
+
+MODULES = ("flashcard_lingua.runner", "flashcard_lingua.batch_runner", "flashcard_lingua.merge", "flashcard_lingua.daemon")
+
+
+def _time_command(argv, repeat: int):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *argv], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return {"min_ms": round(min(times), 1), "median_ms": round(statistics.median(times), 1)}
+
+
+def _loaded_lazy(module: str):
+    # Measured against what the interpreter already loaded (site hooks may preload namespace packages)
+    code = (
+        f"import sys, json; before = set(sys.modules); import {module}; "
+        f"print(json.dumps(sorted({{m.split('.')[0] for m in set(sys.modules) - before}} & set({list(LAZY)!r}))))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def _slowest_imports(module: str, top: int):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000.0, 1)} for us, name in sorted(rows, reverse=True)[:top]]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=10, help="Runs per command; min and median are reported")
+    ap.add_argument("--top", type=int, default=8, help="Slowest imports to list per module")
+    ap.add_argument("--budget-ms", type=float, help="Fail if a command's median is slower than this")
+    ap.add_argument("--out", help="Write results as JSON")
+    args = ap.parse_args()
+
+    # Warm the bytecode cache so the first timed run is not a compile
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "flashcard_lingua"], cwd=ROOT, check=True)
+
+    results = {"python": sys.version.split()[0], "commands": {}, "modules": {}}
+    failed = []
+    print(f"{'command':<24} {'min':>8} {'median':>8}")
+    for name, argv in COMMANDS.items():
+        r = results["commands"][name] = _time_command(argv, max(1, args.repeat))
+        over = args.budget_ms is not None and r["median_ms"] > args.budget_ms
+        print(f"{name:<24} {r['min_ms']:>6.1f}ms {r['median_ms']:>6.1f}ms" + ("  ❌ over budget" if over else ""))
+        if over:
+            failed.append(f"{name}: {r['median_ms']:.1f} ms > {args.budget_ms:.0f} ms")
+
+    for module in MODULES:
+        lazy = _loaded_lazy(module)
+        slow = _slowest_imports(module, args.top)
+        results["modules"][module] = {"lazy_loaded": lazy, "slowest": slow}
+        print(f"\nimport {module}" + (f"  ❌ loads {', '.join(lazy)}" if lazy else ""))
+        for s in slow:
+            print(f"  {s['cumulative_ms']:>7.1f}ms  {s['module']}")
+        if lazy and args.budget_ms is not None:
+            failed.append(f"{module} imports {', '.join(lazy)}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if failed:
+        print("\nStartup budget exceeded:\n  " + "\n  ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# src/audio_utils.py
+import functools
+import hashlib
+import json
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .media_manifest import MediaManifest, file_sha1
+from .metrics import Metrics
+
+logger = logging.getLogger("flashcard_lingua")
+
+
+@functools.lru_cache(maxsize=1)
+def ffmpeg_path() -> Optional[str]:
+    """Path of a working ffmpeg binary, probed once per process."""
+    path = shutil.which("ffmpeg")
+    if path is None:
+        return None
+    try:
+        subprocess.run([path, "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    except Exception:
+        return None
+    return path
+
+
+def ffmpeg_available() -> bool:
+    return ffmpeg_path() is not None
+
+
+def _ffmpeg() -> str:
+    path = ffmpeg_path()
+    if path is None:
+        raise RuntimeError("ffmpeg niet gevonden. Installeer met: sudo apt-get install -y ffmpeg")
+    return path
+
+
+def adjust_audio_rate(in_path: Path, out_path: Path, rate: float) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        _ffmpeg(),
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        str(in_path),
+        "-filter:a",
+        f"atempo={rate}",
+        str(out_path),
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def adjust_audio_rate_many(jobs: List[Tuple[Path, Path]], rate: float) -> None:
+    """Re-time several files with a single ffmpeg process (one input/output pair per job)."""
+    if len(jobs) == 1:
+        adjust_audio_rate(jobs[0][0], jobs[0][1], rate)
+        return
+    cmd = [_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error"]
+    for in_path, _ in jobs:
+        cmd += ["-i", str(in_path)]
+    for i, (_, out_path) in enumerate(jobs):
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        cmd += ["-map", f"{i}:a", "-filter:a", f"atempo={rate}", str(out_path)]
+    subprocess.run(cmd, check=True)
+
+
+def tempo_variant_name(name: str, sha1: str, rate: float) -> str:
+    """Content-addressed name of a re-timed copy: source name + source checksum + rate."""
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    return f"{stem}_r{int(round(rate * 100))}_{sha1[:8]}" + (f".{ext}" if ext else "")
+
+
+# Speech-oriented defaults for AUDIO_ENCODE; codec -> (ffmpeg encoder, extension, sample rate)
+_ENCODE_DEFAULTS = {
+    "codec": "mp3",
+    "bitrate": "48k",
+    "sample_rate": 0,
+    "mono": True,
+    "trim_silence": True,
+    "silence_db": -50,
+    "loudnorm": True,
+    "lufs": -16,
+}
+_CODECS = {"mp3": ("libmp3lame", "mp3", 22050), "opus": ("libopus", "ogg", 24000)}
+
+
+def encode_settings(cfg: Dict) -> Optional[Dict]:
+    """AUDIO_ENCODE: true for the defaults, a dict to override some of them, false/absent to keep audio as is."""
+    conf = cfg.get("AUDIO_ENCODE")
+    if not conf:
+        return None
+    settings = dict(_ENCODE_DEFAULTS)
+    if isinstance(conf, dict):
+        settings.update(conf)
+    if settings["codec"] not in _CODECS:
+        raise ValueError(f"AUDIO_ENCODE codec must be one of: {', '.join(_CODECS)}")
+    return settings
+
+
+def encoded_name(name: str, sha1: str, settings: Dict) -> str:
+    """Content-addressed name of an encoded copy: source name + source checksum + settings hash."""
+    tag = hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:6]
+    stem = name.rpartition(".")[0] or name
+    return f"{stem}_e{tag}_{sha1[:8]}.{_CODECS[settings['codec']][1]}"
+
+
+def encode_audio(in_path: Path, out_path: Path, settings: Dict) -> None:
+    """Trim, normalize and re-encode one file in a single ffmpeg pass."""
+    encoder, _ext, default_rate = _CODECS[settings["codec"]]
+    filters = []
+    if settings["trim_silence"]:
+        # Leading silence, then trailing silence via a reverse
+        trim = f"silenceremove=start_periods=1:start_threshold={settings['silence_db']}dB:start_silence=0.05"
+        filters += [trim, "areverse", trim, "areverse"]
+    if settings["loudnorm"]:
+        filters.append(f"loudnorm=I={settings['lufs']}:TP=-1.5:LRA=11")
+    cmd = [_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error", "-i", str(in_path)]
+    if filters:
+        cmd += ["-filter:a", ",".join(filters)]
+    if settings["mono"]:
+        cmd += ["-ac", "1"]
+    cmd += ["-ar", str(int(settings["sample_rate"] or default_rate)), "-c:a", encoder, "-b:a", str(settings["bitrate"])]
+    if settings["codec"] == "opus":
+        cmd += ["-application", "voip"]
+    cmd += ["-map_metadata", "-1", str(out_path)]
+    subprocess.run(cmd, check=True)
+
+
+def encode_many(
+    names: Iterable[str],
+    media_dir: Path,
+    settings: Dict,
+    manifest: Optional[MediaManifest] = None,
+    workers: int = 4,
+) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Encoded copies of media files for packaging: returns (source name -> encoded name,
+    stats). Copies are written next to their source under encoded_name() and recorded in
+    the manifest, so unchanged audio is encoded once; a file that fails to encode maps
+    to itself. Files are encoded in parallel, one ffmpeg process each.
+    """
+    stats = {"encoded": 0, "cached": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+    mapping: Dict[str, str] = {}
+    todo: List[Tuple[str, str]] = []
+    for name in dict.fromkeys(names):
+        src = media_dir / name
+        entry = manifest.get(name) if manifest is not None else None
+        if entry is None and not src.is_file():
+            continue
+        size, sha1 = (entry["size"], entry["sha1"]) if entry else (src.stat().st_size, file_sha1(src))
+        stats["bytes_in"] += size
+        enc = encoded_name(name, sha1, settings)
+        mapping[name] = enc
+        if manifest.has(enc) if manifest is not None else (media_dir / enc).is_file():
+            stats["cached"] += 1
+        else:
+            todo.append((name, enc))
+
+    if todo and not ffmpeg_available():
+        print("⚠️ AUDIO_ENCODE skipped: ffmpeg not found")
+        return {}, dict(stats, failed=len(mapping), bytes_out=stats["bytes_in"])
+
+    def run(job: Tuple[str, str]) -> bool:
+        name, enc = job
+        # Dot-prefixed (ignored by the manifest) but with the real extension, which ffmpeg goes by
+        tmp = media_dir / f".part.{enc}"
+        try:
+            encode_audio(media_dir / name, tmp, settings)
+        except Exception as e:
+            logger.warning(f"Audio encoding failed for {name}: {e}")
+            tmp.unlink(missing_ok=True)
+            return False
+        tmp.replace(media_dir / enc)
+        if manifest is not None:
+            entry = manifest.get(name) or {}
+            manifest.record(
+                enc, text=entry.get("text", ""), voice=entry.get("voice", ""), tempo=entry.get("tempo"),
+                source=name, encoding=settings["codec"],
+            )
+        return True
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="encode") as ex:
+            for (name, _enc), ok in zip(todo, ex.map(run, todo)):
+                if ok:
+                    stats["encoded"] += 1
+                else:
+                    stats["failed"] += 1
+                    mapping[name] = name
+
+    for name, enc in mapping.items():
+        entry = manifest.get(enc) if manifest is not None else None
+        stats["bytes_out"] += entry["size"] if entry else (media_dir / enc).stat().st_size
+    return mapping, stats
+
+
+class AudioEngine:
+    """
+    Tempo post-processing for example audio.
+
+    Originals are never overwritten: each re-timed file is written next to its source
+    under tempo_variant_name() and recorded in the media manifest with its rate, so a
+    warm run finds the variant and does no ffmpeg work. Pending conversions are grouped
+    into ffmpeg calls of up to batch_files files, run on a small pool. With metrics set,
+    every ffmpeg call is timed as stage "ffmpeg" and the variants count as bytes written.
+    """
+
+    def __init__(
+        self,
+        media_dir: Path,
+        manifest: MediaManifest,
+        workers: int = 2,
+        batch_files: int = 8,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.media_dir = media_dir
+        self.manifest = manifest
+        self.workers = max(1, int(workers))
+        self.batch_files = max(1, int(batch_files))
+        self.converted = 0
+        self.failed = 0
+        self.busy_s = 0.0
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Event] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def tempo_many(self, names: Iterable[str], rate: float) -> Dict[str, str]:
+        """Map each source name to the file to use at this rate (the source itself if nothing to do)."""
+        out: Dict[str, str] = {}
+        todo: List[Tuple[str, str]] = []
+        waits: List[Tuple[str, str, threading.Event]] = []
+        for name in dict.fromkeys(n for n in names if n):
+            out[name] = name
+            entry = self.manifest.get(name)
+            if entry is None or abs(rate - 1.0) <= 1e-6:
+                continue
+            # Variants are not re-timed again, and neither are files of unknown tempo: the
+            # manifest indexes files it did not write with tempo None, and older versions
+            # re-timed example audio in place, so such a file may already play at this rate
+            if entry.get("tempo") in (None, rate) or entry.get("source"):
+                continue
+            variant = tempo_variant_name(name, entry["sha1"], rate)
+            if self.manifest.has(variant):
+                out[name] = variant
+                continue
+            with self._lock:
+                ev = self._pending.get(variant)
+                if ev is None:
+                    self._pending[variant] = threading.Event()
+                    todo.append((name, variant))
+                else:
+                    waits.append((name, variant, ev))
+
+        if todo:
+            chunks = [todo[i:i + self.batch_files] for i in range(0, len(todo), self.batch_files)]
+            if len(chunks) == 1:
+                done = [self._convert(chunks[0], rate)]
+            else:
+                done = list(self._executor().map(lambda c: self._convert(c, rate), chunks))
+            for ok in done:
+                out.update(ok)
+
+        # Another worker is converting the same file; use its result
+        for name, variant, ev in waits:
+            ev.wait()
+            if self.manifest.has(variant):
+                out[name] = variant
+        return out
+
+    def _convert(self, jobs: List[Tuple[str, str]], rate: float) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        t0 = time.perf_counter()
+        try:
+            paths = [(self.media_dir / src, self.media_dir / variant) for src, variant in jobs]
+            try:
+                adjust_audio_rate_many(paths, rate)
+                ok = jobs
+            except Exception as e:
+                if len(jobs) == 1:
+                    raise
+                logger.info(f"Batched ffmpeg call failed ({e}); converting {len(jobs)} files one by one")
+                ok = []
+                for (src, variant), (in_path, out_path) in zip(jobs, paths):
+                    try:
+                        adjust_audio_rate(in_path, out_path, rate)
+                        ok.append((src, variant))
+                    except Exception as e2:
+                        print(f"[Audio rate error] {src}: {e2}")
+            for src, variant in ok:
+                entry = self.manifest.get(src) or {}
+                self.manifest.record(
+                    variant, text=entry.get("text", ""), voice=entry.get("voice", ""), tempo=rate, source=src
+                )
+                out[src] = variant
+            dt = time.perf_counter() - t0
+            with self._lock:
+                self.converted += len(ok)
+                self.failed += len(jobs) - len(ok)
+                self.busy_s += dt
+            if self.metrics is not None:
+                self.metrics.observe("stage_seconds", dt, stage="ffmpeg")
+                self.metrics.inc("bytes_written_total", sum(self.manifest.get(v)["size"] for _, v in ok), kind="audio")
+        except Exception as e:
+            print(f"[Audio rate error] {', '.join(src for src, _ in jobs)}: {e}")
+            with self._lock:
+                self.failed += len(jobs)
+        finally:
+            with self._lock:
+                for _, variant in jobs:
+                    self._pending.pop(variant).set()
+        return out
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # ffmpeg runs in its own process; a thread per call is enough to keep several busy
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ffmpeg")
+            return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
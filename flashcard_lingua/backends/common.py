@@ -0,0 +1,324 @@
+# src/backends/common.py
+import json
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from ..prompts import BATCH_PROMPT_TEMPLATE, FIELD_DESCRIPTIONS, MISSING_FIELDS_TEMPLATE
+
+logger = logging.getLogger("flashcard_lingua")
+
+CARD_FIELDS = ("translation", "example_src", "example_tgt", "note")
+
+
+# JSON schema of one card, for providers with a structured-output mode
+CARD_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {k: {"type": "string"} for k in CARD_FIELDS},
+    "required": list(CARD_FIELDS),
+    "additionalProperties": False,
+}
+
+
+def object_schema(keys: List[str], value_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Schema of an object with exactly these keys (a batch of cards keyed by word, an OOV mapping)."""
+    return {
+        "type": "object",
+        "properties": {k: value_schema for k in keys},
+        "required": list(keys),
+        "additionalProperties": False,
+    }
+
+
+def fields_schema(fields: List[str]) -> Dict[str, Any]:
+    return object_schema(fields, {"type": "string"})
+
+
+def missing_fields(data: Any) -> List[str]:
+    if not isinstance(data, dict):
+        return list(CARD_FIELDS)
+    return [k for k in CARD_FIELDS if k not in data or (k != "note" and not str(data[k]).strip())]
+
+
+def card_is_complete(data: Any) -> bool:
+    return isinstance(data, dict) and not missing_fields(data)
+
+
+# --- local JSON repair ---
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort fix of near-valid JSON from an LLM: code fences, text around the object,
+    // and /* */ comments, trailing commas and output cut off mid-object. A value that
+    was cut off is dropped rather than kept half-written.
+    """
+    m = _FENCE_RE.search(text)
+    if m:
+        text = m.group(1)
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("no JSON object in text")
+
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, List[str]]] = []  # output length and open brackets at each comma
+    in_str = escape = False
+    i, n = start, len(text)
+    while i < n:
+        c = text[i]
+        if in_str:
+            out.append(c)
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_str = False
+            i += 1
+            continue
+        if c == '"':
+            in_str = True
+        elif text.startswith("//", i):
+            j = text.find("\n", i)
+            i = n if j < 0 else j
+            continue
+        elif text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            continue
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(c)
+            if not stack:
+                break
+            i += 1
+            continue
+        elif c == ",":
+            cuts.append((len(out), list(stack)))
+        out.append(c)
+        i += 1
+
+    if stack:
+        tail = "".join(out).rstrip()
+        # Cut off inside a string or right after a key: fall back to the last complete member
+        if in_str or tail.endswith(":") or (stack[-1] == "}" and tail.endswith('"') and _dangling_key(tail)):
+            if not cuts:
+                raise ValueError("JSON object cut off before its first member")
+            size, stack = cuts[-1]
+            out = out[:size]
+        while out and out[-1] in " \t\r\n,":
+            out.pop()
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _dangling_key(tail: str) -> bool:
+    # '{"a": "x", "b"' : the last string is a key without a value
+    j = tail.rfind('"', 0, len(tail) - 1)
+    before = tail[:j].rstrip()
+    return before.endswith(",") or before.endswith("{")
+
+
+def loads_lenient(text: str) -> Tuple[Any, bool]:
+    """(parsed JSON, whether it needed repair); ValueError if even the repaired text does not parse."""
+    text = (text or "").strip()
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+    return json.loads(repair_json(text)), True
+
+
+class ParseStats:
+    """
+    Per backend: responses parsed as-is or after local repair, responses that were
+    unusable, targeted retries for missing fields, and the tokens of unusable responses.
+    """
+
+    KEYS = ("parsed", "repaired", "failed", "field_retries", "wasted_tokens")
+
+    def __init__(self):
+        self.counts = {k: 0 for k in self.KEYS}
+        self._lock = threading.Lock()
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for k, v in counts.items():
+                self.counts[k] = self.counts.get(k, 0) + v
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+def format_missing_prompt(
+    word: str, known: Dict[str, str], missing: List[str], source_lang: str, target_lang: str
+) -> str:
+    return MISSING_FIELDS_TEMPLATE.format(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        word=word,
+        known=json.dumps(known, ensure_ascii=False, indent=2),
+        missing="\n".join(
+            f"- {k}: " + FIELD_DESCRIPTIONS[k].format(source_lang=source_lang, target_lang=target_lang)
+            for k in missing
+        ),
+    )
+
+
+def complete_card(
+    word: str,
+    data: Any,
+    ask_missing: Optional[Callable[[str, Dict[str, str], List[str]], Dict[str, Any]]],
+    stats: ParseStats,
+    label: str,
+) -> Dict[str, str]:
+    """
+    A full card from a parsed response. Missing or empty fields are requested once,
+    on their own, through ask_missing(word, known fields, missing fields).
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{label} JSON onvolledig voor '{word}': {data}")
+    missing = missing_fields(data)
+    if missing and ask_missing is not None:
+        known = {k: str(data[k]) for k in CARD_FIELDS if k in data and k not in missing}
+        stats.add(field_retries=1)
+        logger.info(f"{label}: asking only for {', '.join(missing)} of '{word}'")
+        extra = ask_missing(word, known, missing)
+        data = dict(data)
+        data.update({k: extra[k] for k in missing if isinstance(extra, dict) and k in extra})
+        missing = missing_fields(data)
+    if missing:
+        raise ValueError(f"{label} JSON onvolledig voor '{word}': {data}")
+    return {k: str(data[k]) for k in CARD_FIELDS}
+
+
+def parse_card_response(
+    word: str,
+    text: str,
+    stats: ParseStats,
+    label: str,
+    ask_missing: Optional[Callable[[str, Dict[str, str], List[str]], Dict[str, Any]]] = None,
+    tokens: int = 0,
+) -> Dict[str, str]:
+    try:
+        data, repaired = loads_lenient(text)
+    except ValueError:
+        stats.add(failed=1, wasted_tokens=tokens)
+        raise ValueError(f"Geen JSON in {label}-output voor '{word}': {text}")
+    stats.add(parsed=1, repaired=int(repaired))
+    return complete_card(word, data, ask_missing, stats, label)
+
+
+def unique_words(words: List[str]) -> List[str]:
+    seen, out = set(), []
+    for w in words:
+        if w not in seen:
+            seen.add(w)
+            out.append(w)
+    return out
+
+
+def format_batch_prompt(words: List[str], usage_notes: str, source_lang: str, target_lang: str) -> str:
+    return BATCH_PROMPT_TEMPLATE.format(
+        usage_notes=usage_notes,
+        source_lang=source_lang,
+        target_lang=target_lang,
+        words="\n".join(json.dumps(w, ensure_ascii=False) for w in words),
+    )
+
+
+def collect_batch_cards(
+    words: List[str],
+    text: str,
+    fallback: Callable[[str], Dict[str, str]],
+    label: str,
+    stats: Optional[ParseStats] = None,
+    ask_missing: Optional[Callable[[str, Dict[str, str], List[str]], Dict[str, Any]]] = None,
+    tokens: int = 0,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Pick the card for every word out of a batch response (a JSON object keyed by word).
+    Cards with only some fields missing are completed through ask_missing(); words that
+    are absent (or whose completion fails) are generated one by one through fallback().
+    """
+    stats = stats if stats is not None else ParseStats()
+    try:
+        parsed, repaired = loads_lenient(text)
+    except ValueError:
+        parsed, repaired = {}, False
+    if not isinstance(parsed, dict):
+        parsed = {}
+    if parsed:
+        stats.add(parsed=1, repaired=int(repaired))
+    else:
+        stats.add(failed=1, wasted_tokens=tokens)
+    # Models sometimes change the case or spacing of a key
+    by_norm = {str(k).strip().lower(): v for k, v in parsed.items()}
+
+    out: Dict[str, Dict[str, str]] = {}
+    missing: List[str] = []
+    for w in words:
+        data = parsed.get(w, by_norm.get(w.strip().lower()))
+        if card_is_complete(data):
+            out[w] = {k: str(data[k]) for k in CARD_FIELDS}
+        elif isinstance(data, dict) and ask_missing is not None and len(missing_fields(data)) < len(CARD_FIELDS):
+            try:
+                out[w] = complete_card(w, data, ask_missing, stats, label)
+            except Exception as e:
+                logger.info(f"{label} batch: completing '{w}' failed ({e})")
+                missing.append(w)
+        else:
+            missing.append(w)
+
+    if missing:
+        logger.info(f"{label} batch: {len(missing)}/{len(words)} items missing or incomplete, retrying one by one")
+    for w in missing:
+        out[w] = fallback(w)
+    return out
+
+
+def parse_mapping(text: str, stats: Optional[ParseStats] = None, tokens: int = 0) -> Dict[str, str]:
+    """A flat word -> translation object (OOV responses); {} when nothing usable comes back."""
+    try:
+        data, repaired = loads_lenient(text)
+    except ValueError:
+        data, repaired = None, False
+    if not isinstance(data, dict):
+        if stats is not None:
+            stats.add(failed=1, wasted_tokens=tokens)
+        return {}
+    if stats is not None:
+        stats.add(parsed=1, repaired=int(repaired))
+    return {str(k).strip(): str(v).strip() for k, v in data.items()}
+
+
+
+def http_pool_size(cfg: Dict) -> int:
+    # Enough keep-alive connections for every concurrent worker
+    default = max(10, 2 * int(cfg.get("MAX_CONCURRENCY", 1)))
+    return max(1, int(cfg.get("HTTP_POOL_SIZE", default)))
+
+
+def pooled_adapter(pool_size: int):
+    from requests.adapters import HTTPAdapter
+
+    return HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=False)
+
+
+class BackendHTTPError(RuntimeError):
+    """Non-2xx reply from a raw HTTP call; keeps status and headers for retry/rate-limit handling."""
+
+    def __init__(self, message: str, status_code: int, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
@@ -0,0 +1,188 @@
+# src/backends/fake_backend.py
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional
+
+from .common import BackendHTTPError, ParseStats, collect_batch_cards, parse_card_response, unique_words
+
+# Per-endpoint latency (ms) roughly like the real providers; FAKE_LATENCY overrides per endpoint
+_PROFILES = {
+    "openai": {
+        "text": {"dist": "lognormal", "mean_ms": 1800, "sigma": 0.45},
+        "tts": {"dist": "lognormal", "mean_ms": 900, "sigma": 0.35},
+        "translate": {"dist": "lognormal", "mean_ms": 2500, "sigma": 0.4},
+    },
+    "google": {
+        "text": {"dist": "lognormal", "mean_ms": 1200, "sigma": 0.4},
+        "tts": {"dist": "lognormal", "mean_ms": 350, "sigma": 0.3},
+        "translate": {"dist": "lognormal", "mean_ms": 250, "sigma": 0.3},
+    },
+}
+
+_SYLLABLES = ("ka", "ta", "ma", "ri", "su", "an", "di", "lo", "pe", "ru", "ba", "ngi", "se", "tu", "wa")
+
+
+class FakeBackend:
+    """
+    In-process stand-in for OpenAIBackend / GoogleBackend, for benchmarks and offline runs.
+
+    Latency per call is drawn from FAKE_LATENCY (fixed, uniform or lognormal, in ms;
+    FAKE_LATENCY_SCALE multiplies it), FAKE_ERROR_RATE injects 429/503 responses with a
+    Retry-After, and FAKE_PAYLOAD sets the audio size and example sentence length.
+    FAKE_MALFORMED_RATE cuts that share of card responses short, which exercises the
+    JSON repair and the targeted retry for missing fields.
+    Draws are seeded from FAKE_SEED and the call's input, so a run gives the same cards,
+    errors and latencies whatever the thread interleaving.
+    """
+
+    def __init__(self, cfg: dict):
+        self.profile = (cfg.get("FAKE_PROFILE", "openai") or "openai").lower()
+        self.latency = {ep: dict(v) for ep, v in _PROFILES.get(self.profile, _PROFILES["openai"]).items()}
+        for ep, spec in (cfg.get("FAKE_LATENCY", {}) or {}).items():
+            self.latency.setdefault(ep, {}).update(spec)
+        self.latency_scale = float(cfg.get("FAKE_LATENCY_SCALE", 1.0))
+        self.error_rate: Dict[str, Dict[str, float]] = cfg.get("FAKE_ERROR_RATE", {}) or {}
+        payload = cfg.get("FAKE_PAYLOAD", {}) or {}
+        self.audio_bytes = int(payload.get("audio_bytes", 4096))
+        self.example_words = max(2, int(payload.get("example_words", 6)))
+        self.seed = str(cfg.get("FAKE_SEED", 0))
+        self.retry_after_ms = int(cfg.get("FAKE_RETRY_AFTER_MS", 50))
+        self.malformed_rate = float(cfg.get("FAKE_MALFORMED_RATE", 0.0))
+        self.parse_stats = ParseStats()
+        self.source_lang = cfg.get("SOURCE_LANG", "Indonesisch")
+        self.target_lang = cfg.get("TARGET_LANG", "Nederlands")
+        self.text_model = f"fake-{self.profile}"
+        self.rate_hints: Optional[Callable[[str, Mapping[str, str]], None]] = None
+        self.calls: Dict[str, int] = {"text": 0, "tts": 0, "translate": 0}
+        self._attempts: Dict[str, int] = {}
+        self._inflight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def client_key(self):
+        return ("fake", self.profile)
+
+    def model_key(self):
+        return ("fake", self.profile)
+
+    def adopt_clients(self, other: "FakeBackend") -> None:
+        pass
+
+    # --- simulation ---
+
+    def _call(self, endpoint: str, key: str) -> None:
+        # Only failed keys are remembered, so a retry rolls again without a per-call entry;
+        # a duplicate of a call still in flight (a hedged request) rolls on its own too
+        attempt_key = f"{endpoint}|{key}"
+        with self._lock:
+            attempt = self._attempts.get(attempt_key, 0)
+            dup = self._inflight.get(attempt_key, 0)
+            self._inflight[attempt_key] = dup + 1
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        try:
+            self._simulate(endpoint, attempt_key, attempt, dup)
+        finally:
+            with self._lock:
+                left = self._inflight.pop(attempt_key) - 1
+                if left:
+                    self._inflight[attempt_key] = left
+
+    def _simulate(self, endpoint: str, attempt_key: str, attempt: int, dup: int) -> None:
+        rng = random.Random(f"{self.seed}|{attempt_key}|{attempt}" + (f"|dup{dup}" if dup else ""))
+        spec = self.latency.get(endpoint, {})
+        mean = float(spec.get("mean_ms", 0)) / 1000.0
+        dist = spec.get("dist", "fixed")
+        if dist == "uniform":
+            lo = float(spec.get("min_ms", 0)) / 1000.0
+            hi = float(spec.get("max_ms", 2 * mean * 1000)) / 1000.0
+            delay = rng.uniform(lo, hi)
+        elif dist == "lognormal" and mean > 0:
+            sigma = float(spec.get("sigma", 0.5))
+            delay = rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+        else:
+            delay = mean
+        time.sleep(delay * self.latency_scale)
+
+        roll = rng.random()
+        for status, rate in sorted((self.error_rate.get(endpoint, {}) or {}).items()):
+            if roll < float(rate):
+                with self._lock:
+                    self._attempts[attempt_key] = attempt + 1
+                headers = {"retry-after-ms": str(self.retry_after_ms)}
+                if self.rate_hints is not None:
+                    self.rate_hints(endpoint, headers)
+                raise BackendHTTPError(f"Fake {endpoint} fout (HTTP {status}): injected", int(status), headers)
+            roll -= float(rate)
+
+    def _words_for(self, key: str, n: int) -> List[str]:
+        h = hashlib.sha1(f"{self.seed}|{key}".encode("utf-8")).digest()
+        out = []
+        for i in range(n):
+            a, b = h[i % len(h)], h[(i * 7 + 3) % len(h)]
+            out.append(_SYLLABLES[a % len(_SYLLABLES)] + _SYLLABLES[b % len(_SYLLABLES)])
+        return out
+
+    # --- backend interface ---
+
+    def _card(self, word: str, usage_notes: str) -> Dict[str, str]:
+        filler = self._words_for(word, self.example_words - 1)
+        return {
+            "translation": f"{word} ({self.target_lang})",
+            "example_src": " ".join(filler[:2] + [word] + filler[2:]),
+            "example_tgt": f"voorbeeld met {word}",
+            "note": "" if usage_notes == "never" else f"fake note ({self.profile})",
+        }
+
+    def _text(self, key: str, data: Dict) -> str:
+        text = json.dumps(data, ensure_ascii=False)
+        h = hashlib.sha1(f"{self.seed}|malformed|{key}".encode("utf-8")).digest()
+        if int.from_bytes(h[:4], "big") / 2 ** 32 < self.malformed_rate:
+            # Cut somewhere in the second half, like a response that hit its token limit
+            return text[: len(text) // 2 + h[4] % max(1, len(text) // 2)]
+        return text
+
+    def ask_missing(self, word: str, known: Dict[str, str], missing: List[str]) -> Dict[str, str]:
+        self._call("text", f"{word}|{','.join(missing)}")
+        card = self._card(word, "auto")
+        return {k: card[k] for k in missing}
+
+    def generate_card(self, word: str, usage_notes: str) -> Dict[str, str]:
+        self._call("text", word)
+        text = self._text(word, self._card(word, usage_notes))
+        return parse_card_response(word, text, self.parse_stats, "Fake", ask_missing=self.ask_missing)
+
+    def generate_cards(
+        self, words: List[str], usage_notes: str,
+        fallback: Optional[Callable[[str], Dict[str, str]]] = None,
+    ) -> Dict[str, Dict[str, str]]:
+        uniq = unique_words(words)
+        if not uniq:
+            return {}
+        # One request for the batch, so one latency draw and one error roll
+        key = "|".join(uniq)
+        self._call("text", key)
+        text = self._text(key, {w: self._card(w, usage_notes) for w in uniq})
+        return collect_batch_cards(
+            uniq, text, fallback or (lambda w: self.generate_card(w, usage_notes)), "Fake",
+            stats=self.parse_stats, ask_missing=self.ask_missing,
+        )
+
+    def tts_word(self, text: str, out_audio: Path) -> None:
+        self._call("tts", text)
+        out_audio.parent.mkdir(parents=True, exist_ok=True)
+        head = hashlib.sha1(text.encode("utf-8")).digest()
+        out_audio.write_bytes(b"ID3" + head + b"\0" * max(0, self.audio_bytes - 3 - len(head)))
+
+    def translate_oov_list(
+        self, words: List[str], source_lang_label: str, target_lang_label: str,
+        source_lang_code: str = "", target_lang_code: str = ""
+    ) -> Dict[str, str]:
+        if not words:
+            return {}
+        uniq = sorted(set(w.strip() for w in words if w.strip()))
+        self._call("translate", "|".join(uniq))
+        return {w: f"~{w}" for w in uniq}
@@ -1,8 +1,47 @@
 # src/backends/google_backend.py
-import os, re, json
+import os, html, logging, threading
 from pathlib import Path
-from typing import Dict
+from typing import Any, Callable, Dict, List, Optional
 from ..prompts import PROMPT_TEMPLATE
+from .common import (
+    CARD_SCHEMA,
+    ParseStats,
+    collect_batch_cards,
+    fields_schema,
+    format_batch_prompt,
+    format_missing_prompt,
+    http_pool_size,
+    loads_lenient,
+    object_schema,
+    parse_card_response,
+    pooled_adapter,
+    unique_words,
+)
+
+logger = logging.getLogger("flashcard_lingua")
+
+
+def gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Gemini's response_schema is an OpenAPI subset without additionalProperties."""
+    out = {k: v for k, v in schema.items() if k != "additionalProperties"}
+    if "properties" in out:
+        out["properties"] = {k: gemini_schema(v) for k, v in out["properties"].items()}
+    return out
+
+
+def _tokens(resp) -> int:
+    return int(getattr(getattr(resp, "usage_metadata", None), "total_token_count", 0) or 0)
+
+
+class _Clients:
+    """SDK clients for one set of credentials, built on first use; backends that adopt them share this object."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gemini: Dict[str, Any] = {}
+        self.tts = None
+        self.tts_types = None
+        self.translate = None
 
 class GoogleBackend:
     def __init__(self, cfg: dict):
@@ -16,31 +55,115 @@ class GoogleBackend:
         self.audio_ext = cfg.get("AUDIO_EXT", "mp3")
         self.source_lang = cfg.get("SOURCE_LANG", "Indonesisch")
         self.target_lang = cfg.get("TARGET_LANG", "Nederlands")
+        self.pool_size = http_pool_size(cfg)
+        # JSON mode with a response schema; switched off if the model rejects it
+        self.structured = bool(cfg.get("STRUCTURED_OUTPUT", True))
+        self.parse_stats = ParseStats()
+        # SDK clients are built on first use and then shared by all workers
+        self._clients = _Clients()
+        # Optional callback(endpoint, headers) for rate-limit hints; the Google SDKs do not expose them
+        self.rate_hints = None
+
+    def client_key(self):
+        return ("google", self.api_key, self.creds_path)
+
+    def model_key(self):
+        return ("google", self.gemini_model, self.tts_voice)
+
+    def adopt_clients(self, other: "GoogleBackend") -> None:
+        """Use the SDK clients of another backend with the same credentials (built lazily, once)."""
+        self._clients = other._clients
+
+    def _model(self):
+        c = self._clients
+        with c.lock:
+            if self.gemini_model not in c.gemini:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                c.gemini[self.gemini_model] = genai.GenerativeModel(self.gemini_model)
+            return c.gemini[self.gemini_model]
+
+    def _tts(self):
+        c = self._clients
+        with c.lock:
+            if c.tts is None:
+                from google.cloud import texttospeech
+                if self.creds_path: os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.creds_path
+                # One gRPC channel multiplexes concurrent calls over a single HTTP/2 connection
+                c.tts = texttospeech.TextToSpeechClient()
+                c.tts_types = texttospeech
+            return c.tts, c.tts_types
+
+    def _translate(self):
+        c = self._clients
+        with c.lock:
+            if c.translate is None:
+                from google.cloud import translate_v2 as translate
+                if self.api_key:
+                    client = translate.Client(client_options={"api_key": self.api_key})
+                else:
+                    client = translate.Client()
+                # The client's requests session is private SDK state; size its pool for
+                # concurrent workers where it is there, otherwise keep the SDK's default
+                http = getattr(client, "_http", None)
+                if hasattr(http, "mount"):
+                    http.mount("https://", pooled_adapter(self.pool_size))
+                c.translate = client
+            return c.translate
+
+    def _generate(self, prompt: str, schema: Optional[Dict[str, Any]] = None):
+        if not self.structured or schema is None:
+            return self._model().generate_content(prompt)
+        config = {"response_mime_type": "application/json", "response_schema": gemini_schema(schema)}
+        try:
+            return self._model().generate_content(prompt, generation_config=config)
+        except Exception as e:
+            msg = str(e).lower()
+            if not isinstance(e, TypeError) and "response_schema" not in msg and "response_mime_type" not in msg:
+                raise
+            logger.warning(f"Model {self.gemini_model} rejects JSON mode, falling back to plain output: {e}")
+            self.structured = False
+            return self._model().generate_content(prompt)
+
+    def ask_missing(self, word: str, known: Dict[str, str], missing: List[str]) -> Dict[str, str]:
+        """Request only the missing fields of an otherwise usable card."""
+        prompt = format_missing_prompt(word, known, missing, self.source_lang, self.target_lang)
+        resp = self._generate(prompt, fields_schema(missing))
+        try:
+            data, _ = loads_lenient(resp.text)
+        except ValueError:
+            self.parse_stats.add(failed=1, wasted_tokens=_tokens(resp))
+            return {}
+        return data if isinstance(data, dict) else {}
 
     def generate_card(self, word: str, usage_notes: str) -> Dict[str,str]:
-        import google.generativeai as genai
-        genai.configure(api_key=self.api_key)
         prompt = PROMPT_TEMPLATE.format(
             usage_notes=usage_notes,
             source_lang=self.source_lang,
             target_lang=self.target_lang,
             word=word
         )
-        resp = genai.GenerativeModel(self.gemini_model).generate_content(prompt)
-        text = resp.text.strip()
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if not m:
-            raise ValueError(f"Geen JSON in Gemini-output voor '{word}': {text}")
-        data = json.loads(m.group(0))
-        for k in ("translation", "example_src", "example_tgt", "note"):
-            if k not in data or (k != "note" and not str(data[k]).strip()):
-                raise ValueError(f"Gemini JSON onvolledig voor '{word}': {data}")
-        return data
+        resp = self._generate(prompt, CARD_SCHEMA)
+        return parse_card_response(
+            word, resp.text.strip(), self.parse_stats, "Gemini", ask_missing=self.ask_missing, tokens=_tokens(resp)
+        )
+
+    def generate_cards(
+        self, words: List[str], usage_notes: str,
+        fallback: Optional[Callable[[str], Dict[str, str]]] = None,
+    ) -> Dict[str, Dict[str, str]]:
+        uniq = unique_words(words)
+        if not uniq:
+            return {}
+        prompt = format_batch_prompt(uniq, usage_notes, self.source_lang, self.target_lang)
+        resp = self._generate(prompt, object_schema(uniq, CARD_SCHEMA))
+        return collect_batch_cards(
+            uniq, resp.text.strip(), fallback or (lambda w: self.generate_card(w, usage_notes)), "Gemini",
+            stats=self.parse_stats, ask_missing=self.ask_missing, tokens=_tokens(resp),
+        )
 
     def tts_word(self, text: str, out_audio: Path) -> None:
-        from google.cloud import texttospeech
-        if self.creds_path: os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.creds_path
-        client = texttospeech.TextToSpeechClient()
+        client, texttospeech = self._tts()
         input_cfg = texttospeech.SynthesisInput(text=text)
         voice = texttospeech.VoiceSelectionParams(language_code=self.tts_lang, name=self.tts_voice)
         audio_cfg = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
@@ -54,21 +177,22 @@ class GoogleBackend:
         if not words:
             return {}
         try:
-            from google.cloud import translate_v2 as translate
-        except Exception:
+            client = self._translate()
+        except ImportError:
             return {}
-        if self.api_key:
-            client = translate.Client(api_key=self.api_key)
-        else:
-            client = translate.Client()
+        uniq = sorted(set(words))
         out = {}
-        for w in sorted(set(words)):
+        # The v2 API accepts up to 128 segments per request
+        for i in range(0, len(uniq), 128):
+            chunk = uniq[i:i + 128]
             try:
                 if source_lang_code:
-                    res = client.translate(w, target_language=target_lang_code, source_language=source_lang_code)
+                    res = client.translate(chunk, target_language=target_lang_code, source_language=source_lang_code)
                 else:
-                    res = client.translate(w, target_language=target_lang_code)
-                out[w] = res["translatedText"]
-            except Exception:
+                    res = client.translate(chunk, target_language=target_lang_code)
+            except Exception as e:
+                logger.warning(f"Google Translate failed for {len(chunk)} words: {e}")
                 continue
+            for w, r in zip(chunk, res):
+                out[w] = html.unescape(r["translatedText"])
         return out
@@ -1,12 +1,45 @@
 # src/backends/openai_backend.py
-import re
-import requests
+import logging
 import json as _json
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Mapping, Optional
 
-from openai import OpenAI
 from ..prompts import SYSTEM_NOTE, PROMPT_TEMPLATE
+from .common import (
+    CARD_SCHEMA,
+    BackendHTTPError,
+    ParseStats,
+    collect_batch_cards,
+    fields_schema,
+    format_batch_prompt,
+    format_missing_prompt,
+    http_pool_size,
+    loads_lenient,
+    object_schema,
+    parse_card_response,
+    parse_mapping,
+    pooled_adapter,
+    unique_words,
+)
+
+logger = logging.getLogger("flashcard_lingua")
+
+# Strict json_schema mode allows at most 100 object properties; larger batches use plain JSON mode
+_MAX_SCHEMA_PROPERTIES = 100
+
+
+def _tokens(resp) -> int:
+    return int(getattr(getattr(resp, "usage", None), "total_tokens", 0) or 0)
+
+
+def schema_properties(schema: Dict) -> int:
+    """Object properties in a schema, nested ones included (a batch counts every card's fields)."""
+    props = schema.get("properties", {})
+    n = len(props) + sum(schema_properties(v) for v in props.values() if isinstance(v, dict))
+    if isinstance(schema.get("items"), dict):
+        n += schema_properties(schema["items"])
+    return n
+
 
 class OpenAIBackend:
     def __init__(self, cfg: dict):
@@ -18,22 +51,92 @@ class OpenAIBackend:
         self.source_lang = cfg.get("SOURCE_LANG", "Indonesisch")
         self.target_lang = cfg.get("TARGET_LANG", "Nederlands")
         self.temperature_cfg = cfg.get("TEMPERATURE", None)
-        self.client = OpenAI(api_key=self.key)
+        self.timeout = float(cfg.get("HTTP_TIMEOUT", 120))
+        # Structured outputs (response_format json_schema); a schema the model rejects is sent
+        # without response_format from then on, the other schemas stay structured
+        self.structured = bool(cfg.get("STRUCTURED_OUTPUT", True))
+        self.rejected_schemas: set = set()
+        self.parse_stats = ParseStats()
+        pool_size = http_pool_size(cfg)
+        keepalive = float(cfg.get("HTTP_KEEPALIVE_EXPIRY", 30))
+
+        # The SDKs are imported here rather than at module level (slow, and unused on cached runs)
+        import httpx
+        import requests
+        from openai import DefaultHttpxClient, OpenAI
+
+        # One pooled, keep-alive HTTP client per backend, shared by all workers
+        self.base_url = (cfg.get("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        self.client = OpenAI(
+            api_key=self.key,
+            base_url=self.base_url,
+            http_client=DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=keepalive,
+                ),
+            ),
+        )
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {self.key}", "Content-Type": "application/json"})
+        self.session.mount("https://", pooled_adapter(pool_size))
+        self.session.mount("http://", pooled_adapter(pool_size))
+        # Optional callback(endpoint, headers) for rate-limit hints, set by the runner
+        self.rate_hints: Optional[Callable[[str, Mapping[str, str]], None]] = None
+
+    def client_key(self):
+        return ("openai", self.base_url, self.key)
+
+    def model_key(self):
+        return ("openai", self.base_url, self.text_model, self.tts_model)
+
+    def adopt_clients(self, other: "OpenAIBackend") -> None:
+        """Use the pooled connections of another backend with the same endpoint and key."""
+        self.client = other.client
+        self.session = other.session
+
+    def _create(self, endpoint: str, **kwargs):
+        # Raw response so the x-ratelimit-* headers reach the rate limiter
+        raw = self.client.chat.completions.with_raw_response.create(model=self.text_model, **kwargs)
+        if self.rate_hints is not None:
+            self.rate_hints(endpoint, raw.headers)
+        return raw.parse()
+
+    def response_format(self, name: str, schema: Optional[Dict]) -> Optional[Dict]:
+        if not self.structured or schema is None or name in self.rejected_schemas:
+            return None
+        if schema_properties(schema) > _MAX_SCHEMA_PROPERTIES:
+            return {"type": "json_object"}
+        return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
 
-    def _chat_complete(self, messages, temperature_cfg):
+    def _chat_complete(self, messages, temperature_cfg, endpoint: str = "text", schema: Optional[Dict] = None,
+                       schema_name: str = "card"):
+        kwargs = {"messages": messages}
+        fmt = self.response_format(schema_name, schema)
+        if fmt is not None:
+            kwargs["response_format"] = fmt
         if temperature_cfg is not None:
-            try:
-                return self.client.chat.completions.create(
-                    model=self.text_model, messages=messages, temperature=float(temperature_cfg)
+            kwargs["temperature"] = float(temperature_cfg)
+        try:
+            return self._create(endpoint, **kwargs)
+        except Exception as e:
+            msg = str(e).lower()
+            if "temperature" in kwargs and "temperature" in msg and "unsupported" in msg:
+                kwargs.pop("temperature")
+            elif fmt is not None and ("response_format" in msg or "json_schema" in msg):
+                logger.warning(
+                    f"Model {self.text_model} rejects structured output for '{schema_name}', "
+                    f"falling back to plain JSON: {e}"
                 )
-            except Exception as e:
-                if "temperature" in str(e).lower() and "unsupported" in str(e).lower():
-                    return self.client.chat.completions.create(model=self.text_model, messages=messages)
+                self.rejected_schemas.add(schema_name)
+                kwargs.pop("response_format")
+            else:
                 raise
-        return self.client.chat.completions.create(model=self.text_model, messages=messages)
+            return self._create(endpoint, **kwargs)
 
-    def generate_card(self, word: str, usage_notes: str) -> Dict[str, str]:
-        messages = [
+    def card_messages(self, word: str, usage_notes: str) -> List[Dict[str, str]]:
+        return [
             {"role": "system", "content": SYSTEM_NOTE},
             {
                 "role": "user",
@@ -45,50 +148,132 @@ class OpenAIBackend:
                 ),
             },
         ]
-        resp = self._chat_complete(messages, self.temperature_cfg)
-        text = resp.choices[0].message.content.strip()
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if not m:
-            raise ValueError(f"Geen JSON in OpenAI-output voor '{word}': {text}")
-        data = _json.loads(m.group(0))
-        for k in ("translation", "example_src", "example_tgt", "note"):
-            if k not in data or (k != "note" and not str(data[k]).strip()):
-                raise ValueError(f"OpenAI JSON onvolledig voor '{word}': {data}")
-        return data
+
+    def parse_card(self, word: str, text: str, tokens: int = 0, ask_missing=None) -> Dict[str, str]:
+        return parse_card_response(word, text, self.parse_stats, "OpenAI", ask_missing=ask_missing, tokens=tokens)
+
+    def ask_missing(self, word: str, known: Dict[str, str], missing: List[str]) -> Dict[str, str]:
+        """Request only the missing fields of an otherwise usable card."""
+        messages = [
+            {"role": "system", "content": SYSTEM_NOTE},
+            {"role": "user", "content": format_missing_prompt(word, known, missing, self.source_lang, self.target_lang)},
+        ]
+        resp = self._chat_complete(messages, self.temperature_cfg, schema=fields_schema(missing), schema_name="card_fields")
+        try:
+            data, _ = loads_lenient(resp.choices[0].message.content or "")
+        except ValueError:
+            self.parse_stats.add(failed=1, wasted_tokens=_tokens(resp))
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def generate_card(self, word: str, usage_notes: str) -> Dict[str, str]:
+        resp = self._chat_complete(self.card_messages(word, usage_notes), self.temperature_cfg, schema=CARD_SCHEMA)
+        return self.parse_card(
+            word, (resp.choices[0].message.content or "").strip(), tokens=_tokens(resp), ask_missing=self.ask_missing
+        )
+
+    def generate_cards(
+        self, words: List[str], usage_notes: str,
+        fallback: Optional[Callable[[str], Dict[str, str]]] = None,
+    ) -> Dict[str, Dict[str, str]]:
+        uniq = unique_words(words)
+        if not uniq:
+            return {}
+        messages = [
+            {"role": "system", "content": SYSTEM_NOTE},
+            {
+                "role": "user",
+                "content": format_batch_prompt(uniq, usage_notes, self.source_lang, self.target_lang),
+            },
+        ]
+        resp = self._chat_complete(
+            messages, self.temperature_cfg, schema=object_schema(uniq, CARD_SCHEMA), schema_name="cards"
+        )
+        text = (resp.choices[0].message.content or "").strip()
+        return collect_batch_cards(
+            uniq, text, fallback or (lambda w: self.generate_card(w, usage_notes)), "OpenAI",
+            stats=self.parse_stats, ask_missing=self.ask_missing, tokens=_tokens(resp),
+        )
 
     def tts_word(self, text: str, out_audio: Path) -> None:
-        url = "https://api.openai.com/v1/audio/speech"
-        headers = {"Authorization": f"Bearer {self.key}", "Content-Type": "application/json"}
+        url = f"{self.base_url}/audio/speech"
         payload = {"model": self.tts_model, "voice": self.voice, "input": text, "format": self.audio_ext}
-        r = requests.post(url, headers=headers, json=payload, timeout=120)
+        r = self.session.post(url, json=payload, timeout=self.timeout)
+        if self.rate_hints is not None:
+            self.rate_hints("tts", r.headers)
         if r.status_code != 200:
-            raise RuntimeError(f"OpenAI TTS fout (HTTP {r.status_code}): {r.text}")
+            raise BackendHTTPError(f"OpenAI TTS fout (HTTP {r.status_code}): {r.text}", r.status_code, r.headers)
         out_audio.parent.mkdir(parents=True, exist_ok=True)
         out_audio.write_bytes(r.content)
 
-    def translate_oov_list(
-        self, words: List[str], source_lang_label: str, target_lang_label: str,
-        source_lang_code: str = "", target_lang_code: str = ""
-    ) -> Dict[str, str]:
-        if not words:
-            return {}
-        uniq = sorted(set(w.strip() for w in words if w.strip()))
+    def oov_messages(self, words: List[str], source_lang_label: str, target_lang_label: str) -> List[Dict[str, str]]:
         prompt = (
             "Vertaal elk van de volgende woorden van {src} naar {tgt}. "
             "Geef uitsluitend JSON terug met een mapping {{woord: korte vertaling}}; geen extra tekst.\n"
-            "Woorden: " + ", ".join(uniq)
+            "Woorden: " + ", ".join(words)
         ).format(src=source_lang_label, tgt=target_lang_label)
-        msg = [
+        return [
             {"role": "system", "content": "Je geeft alleen JSON terug met woord->korte vertaling (max 3 woorden)."},
             {"role": "user", "content": prompt},
         ]
-        resp = self._chat_complete(msg, self.temperature_cfg)
-        text = resp.choices[0].message.content.strip()
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if not m:
-            return {}
-        try:
-            data = _json.loads(m.group(0))
-            return {str(k).strip(): str(v).strip() for k, v in data.items()}
-        except Exception:
+
+    @staticmethod
+    def parse_oov(text: str) -> Dict[str, str]:
+        return parse_mapping(text)
+
+    @staticmethod
+    def oov_schema(words: List[str]) -> Dict:
+        return object_schema(words, {"type": "string"})
+
+    def translate_oov_list(
+        self, words: List[str], source_lang_label: str, target_lang_label: str,
+        source_lang_code: str = "", target_lang_code: str = ""
+    ) -> Dict[str, str]:
+        if not words:
             return {}
+        uniq = sorted(set(w.strip() for w in words if w.strip()))
+        msg = self.oov_messages(uniq, source_lang_label, target_lang_label)
+        resp = self._chat_complete(
+            msg, self.temperature_cfg, endpoint="translate", schema=self.oov_schema(uniq), schema_name="oov"
+        )
+        return parse_mapping((resp.choices[0].message.content or "").strip(), self.parse_stats, _tokens(resp))
+
+    # --- Batch API (offline bulk mode) ---
+
+    def batch_request(
+        self, custom_id: str, messages: List[Dict[str, str]], schema: Optional[Dict] = None, schema_name: str = "card"
+    ) -> Dict:
+        body = {"model": self.text_model, "messages": messages}
+        fmt = self.response_format(schema_name, schema)
+        if fmt is not None:
+            body["response_format"] = fmt
+        if self.temperature_cfg is not None:
+            body["temperature"] = float(self.temperature_cfg)
+        return {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+
+    def submit_batch(self, jsonl_path: Path, metadata: Optional[Dict[str, str]] = None) -> str:
+        with jsonl_path.open("rb") as f:
+            up = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=up.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata=metadata or None,
+        )
+        return batch.id
+
+    def retrieve_batch(self, batch_id: str):
+        return self.client.batches.retrieve(batch_id)
+
+    def batch_output(self, file_id: str) -> List[Dict]:
+        """Lines of a batch output/error file as dicts."""
+        text = self.client.files.content(file_id).text
+        out = []
+        for ln in text.splitlines():
+            ln = ln.strip()
+            if ln:
+                try:
+                    out.append(_json.loads(ln))
+                except ValueError:
+                    continue
+        return out
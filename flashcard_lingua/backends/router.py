@@ -0,0 +1,365 @@
+# src/backends/router.py
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from ..ratelimit import is_throttle_exception
+
+logger = logging.getLogger("flashcard_lingua")
+
+ENDPOINTS = ("text", "tts", "translate")
+
+# Backend method per routed endpoint
+_METHODS = {
+    "generate_card": "text",
+    "generate_cards": "text",
+    "tts_word": "tts",
+    "translate_oov_list": "translate",
+}
+
+_DEFAULTS = {
+    "window": 50,
+    "min_calls": 10,
+    "error_threshold": 0.5,
+    "cooldown_s": 30,
+    "latency_alpha": 0.2,
+    "window_s": 300,
+    "explore": 0.05,
+}
+
+# Breaker states as exported in metrics (router_state)
+STATE_CODES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def router_children(cfg: Dict) -> List[Tuple[str, str, Dict]]:
+    """
+    ROUTER["backends"] as (route name, backend name, backend config). Names are "openai",
+    "google" or "fake:<profile>" (the fake backend with that FAKE_PROFILE), given as a list
+    or as {name: weight}.
+    """
+    conf = (cfg.get("ROUTER", {}) or {}).get("backends") or ["openai", "google"]
+    names = list(conf) if isinstance(conf, (list, dict)) else [conf]
+    out = []
+    for name in names:
+        kind, _, profile = str(name).partition(":")
+        kind = kind.lower()
+        if kind == "fake":
+            out.append((name, kind, dict(cfg, FAKE_PROFILE=profile or "openai")))
+        elif kind in ("openai", "google"):
+            out.append((name, kind, cfg))
+        else:
+            raise ValueError(f"ROUTER backend '{name}' must be 'openai', 'google' or 'fake:<profile>'.")
+    return out
+
+
+class Route:
+    """
+    One backend on one endpoint: a rolling window of outcomes (at most window calls, none
+    older than window_s), a moving average of the latency of successful calls, and a
+    circuit breaker.
+
+    The breaker opens when at least min_calls of the last window calls are known and the
+    error share reaches error_threshold. After cooldown_s one probe call is let through
+    (half open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name: str, endpoint: str, weight: float, opts: Dict):
+        self.name = name
+        self.endpoint = endpoint
+        self.weight = max(0.0, float(weight))
+        self.window: deque = deque(maxlen=max(1, int(opts["window"])))
+        self.min_calls = max(1, int(opts["min_calls"]))
+        self.threshold = float(opts["error_threshold"])
+        self.cooldown = float(opts["cooldown_s"])
+        self.alpha = float(opts["latency_alpha"])
+        self.max_age = float(opts["window_s"])
+        self.explore = min(1.0, max(0.0, float(opts["explore"])))
+        self.latency: Optional[float] = None
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.calls = 0
+        self.errors = 0
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self.window and now - self.window[0][0] > self.max_age:
+            self.window.popleft()
+
+    def error_rate(self) -> float:
+        return (sum(1 for _t, ok in self.window if not ok) / len(self.window)) if self.window else 0.0
+
+    def available(self, now: float) -> bool:
+        """Whether a call could go here now (no side effects; see claim)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                return now - self.opened_at >= self.cooldown
+            return not self.probing
+
+    def claim(self, now: float) -> bool:
+        """Take the route for one call; a call after the cooldown becomes the single probe."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and now - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a claimed probe whose call was never made or never finished."""
+        with self._lock:
+            if self.state == "half_open":
+                self.probing = False
+
+    def record(self, ok: bool, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self.calls += 1
+            self.window.append((now, ok))
+            if ok:
+                self.latency = seconds if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * seconds
+            else:
+                self.errors += 1
+            if self.state != "closed":
+                # A probe, or a call forced through while every circuit was open
+                self.probing = False
+                if ok:
+                    self.state = "closed"
+                    self.window.clear()
+                    logger.info(f"Router: {self.name}/{self.endpoint} recovered, circuit closed")
+                else:
+                    self._open()
+            elif not ok and len(self.window) >= self.min_calls and self.error_rate() >= self.threshold:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.opens += 1
+        logger.warning(
+            f"Router: {self.name}/{self.endpoint} circuit open for {self.cooldown:.0f}s "
+            f"({self.error_rate():.0%} errors in the last {len(self.window)} calls)"
+        )
+
+    def score(self, best_latency: Optional[float]) -> float:
+        """
+        Share of traffic: weight, scaled down by errors (once min_calls outcomes are known)
+        and by latency relative to the fastest route, but never below explore × weight, so
+        a route that did badly keeps getting the calls that show it has recovered.
+        """
+        with self._lock:
+            self._prune(time.monotonic())
+            factor = 1.0
+            if len(self.window) >= self.min_calls:
+                factor = (1.0 - self.error_rate()) ** 2
+            if self.latency and best_latency:
+                factor *= best_latency / self.latency
+            return self.weight * max(self.explore, factor)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "endpoint": self.endpoint,
+                "state": self.state,
+                "state_code": STATE_CODES[self.state],
+                "calls": self.calls,
+                "errors": self.errors,
+                "opens": self.opens,
+                "error_rate": round(self.error_rate(), 3),
+                "latency_s": round(self.latency, 3) if self.latency is not None else None,
+            }
+
+
+class _CombinedParseStats:
+    """The backends' response-parsing counters, summed."""
+
+    def __init__(self, children: List[Any]):
+        self.children = children
+
+    def snapshot(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for ps in self.children:
+            for k, v in ps.snapshot().items():
+                out[k] = out.get(k, 0) + v
+        return out
+
+
+class RouterBackend:
+    """
+    Spreads text, TTS and translation calls over several backends (BACKEND "router").
+
+    ROUTER in config.json, e.g.
+    {"backends": {"openai": 1, "google": 2}, "weights": {"tts": {"google": 4}},
+     "window": 50, "window_s": 300, "min_calls": 10, "error_threshold": 0.5, "cooldown_s": 30,
+     "explore": 0.05}
+
+    Each call goes to a backend drawn by weight, scaled down by its recent error rate and
+    by how much slower it has been than the fastest one (each keeps at least explore of
+    its weight); backends whose circuit is open get no traffic. A failed call is retried at once on the next backend, so the retry
+    and rate-limit layers above only see errors when every backend failed. Cards are
+    cached under a provider-independent key (see cache_utils.cache_namespace).
+    """
+
+    def __init__(self, cfg: dict, factory: Optional[Callable[[Dict, str], Any]] = None):
+        if factory is None:
+            from ..resources import make_backend as factory
+        conf = cfg.get("ROUTER", {}) or {}
+        opts = dict(_DEFAULTS)
+        opts.update({k: v for k, v in conf.items() if k in _DEFAULTS})
+        base_weights = conf.get("backends") if isinstance(conf.get("backends"), dict) else {}
+        per_endpoint = conf.get("weights", {}) or {}
+
+        self.children: Dict[str, Any] = {}
+        for name, kind, child_cfg in router_children(cfg):
+            self.children[name] = factory(child_cfg, kind)
+        self.routes: Dict[str, List[Route]] = {
+            ep: [
+                Route(name, ep, (per_endpoint.get(ep, {}) or {}).get(name, base_weights.get(name, 1.0)), opts)
+                for name in self.children
+            ]
+            for ep in ENDPOINTS
+        }
+        parsers = [c.parse_stats for c in self.children.values() if getattr(c, "parse_stats", None) is not None]
+        self.parse_stats = _CombinedParseStats(parsers) if parsers else None
+        self.source_lang = cfg.get("SOURCE_LANG", "Indonesisch")
+        self.target_lang = cfg.get("TARGET_LANG", "Nederlands")
+        # Hints from one provider's headers would steer the shared limiter wrongly; they are not forwarded
+        self.rate_hints: Optional[Callable[[str, Mapping[str, str]], None]] = None
+        self._voices: Dict[str, str] = {}
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+
+    def client_key(self):
+        return ("router",) + tuple(c.client_key() for c in self.children.values())
+
+    def model_key(self):
+        return ("router",) + tuple(c.model_key() for c in self.children.values())
+
+    def adopt_clients(self, other: "RouterBackend") -> None:
+        for name, child in self.children.items():
+            donor = other.children.get(name)
+            if donor is not None:
+                child.adopt_clients(donor)
+
+    # --- routing ---
+
+    def _order(self, endpoint: str) -> List[Route]:
+        """Available routes, the first drawn by score and the rest by score, for failover."""
+        now = time.monotonic()
+        routes = [r for r in self.routes[endpoint] if r.available(now)]
+        if not routes:
+            return []
+        known = [r.latency for r in routes if r.latency]
+        best = min(known) if known else None
+        scored = sorted(((r.score(best), r) for r in routes), key=lambda x: -x[0])
+        total = sum(s for s, _ in scored)
+        if total <= 0 or len(scored) == 1:
+            return [r for _, r in scored]
+        with self._lock:
+            x = self._rng.random() * total
+        for i, (s, _r) in enumerate(scored):
+            x -= s
+            if x <= 0:
+                break
+        first = scored[i][1]
+        return [first] + [r for _, r in scored if r is not first]
+
+    def _call(self, route: Route, method: str, args, kwargs):
+        """One call on a claimed route; returns (True, result) or (False, exception)."""
+        child = self.children[route.name]
+        t0 = time.perf_counter()
+        try:
+            out = getattr(child, method)(*args, **kwargs)
+        except Exception as e:
+            route.record(False, time.perf_counter() - t0)
+            kind = "throttled" if is_throttle_exception(e) else "failed"
+            logger.info(f"Router: {route.name}/{route.endpoint} {kind} ({e}); trying the next backend")
+            return False, e
+        except BaseException:
+            # Interrupted: no verdict on the backend, but a probe must not stay claimed
+            route.release()
+            raise
+        route.record(True, time.perf_counter() - t0)
+        if route.endpoint == "tts":
+            with self._lock:
+                self._voices[str(args[0])] = self._voice(child)
+        return True, out
+
+    def _route(self, method: str, *args, **kwargs):
+        endpoint = _METHODS[method]
+        last: Optional[BaseException] = None
+        for route in self._order(endpoint):
+            # Only the route actually tried claims a half-open probe
+            if not route.claim(time.monotonic()):
+                continue
+            ok, out = self._call(route, method, args, kwargs)
+            if ok:
+                return out
+            last = out
+        if last is None:
+            # Every circuit is open (or its probe is in flight): try the one open longest rather than fail outright
+            route = min(self.routes[endpoint], key=lambda r: r.opened_at)
+            ok, out = self._call(route, method, args, kwargs)
+            if ok:
+                return out
+            last = out
+        raise last
+
+    @staticmethod
+    def _voice(b) -> str:
+        if hasattr(b, "tts_voice"):
+            return f"google:{b.tts_voice}"
+        return f"openai:{getattr(b, 'tts_model', '')}:{getattr(b, 'voice', '')}"
+
+    def voice_for(self, text: str) -> str:
+        """The voice that produced the latest audio for text (for the media manifest)."""
+        with self._lock:
+            return self._voices.pop(text, "router")
+
+    # --- backend interface ---
+
+    def generate_card(self, word: str, usage_notes: str) -> Dict[str, str]:
+        return self._route("generate_card", word, usage_notes)
+
+    def generate_cards(self, words: List[str], usage_notes: str, fallback=None) -> Dict[str, Dict[str, str]]:
+        return self._route("generate_cards", words, usage_notes, fallback=fallback)
+
+    def tts_word(self, text: str, out_audio) -> None:
+        return self._route("tts_word", text, out_audio)
+
+    def translate_oov_list(self, *args, **kwargs) -> Dict[str, str]:
+        return self._route("translate_oov_list", *args, **kwargs)
+
+    # --- reporting ---
+
+    def route_stats(self) -> List[Dict[str, Any]]:
+        return [r.stats() for ep in ENDPOINTS for r in self.routes[ep]]
+
+    def format_stats(self) -> str:
+        parts = []
+        for ep in ENDPOINTS:
+            routes = [r.stats() for r in self.routes[ep]]
+            total = sum(st["calls"] for st in routes)
+            if not total:
+                continue
+            parts.append(
+                f"{ep}: "
+                + ", ".join(
+                    f"{st['backend']} {st['calls'] / total:.0%}"
+                    + (f" ({st['errors']} err)" if st["errors"] else "")
+                    + (f" [{st['state']}]" if st["state"] != "closed" else "")
+                    for st in routes
+                )
+            )
+        return " | ".join(parts)
@@ -0,0 +1,130 @@
+# src/batch_runner.py
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .config_loader import load_config, resolve_paths
+from .resources import SharedResources
+from .runner import run_job, setup_logging
+
+logger = logging.getLogger("flashcard_lingua")
+
+
+def load_jobs(manifest_path: Path) -> Dict[str, Any]:
+    """
+    Read a batch manifest:
+
+    {"budget": 16, "parallel_jobs": 2,
+     "jobs": [{"name": "id-nl", "config": "id-nl/config.json", "words": "id-nl/words.txt",
+               "usage_notes": "auto", "max_concurrency": 8, "overrides": {"DECK_NAME": "..."}}]}
+
+    Paths are relative to the manifest; relative paths inside a job's config are
+    relative to that config file.
+    """
+    if not manifest_path.exists():
+        raise FileNotFoundError(f"Batch manifest niet gevonden op: {manifest_path}")
+    data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    base = manifest_path.parent
+    jobs: List[Dict[str, Any]] = []
+    for i, job in enumerate(data.get("jobs", [])):
+        cfg_path = base / job["config"]
+        cfg = load_config(cfg_path)
+        cfg.update(job.get("overrides", {}) or {})
+        cfg = resolve_paths(cfg, cfg_path.parent)
+        jobs.append(
+            {
+                "name": job.get("name") or f"job{i + 1}",
+                "cfg": cfg,
+                "words": base / job["words"],
+                "usage_notes": job.get("usage_notes"),
+                "max_concurrency": job.get("max_concurrency"),
+            }
+        )
+
+    out_dirs = [Path(j["cfg"]["OUTPUT_DIR"]).resolve() for j in jobs]
+    dupes = {str(d) for d in out_dirs if out_dirs.count(d) > 1}
+    if dupes:
+        raise ValueError(f"Jobs must not share an OUTPUT_DIR: {', '.join(sorted(dupes))}")
+    data["jobs"] = jobs
+    return data
+
+
+def run_batch(manifest: Dict[str, Any], budget: int = 0, parallel_jobs: int = 0) -> List[Dict[str, Any]]:
+    jobs = manifest["jobs"]
+    budget = int(budget or manifest.get("budget", 0) or 0)
+    parallel_jobs = max(1, int(parallel_jobs or manifest.get("parallel_jobs", 1) or 1))
+    shared = SharedResources(budget=budget)
+
+    def one(job: Dict[str, Any]) -> Dict[str, Any]:
+        print(f"▶️ [{job['name']}] {job['words']} → {job['cfg']['OUTPUT_DIR']}")
+        t0 = time.perf_counter()
+        try:
+            stats = run_job(
+                job["cfg"],
+                job["words"],
+                usage_notes=job["usage_notes"],
+                # Workers are cheap; with a budget the shared semaphore bounds the calls in flight
+                max_concurrency=job["max_concurrency"] or budget or None,
+                shared=shared,
+            )
+        except Exception as e:
+            logger.exception(f"Job '{job['name']}' failed")
+            stats = {"error": str(e), "elapsed_s": round(time.perf_counter() - t0, 2)}
+        stats["name"] = job["name"]
+        return stats
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(parallel_jobs, len(jobs) or 1), thread_name_prefix="job") as ex:
+            return list(ex.map(one, jobs))
+    finally:
+        shared.close()
+
+
+def format_summary(results: List[Dict[str, Any]], elapsed: float) -> str:
+    lines = ["Batch summary:"]
+    for r in results:
+        if "error" in r:
+            lines.append(f"  ❌ {r['name']}: failed after {r['elapsed_s']}s: {r['error']}")
+        else:
+            lines.append(
+                f"  ✅ {r['name']}: {r['rows']} rows ({r['generated']} generated) "
+                f"in {r['elapsed_s']}s, {r['rows_per_s']} rows/s"
+            )
+    rows = sum(r.get("rows", 0) for r in results)
+    generated = sum(r.get("generated", 0) for r in results)
+    failed = sum(1 for r in results if "error" in r)
+    lines.append(
+        f"  Σ {len(results)} jobs ({failed} failed): {rows} rows ({generated} generated) "
+        f"in {elapsed:.2f}s, {rows / elapsed if elapsed > 0 else 0.0:.2f} rows/s"
+    )
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Build several decks in one process from a jobs manifest.")
+    ap.add_argument("manifest", help="Batch manifest (.json)")
+    ap.add_argument("--budget", type=int, help="Maximum API calls in flight across all jobs (overrides 'budget')")
+    ap.add_argument("--jobs", type=int, help="Jobs run side by side (overrides 'parallel_jobs')")
+    args = ap.parse_args()
+
+    manifest = load_jobs(Path(args.manifest))
+    if not manifest["jobs"]:
+        print("No jobs in manifest.")
+        sys.exit(1)
+    setup_logging(manifest["jobs"][0]["cfg"])
+
+    t0 = time.perf_counter()
+    results = run_batch(manifest, budget=args.budget or 0, parallel_jobs=args.jobs or 0)
+    print(format_summary(results, time.perf_counter() - t0))
+    if any("error" in r or not r.get("words") for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# src/bulk.py
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Container, Dict, Iterable, List, Optional
+
+from .cache_store import CacheStore
+from .cache_utils import OOVDictionary, load_state, save_state
+from .backends.common import CARD_SCHEMA
+from .io_utils import oov_tokens
+
+logger = logging.getLogger("flashcard_lingua")
+
+_TERMINAL = ("completed", "failed", "expired", "cancelled")
+# The Batch API accepts at most 50,000 requests per input file
+_MAX_REQUESTS = 50000
+
+
+class BulkRunner:
+    """
+    Offline bulk mode on the OpenAI Batch API.
+
+    Cache-missing cards (and optionally the unknown OOV tokens) are written to a
+    Batch-API JSONL file, submitted, polled and ingested into the cache / OOV
+    dictionary. The normal pipeline then builds the deck from the cache; anything
+    the batch did not deliver is generated live.
+
+    Submitted batch ids are kept in BULK_DIR/state.json, so an interrupted run
+    (e.g. Ctrl+C while polling) picks up the same batches instead of resubmitting.
+    """
+
+    def __init__(self, cfg: Dict, backend, bulk_dir: Path):
+        self.backend = backend
+        self.bulk_dir = bulk_dir
+        self.state_path = bulk_dir / "state.json"
+        self.poll_interval = float(cfg.get("BULK_POLL_INTERVAL", 30))
+        self.max_requests = min(_MAX_REQUESTS, int(cfg.get("BULK_MAX_REQUESTS", _MAX_REQUESTS)))
+
+    # --- phases ---
+
+    def run_cards(
+        self,
+        words: Iterable[str],
+        usage_notes: str,
+        cache: CacheStore,
+        key_fn: Callable[[str], str],
+        old_keys: Optional[Callable[[List[str]], Dict[str, List[str]]]] = None,
+    ) -> int:
+        def build() -> Dict[str, str]:
+            keys = {w: key_fn(w) for w in dict.fromkeys(words)}
+            cached = cache.lookup(keys.values(), old_keys(list(keys)) if old_keys else None)
+            misses = [w for w, k in keys.items() if k not in cached]
+            print(f"Bulk: {len(keys) - len(misses)} cards cached, {len(misses)} to request")
+            return {f"card-{i}": w for i, w in enumerate(misses)}
+
+        def request(cid: str, word: str) -> Dict:
+            return self.backend.batch_request(cid, self.backend.card_messages(word, usage_notes), schema=CARD_SCHEMA)
+
+        def ingest(ids: Dict[str, str], results: Dict[str, str]) -> int:
+            items = []
+            for cid, content in results.items():
+                word = ids.get(cid)
+                if word is None:
+                    continue
+                try:
+                    items.append((key_fn(word), self.backend.parse_card(word, content)))
+                except Exception as e:
+                    logger.info(f"Bulk: unusable card for '{word}' ({e}); it will be generated live")
+            cache.put_many(items)
+            return len(items)
+
+        return self._phase("cards", build, request, ingest)
+
+    def run_oov(
+        self,
+        words: Iterable[str],
+        cache: CacheStore,
+        key_fn: Callable[[str], str],
+        vocab: Container[str],
+        oov_dict: OOVDictionary,
+        source_lang: str,
+        target_lang: str,
+        batch_size: int,
+        old_keys: Optional[Callable[[List[str]], Dict[str, List[str]]]] = None,
+    ) -> int:
+        def build() -> Dict[str, List[str]]:
+            keys = {w: key_fn(w) for w in dict.fromkeys(words)}
+            cached = cache.lookup(keys.values(), old_keys(list(keys)) if old_keys else None)
+            tokens: List[str] = []
+            for w, k in keys.items():
+                if k in cached:
+                    tokens.extend(oov_tokens(cached[k].get("example_src", ""), w.strip().lower(), vocab))
+            unknown = oov_dict.missing(tokens)
+            print(f"Bulk: {len(unknown)} unknown OOV tokens to translate")
+            return {
+                f"oov-{i // batch_size}": unknown[i:i + batch_size]
+                for i in range(0, len(unknown), batch_size)
+            }
+
+        def request(cid: str, chunk: List[str]) -> Dict:
+            return self.backend.batch_request(
+                cid,
+                self.backend.oov_messages(chunk, source_lang, target_lang),
+                schema=self.backend.oov_schema(chunk),
+                schema_name="oov",
+            )
+
+        def ingest(ids: Dict[str, List[str]], results: Dict[str, str]) -> int:
+            n = 0
+            for cid, content in results.items():
+                if cid in ids:
+                    mapping = self.backend.parse_oov(content)
+                    oov_dict.update(mapping)
+                    n += len(mapping)
+            oov_dict.save()
+            return n
+
+        return self._phase("oov", build, request, ingest)
+
+    # --- submit / poll / ingest ---
+
+    def _phase(self, name: str, build, request, ingest) -> int:
+        state = load_state(self.state_path)
+        pending = state.get(name)
+        if pending:
+            print(f"Bulk {name}: resuming {len(pending)} submitted batch(es)")
+        else:
+            ids = build()
+            if not ids:
+                return 0
+            pending = []
+            items = list(ids.items())
+            for part, start in enumerate(range(0, len(items), self.max_requests)):
+                chunk = dict(items[start:start + self.max_requests])
+                path = self.bulk_dir / f"{name}-{int(time.time())}-{part}.jsonl"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with path.open("w", encoding="utf-8") as f:
+                    for cid, payload in chunk.items():
+                        f.write(json.dumps(request(cid, payload), ensure_ascii=False) + "\n")
+                batch_id = self.backend.submit_batch(path, metadata={"flashcard_lingua": name})
+                print(f"Bulk {name}: submitted {len(chunk)} requests as {batch_id} ({path})")
+                pending.append({"batch_id": batch_id, "ids": chunk})
+                state[name] = pending
+                save_state(self.state_path, state)
+
+        total = 0
+        for entry in pending:
+            batch = self._wait(entry["batch_id"])
+            results = self._results(batch)
+            n = ingest(entry["ids"], results)
+            total += n
+            print(f"Bulk {name}: {batch.id} {batch.status}, {n} item(s) ingested from {len(entry['ids'])} request(s)")
+
+        state.pop(name, None)
+        save_state(self.state_path, state)
+        return total
+
+    def _wait(self, batch_id: str):
+        last = None
+        while True:
+            batch = self.backend.retrieve_batch(batch_id)
+            counts = getattr(batch, "request_counts", None)
+            progress = f"{counts.completed + counts.failed}/{counts.total}" if counts else "?"
+            if (batch.status, progress) != last:
+                print(f"Bulk: {batch_id} {batch.status} ({progress})")
+                last = (batch.status, progress)
+            if batch.status in _TERMINAL:
+                return batch
+            time.sleep(self.poll_interval)
+
+    def _results(self, batch) -> Dict[str, str]:
+        """custom_id -> message content of every successful request (expired batches keep partial output)."""
+        out: Dict[str, str] = {}
+        file_id: Optional[str] = getattr(batch, "output_file_id", None)
+        if not file_id:
+            return out
+        for line in self.backend.batch_output(file_id):
+            resp = line.get("response") or {}
+            if resp.get("status_code") != 200:
+                continue
+            try:
+                content = resp["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                continue
+            if content:
+                out[line.get("custom_id", "")] = content.strip()
+        return out
@@ -0,0 +1,330 @@
+# src/cache_pack.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .cache_store import SqliteCacheStore, open_cache_store
+from .cache_utils import CACHE_KEY_VERSION, OOVDictionary, cache_namespace, lang_pair, oov_dict_path
+from .media_manifest import MediaManifest
+
+logger = logging.getLogger("flashcard_lingua")
+
+PACK_FORMAT = "flashcard_lingua-cache-pack"
+PACK_VERSION = 1
+
+_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE cards (key TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE oov (pair TEXT NOT NULL, token TEXT NOT NULL, translation TEXT NOT NULL, PRIMARY KEY (pair, token)) WITHOUT ROWID;
+CREATE TABLE media (name TEXT PRIMARY KEY, sha1 TEXT, entry TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE blobs (sha1 TEXT PRIMARY KEY, data BLOB NOT NULL);
+"""
+
+
+def _media_paths(cfg: Dict):
+    out_dir = Path(cfg.get("OUTPUT_DIR", "out"))
+    media_dir = out_dir / cfg.get("OUTPUT_MEDIA_DIR", "media")
+    return Path(cfg.get("MEDIA_MANIFEST", str(out_dir / "media_manifest.json"))), media_dir
+
+
+def _safe_media_name(name: str) -> bool:
+    """A plain file name: packs come from other machines, so a name must not reach outside the media directory."""
+    return bool(name) and ".." not in name and "/" not in name and "\\" not in name and "\0" not in name
+
+
+def _oov_files(cfg: Dict) -> Dict[str, Path]:
+    """Language pair -> OOV dictionary file, for every dictionary in CACHE_DIR plus this config's own."""
+    files = {}
+    for p in sorted(Path(cfg.get("CACHE_DIR", "cache")).glob("oov_*.json")):
+        files[p.stem[len("oov_"):]] = p
+    files[lang_pair(cfg)] = oov_dict_path(cfg)
+    return files
+
+
+class CachePack:
+    """
+    A read-only cache pack: one SQLite file with cards, OOV dictionaries and media (index
+    and optionally the audio itself), opened immutable and memory-mapped, so several
+    processes can share one copy, e.g. on a read-only volume.
+    """
+
+    def __init__(self, path: Path, mmap_bytes: int = 256 << 20):
+        if not path.is_file():
+            raise FileNotFoundError(f"Cache pack niet gevonden: {path}")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+        try:
+            self.meta = dict(self._conn.execute("SELECT name, value FROM meta"))
+        except sqlite3.DatabaseError:
+            self.meta = {}
+        if self.meta.get("format") != PACK_FORMAT:
+            self._conn.close()
+            raise ValueError(f"{path} is geen cache pack")
+        if int(self.meta.get("version", 0)) > PACK_VERSION:
+            self._conn.close()
+            raise ValueError(f"{path} heeft pack-versie {self.meta.get('version')}; deze versie leest t/m {PACK_VERSION}")
+        # Card keys from another key version would never match; the pack still serves OOV and media
+        self.cards_usable = self.meta.get("key_version") == CACHE_KEY_VERSION
+        if not self.cards_usable:
+            logger.warning(
+                f"Cache pack {path}: card keys are {self.meta.get('key_version')}, expected {CACHE_KEY_VERSION}; cards ignored"
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        if not self.cards_usable:
+            return {}
+        keys = list(dict.fromkeys(keys))
+        out = {}
+        with self._lock:
+            for i in range(0, len(keys), _CHUNK):
+                chunk = keys[i:i + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for k, raw in self._conn.execute(f"SELECT key, data FROM cards WHERE key IN ({marks})", chunk):
+                    try:
+                        out[k] = json.loads(raw)
+                    except ValueError:
+                        continue
+        return out
+
+    def iter_cards(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, data FROM cards ORDER BY key").fetchall()
+        for k, raw in rows:
+            yield k, json.loads(raw)
+
+    def oov_pairs(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT pair FROM oov ORDER BY pair")]
+
+    def oov(self, pair: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT token, translation FROM oov WHERE pair=?", (pair,)))
+
+    def media_names(self) -> List[str]:
+        """Media files the pack can restore (the index may list more when exported without audio)."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT m.name FROM media m JOIN blobs b ON b.sha1 = m.sha1 ORDER BY m.name"
+            )]
+
+    def restore_media(self, name: str, manifest: MediaManifest) -> bool:
+        """Write a media file stored in the pack into manifest's directory and index it. False if the pack lacks it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT m.entry, b.data FROM media m JOIN blobs b ON b.sha1 = m.sha1 WHERE m.name=?", (name,)
+            ).fetchone()
+        if row is None:
+            return False
+        if not _safe_media_name(name):
+            logger.warning(f"Cache pack {self.path.name}: media file name {name!r} rejected")
+            return False
+        dst = manifest.media_dir / name
+        tmp = dst.with_name(f".{name}.pack")
+        tmp.write_bytes(row[1])
+        os.replace(tmp, dst)
+        manifest.adopt(name, json.loads(row[0]))
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_packs(cfg: Dict) -> List[CachePack]:
+    paths = cfg.get("CACHE_PACKS") or []
+    if isinstance(paths, str):
+        paths = [paths]
+    return [CachePack(Path(p), mmap_bytes=int(cfg.get("CACHE_PACK_MMAP_MB", 256)) << 20) for p in paths]
+
+
+def export_pack(
+    cfg: Dict,
+    dest: Path,
+    media_files: bool = True,
+    current_only: bool = False,
+    backend_name: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Write the local cache to a pack: cards under the current key version (with
+    current_only, only those of this config's backend/model/languages/prompts), every OOV
+    dictionary in CACHE_DIR and the media manifest, plus the audio files unless media_files
+    is False. The file is built next to dest, vacuumed and renamed into place.
+    """
+    if (cfg.get("CACHE_BACKEND", "sqlite") or "sqlite").lower() != "sqlite":
+        raise ValueError("Cache packs vereisen CACHE_BACKEND 'sqlite'.")
+    store = open_cache_store(dict(cfg, CACHE_PACKS=[]))
+    if not isinstance(store, SqliteCacheStore):
+        raise ValueError("Cache packs vereisen een lokale SQLite-cache.")
+    if current_only:
+        prefix = cache_namespace(cfg, (backend_name or cfg.get("BACKEND", "openai")).lower()) + "/"
+    else:
+        prefix = CACHE_KEY_VERSION + ":"
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(str(tmp))
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.executescript(_SCHEMA)
+    counts = {"cards": 0, "oov": 0, "media": 0, "blobs": 0, "blob_bytes": 0}
+    try:
+        batch = []
+        for row in store.iter_items(prefix):
+            batch.append(row)
+            if len(batch) >= _CHUNK:
+                conn.executemany("INSERT INTO cards(key, data) VALUES (?, ?)", batch)
+                counts["cards"] += len(batch)
+                batch = []
+        conn.executemany("INSERT INTO cards(key, data) VALUES (?, ?)", batch)
+        counts["cards"] += len(batch)
+
+        for pair, path in _oov_files(cfg).items():
+            entries = OOVDictionary(path).entries
+            conn.executemany(
+                "INSERT OR REPLACE INTO oov(pair, token, translation) VALUES (?, ?, ?)",
+                [(pair, k, v) for k, v in entries.items()],
+            )
+            counts["oov"] += len(entries)
+
+        manifest_path, media_dir = _media_paths(cfg)
+        manifest = MediaManifest(manifest_path, media_dir, trust=True)
+        for name, entry in sorted(manifest.entries.items()):
+            sha1 = entry.get("sha1")
+            conn.execute(
+                "INSERT INTO media(name, sha1, entry) VALUES (?, ?, ?)",
+                (name, sha1, json.dumps(entry, ensure_ascii=False, sort_keys=True)),
+            )
+            counts["media"] += 1
+            src = media_dir / name
+            if not (media_files and sha1 and src.is_file()):
+                continue
+            if conn.execute("SELECT 1 FROM blobs WHERE sha1=?", (sha1,)).fetchone() is None:
+                data = src.read_bytes()
+                conn.execute("INSERT INTO blobs(sha1, data) VALUES (?, ?)", (sha1, data))
+                counts["blobs"] += 1
+                counts["blob_bytes"] += len(data)
+
+        meta = {
+            "format": PACK_FORMAT,
+            "version": str(PACK_VERSION),
+            "key_version": CACHE_KEY_VERSION,
+            "created": str(int(time.time())),
+            "prefix": prefix,
+            "media_files": "1" if media_files else "0",
+        }
+        meta.update((f"count_{k}", str(v)) for k, v in counts.items())
+        conn.executemany("INSERT INTO meta(name, value) VALUES (?, ?)", meta.items())
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+        store.close()
+    os.replace(tmp, dest)
+    return counts
+
+
+def import_pack(cfg: Dict, src: Path, media_files: bool = True) -> Dict[str, int]:
+    """
+    Copy a pack into the local cache, OOV dictionaries and media directory. Entries that
+    already exist locally are kept.
+    """
+    pack = CachePack(src)
+    counts = {"cards": 0, "oov": 0, "media": 0}
+    try:
+        store = open_cache_store(dict(cfg, CACHE_PACKS=[]))
+        try:
+            batch = []
+            for item in pack.iter_cards() if pack.cards_usable else ():
+                batch.append(item)
+                if len(batch) >= _CHUNK:
+                    counts["cards"] += _put_new(store, batch)
+                    batch = []
+            counts["cards"] += _put_new(store, batch)
+        finally:
+            store.close()
+
+        files = _oov_files(cfg)
+        cache_dir = Path(cfg.get("CACHE_DIR", "cache"))
+        for pair in pack.oov_pairs():
+            d = OOVDictionary(files.get(pair, cache_dir / f"oov_{pair}.json"))
+            incoming = pack.oov(pair)
+            fresh = {k: v for k, v in incoming.items() if k not in d.entries}
+            d.update(fresh)
+            d.save()
+            counts["oov"] += len(fresh)
+
+        if media_files:
+            manifest_path, media_dir = _media_paths(cfg)
+            media_dir.mkdir(parents=True, exist_ok=True)
+            manifest = MediaManifest(manifest_path, media_dir)
+            for name in pack.media_names():
+                if not manifest.has(name) and pack.restore_media(name, manifest):
+                    counts["media"] += 1
+            manifest.save()
+    finally:
+        pack.close()
+    return counts
+
+
+def _put_new(store, items) -> int:
+    if not items:
+        return 0
+    if isinstance(store, SqliteCacheStore):
+        return store.put_many(items, replace=False)
+    existing = store.get_many(k for k, _ in items)
+    new = [(k, v) for k, v in items if k not in existing]
+    store.put_many(new)
+    return len(new)
+
+
+def main():
+    import argparse
+
+    from .config_loader import load_config
+
+    ap = argparse.ArgumentParser(description="Export or import a portable, read-only cache pack.")
+    ap.add_argument("--config", default="config.json")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="Write the local cache, OOV dictionaries and media to a pack")
+    ex.add_argument("pack")
+    ex.add_argument("--no-media-files", action="store_true", help="Only the media index, not the audio")
+    ex.add_argument("--current-only", action="store_true", help="Only cards for this config's backend, model, languages and prompts")
+    im = sub.add_parser("import", help="Copy a pack into the local cache (existing entries are kept)")
+    im.add_argument("pack")
+    im.add_argument("--no-media-files", action="store_true", help="Skip the audio files")
+    info = sub.add_parser("info", help="Show a pack's metadata")
+    info.add_argument("pack")
+    args = ap.parse_args()
+
+    if args.cmd == "info":
+        pack = CachePack(Path(args.pack))
+        for k, v in sorted(pack.meta.items()):
+            print(f"{k}: {v}")
+        pack.close()
+        return
+
+    cfg = load_config(Path(args.config))
+    if args.cmd == "export":
+        n = export_pack(cfg, Path(args.pack), media_files=not args.no_media_files, current_only=args.current_only)
+        size = Path(args.pack).stat().st_size
+        print(
+            f"📦 Cache pack written: {args.pack} ({n['cards']} cards, {n['oov']} OOV entries, "
+            f"{n['media']} media entries, {n['blobs']} audio files; {size / 1e6:.1f} MB)"
+        )
+    else:
+        n = import_pack(cfg, Path(args.pack), media_files=not args.no_media_files)
+        print(f"✅ Cache pack imported: {n['cards']} cards, {n['oov']} OOV entries, {n['media']} media files added")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# src/cache_store.py
+import abc
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .cache_utils import cache_read, cache_write
+
+logger = logging.getLogger("flashcard_lingua")
+
+# SQLite's default limit on host parameters is 999
+_CHUNK = 500
+
+
+def _legacy_name(key: str) -> str:
+    # File stem the JSON directory store uses for a key (lossy: "/" and ":" both become "_")
+    return key.replace("/", "_").replace(":", "_")
+
+
+class CacheStore(abc.ABC):
+    """Key -> card data. get_many/put_many let callers look up a whole batch at once."""
+
+    # Read-only cache packs consulted on a miss (see PackedCacheStore)
+    packs: Sequence[Any] = ()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key]).get(key)
+
+    def lookup(
+        self, keys: Iterable[str], old_keys: Optional[Dict[str, Union[str, List[str]]]] = None, promote: bool = True
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        get_many(), falling back to old_keys[key] (an entry written under an earlier key
+        format or by another provider; one key or a list, first hit wins) for keys that
+        miss. With promote, such entries are copied to the new key.
+        """
+        keys = list(keys)
+        out = self.get_many(keys)
+        misses = [k for k in keys if k not in out and old_keys and k in old_keys]
+        if misses:
+            aliases = {k: [old_keys[k]] if isinstance(old_keys[k], str) else list(old_keys[k]) for k in misses}
+            old = self.get_many(dict.fromkeys(a for k in misses for a in aliases[k]))
+            moved = []
+            for k in misses:
+                hit = next((a for a in aliases[k] if a in old), None)
+                if hit is not None:
+                    moved.append((k, old[hit]))
+            out.update(moved)
+            if moved and promote:
+                self.put_many(moved)
+        return out
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        self.put_many([(key, data)])
+
+    @abc.abstractmethod
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Entries for the keys that are present."""
+
+    @abc.abstractmethod
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Store (key, data) pairs, replacing existing entries."""
+
+    def close(self) -> None:
+        pass
+
+
+class JsonDirCacheStore(CacheStore):
+    """The original layout: one pretty-printed JSON file per key."""
+
+    def __init__(self, cache_dir: Path, readonly: bool = False):
+        self.cache_dir = cache_dir
+        self.readonly = readonly
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for k in keys:
+            data = cache_read(self.cache_dir, k)
+            if data is not None:
+                out[k] = data
+        return out
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        if self.readonly:
+            raise ValueError(f"Cache {self.cache_dir} is read-only")
+        for k, data in items:
+            cache_write(self.cache_dir, k, data)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cards_accessed ON cards(accessed);
+CREATE TABLE IF NOT EXISTS legacy (name TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class SqliteCacheStore(CacheStore):
+    """
+    Single-file cache in SQLite (WAL mode, so readers in other processes are not blocked).
+
+    max_entries / max_age_days bound the cache; eviction runs on open and on close and
+    drops the entries that were least recently read first.
+
+    With readonly (--plan) the database is opened read-only: lookups do not touch access
+    times or move legacy entries, nothing is evicted, and writes are refused. A missing
+    database reads as empty.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 0, max_age_days: float = 0, readonly: bool = False):
+        self.db_path = db_path
+        self.max_entries = int(max_entries or 0)
+        self.max_age_days = float(max_age_days or 0)
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        if readonly:
+            if db_path.exists():
+                uri = f"{db_path.resolve().as_uri()}?mode=ro"
+                self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+            else:
+                self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+                self._conn.executescript(_SCHEMA)
+            return
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self.evict()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        keys = list(dict.fromkeys(keys))
+        out: Dict[str, Dict[str, Any]] = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _CHUNK):
+                chunk = keys[i:i + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for k, raw in self._conn.execute(f"SELECT key, data FROM cards WHERE key IN ({marks})", chunk):
+                    try:
+                        out[k] = json.loads(raw)
+                    except ValueError:
+                        continue
+            hits = [k for k in keys if k in out]
+            if hits and not self.readonly:
+                self._conn.executemany("UPDATE cards SET accessed=? WHERE key=?", [(now, k) for k in hits])
+            misses = [k for k in keys if k not in out]
+            if misses:
+                out.update(self._promote_legacy(misses, now))
+            if not self.readonly:
+                self._conn.commit()
+        return out
+
+    def _promote_legacy(self, keys: List[str], now: float) -> Dict[str, Dict[str, Any]]:
+        # Entries migrated from the JSON directory are stored under their lossy file stem;
+        # the first exact-key lookup moves them into the cards table.
+        if not self._has_legacy():
+            return {}
+        out = {}
+        for k in keys:
+            row = self._conn.execute("SELECT data, created FROM legacy WHERE name=?", (_legacy_name(k),)).fetchone()
+            if row is None:
+                continue
+            try:
+                out[k] = json.loads(row[0])
+            except ValueError:
+                continue
+            if self.readonly:
+                continue
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cards(key, data, created, accessed) VALUES (?, ?, ?, ?)",
+                (k, row[0], row[1], now),
+            )
+        return out
+
+    def _has_legacy(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM legacy LIMIT 1").fetchone() is not None
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]], replace: bool = True) -> int:
+        """Store entries; with replace=False existing keys are kept. Returns the number written."""
+        now = time.time()
+        rows = [(k, json.dumps(data, ensure_ascii=False), now, now) for k, data in items]
+        if not rows:
+            return 0
+        if self.readonly:
+            raise ValueError(f"Cache {self.db_path} is read-only")
+        verb = "REPLACE" if replace else "IGNORE"
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT OR {verb} INTO cards(key, data, created, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def iter_items(self, prefix: str = "") -> Iterator[Tuple[str, str]]:
+        """(key, raw JSON) of every entry whose key starts with prefix, in key order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, data FROM cards WHERE substr(key, 1, ?) = ? ORDER BY key", (len(prefix), prefix)
+            ).fetchall()
+        yield from rows
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def evict(self) -> int:
+        if self.readonly:
+            return 0
+        removed = 0
+        with self._lock:
+            if self.max_age_days > 0:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute("DELETE FROM cards WHERE created < ?", (cutoff,)).rowcount
+                removed += self._conn.execute("DELETE FROM legacy WHERE created < ?", (cutoff,)).rowcount
+            if self.max_entries > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM cards WHERE key IN ("
+                    "SELECT key FROM cards ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+        if removed:
+            logger.info(f"Cache: evicted {removed} entries from {self.db_path}")
+        return removed
+
+    def migrate_json_dir(self, cache_dir: Path) -> int:
+        """One-time import of a JSON directory cache; later calls for the same directory are no-ops."""
+        if self.readonly:
+            return 0
+        marker = f"migrated:{cache_dir.resolve()}"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE name=?", (marker,)).fetchone():
+                return 0
+        if not cache_dir.is_dir():
+            return 0
+
+        rows = []
+        for f in cache_dir.glob("*.json"):
+            try:
+                data = json.loads(f.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            # Only card entries; other JSON files may live in the same directory
+            if isinstance(data, dict) and "translation" in data and "example_src" in data:
+                rows.append((f.stem, json.dumps(data, ensure_ascii=False), f.stat().st_mtime))
+
+        with self._lock:
+            for i in range(0, len(rows), _CHUNK):
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO legacy(name, data, created) VALUES (?, ?, ?)", rows[i:i + _CHUNK]
+                )
+            self._conn.execute("INSERT OR REPLACE INTO meta(name, value) VALUES (?, ?)", (marker, str(time.time())))
+            self._conn.commit()
+        if rows:
+            logger.info(f"Cache: migrated {len(rows)} JSON entries from {cache_dir} into {self.db_path}")
+        return len(rows)
+
+    def close(self) -> None:
+        self.evict()
+        with self._lock:
+            self._conn.close()
+
+
+class PackedCacheStore(CacheStore):
+    """
+    A local store with read-only cache packs behind it (CACHE_PACKS): lookups that miss
+    locally are answered from the packs, in the order given; writes go to the local store.
+    """
+
+    def __init__(self, store: CacheStore, packs: Sequence[Any]):
+        self.store = store
+        self.packs = list(packs)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        keys = list(keys)
+        out = self.store.get_many(keys)
+        for pack in self.packs:
+            misses = [k for k in keys if k not in out]
+            if not misses:
+                break
+            out.update(pack.get_many(misses))
+        return out
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        self.store.put_many(items)
+
+    def close(self) -> None:
+        self.store.close()
+        for pack in self.packs:
+            pack.close()
+
+
+def open_cache_store(cfg: Dict, readonly: bool = False) -> CacheStore:
+    """The configured store; readonly (for --plan) skips migration and eviction and refuses writes."""
+    cache_dir = Path(cfg.get("CACHE_DIR", "cache"))
+    kind = (cfg.get("CACHE_BACKEND", "sqlite") or "sqlite").lower()
+    if kind == "json":
+        store: CacheStore = JsonDirCacheStore(cache_dir, readonly=readonly)
+    elif kind == "sqlite":
+        store = SqliteCacheStore(
+            Path(cfg.get("CACHE_DB", str(cache_dir / "cache.sqlite3"))),
+            max_entries=cfg.get("CACHE_MAX_ENTRIES", 0),
+            max_age_days=cfg.get("CACHE_MAX_AGE_DAYS", 0),
+            readonly=readonly,
+        )
+        store.migrate_json_dir(cache_dir)
+    else:
+        raise ValueError("CACHE_BACKEND must be 'sqlite' or 'json'.")
+
+    if cfg.get("CACHE_PACKS"):
+        from .cache_pack import open_packs
+
+        return PackedCacheStore(store, open_packs(cfg))
+    return store
@@ -1,12 +1,93 @@
 # src/cache_utils.py
+import functools
+import hashlib
 import json
+import threading
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List
+
+from .io_utils import safe_filename
+from .prompts import BATCH_PROMPT_TEMPLATE, MISSING_FIELDS_TEMPLATE, PROMPT_TEMPLATE, SYSTEM_NOTE
+
+# Bump when the key layout changes; entries under another version are never read as hits
+CACHE_KEY_VERSION = "v2"
+
+# The default text model of each backend, as the backends themselves fall back to it
+_DEFAULT_TEXT_MODELS = {"openai": "gpt-5-mini", "google": "gemini-1.5-flash"}
+
+
+@functools.lru_cache(maxsize=1)
+def prompt_fingerprint() -> str:
+    """Short hash of the prompt templates: editing a prompt starts a fresh cache namespace."""
+    h = hashlib.sha1()
+    for part in (SYSTEM_NOTE, PROMPT_TEMPLATE, BATCH_PROMPT_TEMPLATE, MISSING_FIELDS_TEMPLATE):
+        h.update(part.encode("utf-8") + b"\0")
+    return h.hexdigest()[:10]
+
+
+def text_model(cfg: Dict, backend_name: str) -> str:
+    """The text model the given backend actually uses."""
+    if backend_name == "openai":
+        return cfg.get("TEXT_MODEL_OPENAI", _DEFAULT_TEXT_MODELS["openai"])
+    if backend_name == "google":
+        return cfg.get("TEXT_MODEL_GOOGLE", _DEFAULT_TEXT_MODELS["google"])
+    if backend_name == "fake":
+        return "fake-" + (cfg.get("FAKE_PROFILE", "openai") or "openai").lower()
+    return ""
+
+
+def lang_pair(cfg: Dict) -> str:
+    source = cfg.get("SOURCE_LANG_CODE", "") or cfg.get("SOURCE_LANG", "Source")
+    target = cfg.get("TARGET_LANG_CODE", "") or cfg.get("TARGET_LANG", "Target")
+    return safe_filename(f"{source}_{target}")
+
+
+def cache_namespace(cfg: Dict, backend_name: str) -> str:
+    """
+    Everything besides the word and usage notes that decides a card's content. The router
+    ("any") leaves out the provider and model: a card is the same whichever backend wrote it.
+    """
+    if backend_name in ("router", "any"):
+        return f"{CACHE_KEY_VERSION}:any:{lang_pair(cfg)}:{prompt_fingerprint()}"
+    model = text_model(cfg, backend_name).replace("/", "_")
+    return f"{CACHE_KEY_VERSION}:{backend_name}:{model}:{lang_pair(cfg)}:{prompt_fingerprint()}"
+
 
 def make_cache_key(word: str, cfg: Dict, usage_notes: str, backend_name: str) -> str:
+    return f"{cache_namespace(cfg, backend_name)}/{usage_notes}/{word}"
+
+
+def legacy_cache_key(word: str, cfg: Dict, usage_notes: str, backend_name: str) -> str:
+    """The unversioned key of earlier releases (no languages or prompt, OpenAI model name for every backend)."""
     model_name = cfg.get("TEXT_MODEL_OPENAI", cfg.get("TEXT_MODEL_GOOGLE", ""))
     return f"{backend_name}:{model_name}/{usage_notes}/{word}"
 
+
+def cache_aliases(word: str, cfg: Dict, usage_notes: str, backend_name: str, legacy: bool = True) -> List[str]:
+    """
+    Other keys that may hold a usable card for word, in the order to try them. The router
+    reads what each of its backends cached on its own; a single backend reads the router's
+    provider-independent entries when CACHE_ANY_PROVIDER is set. With legacy, the
+    unversioned keys of earlier releases come last.
+    """
+    if backend_name == "router":
+        from .backends.router import router_children
+
+        children = router_children(cfg)
+        keys = [make_cache_key(word, child_cfg, usage_notes, kind) for _name, kind, child_cfg in children]
+        if legacy:
+            keys += [legacy_cache_key(word, cfg, usage_notes, kind) for _name, kind, _cfg in children]
+        return list(dict.fromkeys(keys))
+    keys = [make_cache_key(word, cfg, usage_notes, "any")] if cfg.get("CACHE_ANY_PROVIDER", False) else []
+    if legacy:
+        keys.append(legacy_cache_key(word, cfg, usage_notes, backend_name))
+    return keys
+
+
+def oov_dict_path(cfg: Dict) -> Path:
+    """OOV_DICT_FILE, or one dictionary per language pair in CACHE_DIR."""
+    return Path(cfg.get("OOV_DICT_FILE", str(Path(cfg.get("CACHE_DIR", "cache")) / f"oov_{lang_pair(cfg)}.json")))
+
 def cache_read(cache_dir: Path, key: str):
     fname = cache_dir / (key.replace("/", "_").replace(":", "_") + ".json")
     if fname.exists():
@@ -32,3 +113,55 @@ def load_state(state_path: Path) -> Dict[str, Any]:
 def save_state(state_path: Path, state: Dict[str, Any]) -> None:
     state_path.parent.mkdir(parents=True, exist_ok=True)
     state_path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+
+class OOVDictionary:
+    """Token -> translation map for one language pair, shared across runs."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entries = {}
+
+    def get(self, token: str) -> str:
+        return self.entries.get(token.lower(), "")
+
+    def missing(self, tokens: Iterable[str]) -> List[str]:
+        out, seen = [], set()
+        for t in tokens:
+            k = t.lower()
+            if k not in self.entries and k not in seen:
+                seen.add(k)
+                out.append(k)
+        return out
+
+    def seed(self, mapping: Dict[str, str]) -> None:
+        """Fill in tokens this dictionary lacks (e.g. from a cache pack) without overriding its own."""
+        with self._lock:
+            for k, v in mapping.items():
+                k, v = str(k).strip().lower(), str(v).strip()
+                if k and v:
+                    self.entries.setdefault(k, v)
+
+    def update(self, mapping: Dict[str, str]) -> None:
+        with self._lock:
+            for k, v in mapping.items():
+                k, v = str(k).strip().lower(), str(v).strip()
+                if k and v:
+                    self.entries[k] = v
+                    self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+            tmp.replace(self.path)
+            self._dirty = False
@@ -7,3 +7,41 @@ def load_config(path: Path) -> dict:
         raise FileNotFoundError(f"config.json niet gevonden op: {path}")
     with path.open("r", encoding="utf-8") as f:
         return json.load(f)
+
+# Path-valued settings and the defaults the runner falls back to
+_PATH_KEYS = {
+    "OUTPUT_DIR": "out",
+    "CACHE_DIR": "cache",
+    "EXTRA_WORDS_FILE": "out/extra_words.txt",
+    "APKG_PATH": "out/anki_deck.apkg",
+    "STATE_FILE": "out/state.json",
+    "CACHE_DB": None,
+    "JOURNAL_FILE": None,
+    "OOV_DICT_FILE": None,
+    "MEDIA_MANIFEST": None,
+    "WORD_INDEX_FILE": None,
+    "BULK_DIR": None,
+    "METRICS_JSON": None,
+    "METRICS_PROM": None,
+    "DAEMON_SOCKET": None,
+    "DAEMON_WORDS_FILE": None,
+    "GOOGLE_APPLICATION_CREDENTIALS": None,
+}
+
+# Settings holding a list of paths (read-only inputs, shared as they are by shards)
+_PATH_LIST_KEYS = ("CACHE_PACKS",)
+
+def resolve_paths(cfg: dict, base_dir: Path) -> dict:
+    """Copy of cfg with relative paths (and path defaults) anchored at base_dir instead of the working directory."""
+    out = dict(cfg)
+    for key, default in _PATH_KEYS.items():
+        value = out.get(key, default)
+        if value and not Path(value).is_absolute():
+            out[key] = str(base_dir / value)
+    for key in _PATH_LIST_KEYS:
+        values = out.get(key)
+        if isinstance(values, str):
+            values = [values]
+        if values:
+            out[key] = [v if Path(v).is_absolute() else str(base_dir / v) for v in values]
+    return out
@@ -0,0 +1,436 @@
+# src/daemon.py
+import csv
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config_loader import load_config
+from .io_utils import iter_wordlist, oov_tokens, read_tsv_rows
+from .resources import SharedResources
+from .runner import TSV_HEADER, Job, open_job, run_job, setup_logging
+
+logger = logging.getLogger("flashcard_lingua")
+
+_MAX_BODY = 4 << 20
+
+
+class DeckService:
+    """
+    One deck kept warm between requests. Backend clients, rate limiters, the cache, the
+    OOV dictionary, the journal and the media manifest live in a SharedResources with
+    keep_state, and one Job (the stage pipeline, audio engine, hedger and metrics) stays
+    open. The deck's rows are held in memory: adding words only runs those words through
+    the pipeline (or replays them from the journal) and appends their rows to the TSV;
+    rows whose "New words" change because the word list changed are patched in memory
+    and the TSV is rewritten from there, without rebuilding anything else. rebuild() runs
+    the full run_job(). The word list is mirrored to DAEMON_WORDS_FILE. Changes run one
+    at a time; the APKG is built on request (or after every change with auto_build).
+    """
+
+    def __init__(
+        self,
+        cfg: Dict,
+        words_path: Path,
+        usage_notes: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        auto_build: bool = False,
+        initial: Optional[Path] = None,
+    ):
+        # The deck is always resumable (the journal is the deck state); packaging is a separate step
+        self.cfg = dict(cfg, RESUME_ENABLED=True, CREATE_APKG=False)
+        self.build_cfg = cfg
+        self.words_path = words_path
+        self.usage_notes = usage_notes
+        self.max_concurrency = max_concurrency
+        self.auto_build = auto_build
+        out_dir = Path(self.cfg.get("OUTPUT_DIR", "out"))
+        self.out_tsv = out_dir / self.cfg.get("OUTPUT_TSV", "anki_notes.tsv")
+        self.extra_path = Path(self.cfg.get("EXTRA_WORDS_FILE", "out/extra_words.txt"))
+        self.shared = SharedResources(keep_state=True)
+        self.job: Optional[Job] = None
+        self.words: List[str] = []
+        # Lowercased words: the identity of a card and the vocabulary for "New words"
+        self._keys = set()
+        # Word key -> [row, OOV tokens], for every word in the list
+        self.rows: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.last_run: Dict[str, Any] = {}
+        self.last_build: Dict[str, Any] = {}
+        self.busy = ""
+        if words_path.exists():
+            self._extend(iter_wordlist(words_path, cfg.get("CSV_COLUMNS") or None))
+        if initial is not None and self._extend(iter_wordlist(initial, cfg.get("CSV_COLUMNS") or None)):
+            self._save_words()
+
+    def _extend(self, words: Iterable[str]) -> List[str]:
+        added = []
+        for w in words:
+            w = str(w).strip()
+            key = w.lower()
+            if w and key not in self._keys:
+                self._keys.add(key)
+                self.words.append(w)
+                added.append(w)
+        return added
+
+    def _save_words(self) -> None:
+        self.words_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.words_path.with_name(self.words_path.name + ".tmp")
+        tmp.write_text("".join(w + "\n" for w in self.words), encoding="utf-8")
+        tmp.replace(self.words_path)
+
+    def _load(self, words: List[str]) -> Dict[str, int]:
+        """Rows for words: replayed from the journal, or generated through the pipeline."""
+        journal = self.job.journal
+        todo = []
+        for w in words:
+            key = w.lower()
+            rec = journal.get(key)
+            if rec is None:
+                todo.append(w)
+            else:
+                self.rows[key] = [list(rec["row"]), rec.get("oov", [])]
+        for lw, row, oov_local in self.job.cards(todo):
+            journal.append(lw, row, oov_local)
+            self.rows[lw] = [row, oov_local]
+        new = [self.rows[w.lower()] for w in words]
+        if self.job.show_new_on_back:
+            self.job.fill_new_words(new)
+        return {"replayed": len(words) - len(todo), "generated": len(todo)}
+
+    def _refresh_oov(self, skip: Iterable[str] = ()) -> int:
+        """
+        Recompute the OOV tokens of every row against the current word list; rows whose
+        tokens changed get their "New words" filled again. Returns the number patched.
+        """
+        skip = set(skip)
+        changed = []
+        for key, pair in self.rows.items():
+            if key in skip:
+                continue
+            # Example Source is the sentence, followed by its audio tag when there is one
+            example = pair[0][2].split("<br>[sound:", 1)[0]
+            toks = oov_tokens(example, key, self._keys)
+            if toks != pair[1]:
+                pair[1] = toks
+                changed.append(pair)
+        if changed and self.job.show_new_on_back:
+            self.job.fill_new_words(changed)
+        return len(changed)
+
+    def _write_tsv(self, append: Optional[List[str]] = None) -> str:
+        """Append the rows of the given words, or rewrite the TSV from memory."""
+        if append is not None and self.out_tsv.exists():
+            with self.out_tsv.open("a", newline="", encoding="utf-8") as f:
+                csv.writer(f, delimiter="\t").writerows(self.rows[w.lower()][0] for w in append)
+            return "appended"
+        self.out_tsv.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.out_tsv.with_name(self.out_tsv.name + ".tmp")
+        with tmp.open("w", newline="", encoding="utf-8") as f:
+            wri = csv.writer(f, delimiter="\t")
+            wri.writerow(TSV_HEADER)
+            wri.writerows(self.rows[w.lower()][0] for w in self.words)
+        tmp.replace(self.out_tsv)
+        return "rewritten"
+
+    def _write_extra(self) -> None:
+        extra = sorted({t for _row, toks in self.rows.values() for t in toks})
+        self.extra_path.parent.mkdir(parents=True, exist_ok=True)
+        self.extra_path.write_text("".join(t + "\n" for t in extra), encoding="utf-8")
+
+    def _finish(self, t0: float, stats: Dict[str, Any]) -> Dict[str, Any]:
+        self.job.manifest.save()
+        self._write_extra()
+        self.last_run = dict(
+            stats, words=len(self.words), elapsed_s=round(time.perf_counter() - t0, 3), finished=int(time.time())
+        )
+        if self.auto_build:
+            self._build()
+        return self.last_run
+
+    def _build(self) -> Dict[str, Any]:
+        from .packaging import build_apkgs
+
+        t0 = time.perf_counter()
+        apkgs = build_apkgs(self.build_cfg, read_tsv_rows(self.out_tsv), self.job.media_dir, manifest=self.job.manifest)
+        self.last_build = {
+            "apkgs": [str(p) for p in apkgs],
+            "elapsed_s": round(time.perf_counter() - t0, 2),
+            "finished": int(time.time()),
+        }
+        return self.last_build
+
+    def _run(self, what: str, fn):
+        with self._lock:
+            self.busy = what
+            try:
+                return fn()
+            finally:
+                self.busy = ""
+
+    def start(self) -> None:
+        """Open the job and load every row once (a replay when the deck is already built)."""
+
+        def go():
+            t0 = time.perf_counter()
+            self.job = open_job(
+                self.cfg, self._keys, self.shared, usage_notes=self.usage_notes, max_concurrency=self.max_concurrency
+            )
+            stats = self._load(self.words)
+            # Journal rows keep the OOV tokens of the word list they were generated with
+            stats["patched"] = self._refresh_oov()
+            stats["tsv"] = self._write_tsv()
+            return self._finish(t0, stats)
+
+        self._run("start", go)
+
+    def add(self, words: Iterable[str]) -> Dict[str, Any]:
+        def go():
+            t0 = time.perf_counter()
+            added = self._extend(words)
+            if not added:
+                return {"added": [], "words": len(self.words)}
+            self._save_words()
+            stats = self._load(added)
+            # The new words may have been "New words" on existing cards
+            stats["patched"] = self._refresh_oov(skip=(w.lower() for w in added))
+            stats["tsv"] = self._write_tsv(append=None if stats["patched"] else added)
+            return {"added": added, "words": len(self.words), "run": self._finish(t0, stats)}
+
+        return self._run("add", go)
+
+    def remove(self, words: Iterable[str]) -> Dict[str, Any]:
+        def go():
+            t0 = time.perf_counter()
+            drop = {str(w).strip().lower() for w in words} & self._keys
+            if not drop:
+                return {"removed": [], "words": len(self.words)}
+            removed = [w for w in self.words if w.lower() in drop]
+            self.words = [w for w in self.words if w.lower() not in drop]
+            self._keys -= drop
+            for key in drop:
+                self.rows.pop(key, None)
+            self._save_words()
+            # The journal keeps their cards: re-adding a word replays it without API calls
+            stats = {"patched": self._refresh_oov()}
+            stats["tsv"] = self._write_tsv()
+            return {"removed": removed, "words": len(self.words), "run": self._finish(t0, stats)}
+
+        return self._run("remove", go)
+
+    def rebuild(self) -> Dict[str, Any]:
+        """The full run_job() over the word list, then the rows reloaded from the journal."""
+
+        def go():
+            t0 = time.perf_counter()
+            stats = {"generated": 0}
+            if self.words:
+                summary = run_job(
+                    self.cfg,
+                    self.words_path,
+                    usage_notes=self.usage_notes,
+                    max_concurrency=self.max_concurrency,
+                    shared=self.shared,
+                )
+                stats["generated"] = summary["generated"]
+            self.rows.clear()
+            self._load(self.words)
+            self._refresh_oov()
+            stats["tsv"] = self._write_tsv()
+            return self._finish(t0, stats)
+
+        return self._run("rebuild", go)
+
+    def build(self) -> Dict[str, Any]:
+        return self._run("build", self._build)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "words": len(self.words),
+            "words_file": str(self.words_path),
+            "busy": self.busy,
+            "uptime_s": round(time.time() - self.started, 1),
+            "last_run": self.last_run,
+            "last_build": self.last_build,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self.job is not None:
+                self.job.close()
+            self.shared.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET  /status            deck size, last run and build
+    GET  /words             the word list
+    POST /words             add words: {"words": [...]} or text, one word per line
+    POST /words/remove      remove words (DELETE /words works too)
+    POST /build             build the APKG
+    POST /rebuild           rerun the whole deck (run_job) and rewrite the TSV
+    POST /shutdown          stop the daemon
+    """
+
+    server_version = "flashcard_lingua"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> DeckService:
+        return self.server.service
+
+    def log_message(self, fmt: str, *args) -> None:
+        # client_address is empty on a Unix socket
+        logger.debug("daemon: " + fmt % args)
+
+    def _send(self, status: int, data: Dict[str, Any]) -> None:
+        body = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _words(self) -> List[str]:
+        n = int(self.headers.get("Content-Length") or 0)
+        if n > _MAX_BODY:
+            raise ValueError(f"Request te groot ({n} bytes)")
+        raw = self.rfile.read(n).decode("utf-8") if n else ""
+        if "json" in (self.headers.get("Content-Type") or "") or raw.lstrip().startswith(("{", "[")):
+            data = json.loads(raw or "{}")
+            words = data.get("words", []) if isinstance(data, dict) else data
+            if not isinstance(words, list):
+                raise ValueError("'words' moet een lijst zijn")
+            return [str(w) for w in words]
+        return raw.splitlines()
+
+    def _handle(self, fn) -> None:
+        try:
+            self._send(200, fn())
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception("daemon request failed")
+            self._send(500, {"error": str(e)})
+
+    def do_GET(self) -> None:
+        if self.path == "/status":
+            self._handle(self.service.status)
+        elif self.path == "/words":
+            self._handle(lambda: {"words": list(self.service.words)})
+        else:
+            self._send(404, {"error": f"niet gevonden: {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path == "/words":
+            self._handle(lambda: self.service.add(self._words()))
+        elif self.path == "/words/remove":
+            self._handle(lambda: self.service.remove(self._words()))
+        elif self.path == "/build":
+            self._handle(self.service.build)
+        elif self.path == "/rebuild":
+            self._handle(self.service.rebuild)
+        elif self.path == "/shutdown":
+            self._send(200, {"stopping": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._send(404, {"error": f"niet gevonden: {self.path}"})
+
+    def do_DELETE(self) -> None:
+        if self.path == "/words":
+            self._handle(lambda: self.service.remove(self._words()))
+        else:
+            self._send(404, {"error": f"niet gevonden: {self.path}"})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _claim_socket(path: Path) -> None:
+    """Remove a stale socket file; refuse if another daemon still listens on it."""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(str(path))
+    except OSError:
+        path.unlink()
+        return
+    finally:
+        s.close()
+    raise RuntimeError(f"Er draait al een daemon op {path}")
+
+
+def make_server(service: DeckService, socket_path: Optional[Path] = None, host: str = "127.0.0.1", port: int = 0):
+    """HTTP on a Unix socket (owner-only), or on host:port when port is given."""
+    if port:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    else:
+        _claim_socket(socket_path)
+        server = UnixHTTPServer(str(socket_path), _Handler)
+        os.chmod(socket_path, 0o600)
+    server.service = service
+    return server
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(
+        description="Keep a deck warm and add/remove words or build the APKG over a local HTTP API."
+    )
+    ap.add_argument("words", nargs="?", help="Initial word list (default: DAEMON_WORDS_FILE if it exists)")
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--socket", help="Unix socket path (default: DAEMON_SOCKET or OUTPUT_DIR/daemon.sock)")
+    ap.add_argument("--port", type=int, help="Listen on TCP instead of a Unix socket")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--usage-notes", choices=["auto", "always", "never"])
+    ap.add_argument("--max-concurrency", type=int)
+    ap.add_argument("--auto-build", action="store_true", help="Rebuild the APKG after every change")
+    args = ap.parse_args()
+
+    cfg = load_config(Path(args.config))
+    setup_logging(cfg)
+    out_dir = Path(cfg.get("OUTPUT_DIR", "out"))
+    words_path = Path(cfg.get("DAEMON_WORDS_FILE", str(out_dir / "daemon_words.txt")))
+    service = DeckService(
+        cfg,
+        words_path,
+        usage_notes=args.usage_notes,
+        max_concurrency=args.max_concurrency,
+        auto_build=args.auto_build or bool(cfg.get("DAEMON_AUTO_BUILD", False)),
+        initial=Path(args.words) if args.words else None,
+    )
+    service.start()
+
+    socket_path = Path(args.socket or cfg.get("DAEMON_SOCKET", str(out_dir / "daemon.sock")))
+    server = make_server(service, socket_path, host=args.host, port=args.port or 0)
+    where = f"http://{args.host}:{args.port}" if args.port else f"unix:{socket_path}"
+    print(f"🟢 Daemon ready on {where} ({len(service.words)} words)")
+
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not args.port:
+            socket_path.unlink(missing_ok=True)
+        service.close()
+        print("🔴 Daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
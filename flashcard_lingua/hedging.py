@@ -0,0 +1,209 @@
+# src/hedging.py
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import Metrics
+
+logger = logging.getLogger("flashcard_lingua")
+
+_DEFAULT_POLICY = {
+    "percentile": 95,
+    "min_delay_ms": 500,
+    "max_delay_ms": 30000,
+    "max_extra": 0.05,
+    "window": 500,
+    "min_samples": 20,
+}
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate request for one endpoint.
+
+    The delay is the given percentile of recent successful call latencies (a rolling
+    window), clamped to [min_delay_ms, max_delay_ms]; until min_samples calls have
+    been seen nothing is hedged. max_extra caps hedges at that share of all calls.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        percentile: float = 95,
+        min_delay_ms: float = 500,
+        max_delay_ms: float = 30000,
+        max_extra: float = 0.05,
+        window: int = 500,
+        min_samples: int = 20,
+    ):
+        self.endpoint = endpoint
+        self.percentile = float(percentile)
+        self.min_delay = float(min_delay_ms) / 1000.0
+        self.max_delay = float(max_delay_ms) / 1000.0
+        self.max_extra = float(max_extra)
+        self.min_samples = max(1, int(min_samples))
+        self.latencies: deque = deque(maxlen=max(self.min_samples, int(window)))
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        idx = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))
+        return min(self.max_delay, max(self.min_delay, ordered[idx]))
+
+    def admit(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def try_fire(self) -> bool:
+        """Count a hedge if it stays within max_extra of the calls so far."""
+        with self._lock:
+            if self.fired + 1 > self.max_extra * self.calls:
+                return False
+            self.fired += 1
+            return True
+
+    def on_win(self) -> None:
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> Dict[str, Any]:
+        d = self.delay()
+        with self._lock:
+            return {
+                "endpoint": self.endpoint,
+                "calls": self.calls,
+                "fired": self.fired,
+                "won": self.won,
+                "delay_ms": round(d * 1000) if d is not None else None,
+            }
+
+
+class Hedger:
+    """
+    Hedged calls per endpoint, configured by HEDGE in config.json, e.g.
+    {"tts": {"percentile": 95, "max_extra": 0.05}, "text": {"percentile": 99}}.
+
+    call() runs the first attempt on a worker thread; if it has not finished after the
+    policy's delay, a second attempt starts and the first successful result wins. The
+    other attempt cannot be interrupted mid-request: it is cancelled if it has not
+    started, otherwise its result is handed to discard() when it arrives. Endpoints
+    without a policy run in the calling thread as before, and so do calls made from inside
+    an attempt (a batch's per-word fallback): waiting on the shared pool from one of its
+    own workers could deadlock once every worker waits.
+    """
+
+    def __init__(self, cfg: Dict, workers: int = 8, metrics: Optional[Metrics] = None):
+        conf = cfg.get("HEDGE", {}) or {}
+        self.policies: Dict[str, HedgePolicy] = {}
+        for ep, opts in conf.items():
+            if opts is False or (isinstance(opts, dict) and opts.get("enabled") is False):
+                continue
+            merged = dict(_DEFAULT_POLICY)
+            merged.update({k: v for k, v in (opts if isinstance(opts, dict) else {}).items() if k != "enabled"})
+            self.policies[ep] = HedgePolicy(ep, **merged)
+        self.metrics = metrics
+        self.workers = max(2, int(workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enabled(self, endpoint: str) -> bool:
+        return endpoint in self.policies
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hedge")
+            return self._pool
+
+    def _inc(self, name: str, endpoint: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc(name, endpoint=endpoint)
+
+    def call(
+        self,
+        endpoint: str,
+        attempt: Callable[[int], Any],
+        discard: Optional[Callable[[Any], None]] = None,
+    ) -> Any:
+        """attempt(i) performs try i (0 = primary, 1 = hedge) and returns its result."""
+        pol = self.policies.get(endpoint)
+        if pol is None or getattr(self._local, "in_attempt", False):
+            return attempt(0)
+        pol.admit()
+
+        def timed(i: int):
+            self._local.in_attempt = True
+            try:
+                t0 = time.perf_counter()
+                out = attempt(i)
+                pol.record(time.perf_counter() - t0)
+                return out
+            finally:
+                self._local.in_attempt = False
+
+        primary = self._executor().submit(timed, 0)
+        delay = pol.delay()
+        if delay is None or wait([primary], timeout=delay).done or not pol.try_fire():
+            return primary.result()
+
+        self._inc("hedge_fired_total", endpoint)
+        logger.debug(f"Hedging '{endpoint}' call after {delay:.2f}s")
+        hedge = self._executor().submit(timed, 1)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is not None:
+                    error = error or fut.exception()
+                    continue
+                # The other attempt may have finished in the same wait() too
+                self._abandon(hedge if fut is primary else primary, discard)
+                if fut is hedge:
+                    pol.on_win()
+                    self._inc("hedge_won_total", endpoint)
+                return fut.result()
+        raise error
+
+    def _abandon(self, fut: Future, discard: Optional[Callable[[Any], None]]) -> None:
+        if fut.cancel() or discard is None:
+            return
+
+        def drop(f: Future) -> None:
+            if not f.cancelled() and f.exception() is None:
+                try:
+                    discard(f.result())
+                except Exception as e:
+                    logger.debug(f"Discarding a hedged result failed: {e}")
+
+        fut.add_done_callback(drop)
+
+    def stats(self):
+        return [p.stats() for p in self.policies.values()]
+
+    def format_stats(self) -> str:
+        return " | ".join(
+            f"{st['endpoint']}: {st['fired']}/{st['calls']} hedged, {st['won']} won"
+            + (f" (after {st['delay_ms']} ms)" if st["delay_ms"] is not None else "")
+            for st in self.stats()
+        )
+
+    def close(self) -> None:
+        # Abandoned attempts still running finish (and are discarded) in the background
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -2,30 +2,62 @@ import csv
 import hashlib
 import re
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional, Sequence, Union
 
 
-def read_wordlist(path: Path) -> List[str]:
+def _csv_column_indexes(header: List[str], columns: Sequence[Union[int, str]]) -> List[int]:
+    idx = []
+    for c in columns:
+        if isinstance(c, int) or str(c).isdigit():
+            idx.append(int(c))
+        else:
+            names = [h.strip().lower() for h in header]
+            if str(c).strip().lower() not in names:
+                raise ValueError(f"CSV column '{c}' not found in header: {header}")
+            idx.append(names.index(str(c).strip().lower()))
+    return idx
+
+
+def iter_wordlist(path: Path, columns: Optional[Sequence[Union[int, str]]] = None) -> Iterator[str]:
+    """
+    Stream words from a .txt (one per line) or .csv file.
+
+    For CSV, `columns` lists the columns to take words from, by index or by header
+    name (names mean the first row is a header); the default is the first column.
+    """
     if not path.exists():
-        return []
+        return
 
     if path.suffix.lower() == ".csv":
-        out: List[str] = []
+        columns = list(columns or [0])
         with path.open("r", encoding="utf-8", newline="") as f:
             rdr = csv.reader(f)
+            by_name = any(not (isinstance(c, int) or str(c).isdigit()) for c in columns)
+            idx = _csv_column_indexes(next(rdr, []) if by_name else [], columns)
             for row in rdr:
-                if not row:
-                    continue
-                w = (row[0] or "").strip()
-                if w:
-                    out.append(w)
-        return out
+                for i in idx:
+                    w = (row[i] if i < len(row) else "").strip()
+                    if w:
+                        yield w
+        return
+
+    with path.open("r", encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.strip()
+            if ln:
+                yield ln
+
 
-    return [
-        ln.strip()
-        for ln in path.read_text(encoding="utf-8").splitlines()
-        if ln.strip()
-    ]
+def read_wordlist(path: Path, columns: Optional[Sequence[Union[int, str]]] = None) -> List[str]:
+    return list(iter_wordlist(path, columns))
+
+
+def read_tsv_rows(path: Path) -> Iterator[List[str]]:
+    """Rows of a TSV written by the runner, without its header line."""
+    with path.open("r", encoding="utf-8", newline="") as f:
+        rdr = csv.reader(f, delimiter="\t")
+        next(rdr, None)
+        yield from rdr
 
 
 def safe_filename(text: str) -> str:
@@ -51,3 +83,14 @@ def word_audio_filename(word: str, source_lang: str, ext: str = "mp3") -> str:
 def example_audio_filename(example_text: str, source_lang: str, ext: str = "mp3") -> str:
     h = media_hash(example_text, prefix=f"{source_lang}|example")
     return f"{h}_ex.{ext}"
+
+
+def oov_tokens(example_src: str, word_key: str, vocab) -> List[str]:
+    """Tokens of an example sentence that are neither the card's word nor in the word list (first occurrence order)."""
+    out: List[str] = []
+    for tok in tokenize_words(example_src):
+        if len(tok) < 2:
+            continue
+        if tok != word_key and tok not in vocab and tok not in out:
+            out.append(tok)
+    return out
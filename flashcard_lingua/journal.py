@@ -0,0 +1,137 @@
+# src/journal.py
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("flashcard_lingua")
+
+
+class RunJournal:
+    """
+    Append-only JSONL log of finished cards, used for resume.
+
+    Every line is {"key": ..., "row": [...], "oov": [...]}; a later line for the same
+    key replaces an earlier one and {"key": ..., "removed": true} drops it. Replaying
+    the file gives the deck state. The file is compacted (rewritten with one line per
+    live key) once stale lines outnumber the live ones.
+
+    Only key -> byte offset is kept in memory; get() reads the row back from disk.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offsets: Dict[str, int] = {}
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._fh = None
+        self._rh = None
+
+    def load(self, readonly: bool = False) -> Dict[str, int]:
+        """Index the file; readonly=True (used by --plan) never truncates or compacts it."""
+        self.offsets = {}
+        self._lines = 0
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                pos = 0
+                for ln in f:
+                    start, pos = pos, pos + len(ln)
+                    try:
+                        rec = json.loads(ln)
+                    except ValueError:
+                        # A crash can leave a half-written last line
+                        continue
+                    self._lines += 1
+                    key = rec.get("key")
+                    if not key:
+                        continue
+                    if rec.get("removed"):
+                        self.offsets.pop(key, None)
+                    else:
+                        self.offsets[key] = start
+            if pos and not ln.endswith(b"\n") and not readonly:
+                # Cut the torn line off so the next append starts on a fresh line
+                torn = pos - len(ln)
+                with self.path.open("r+b") as f:
+                    f.truncate(torn)
+                self.offsets = {k: v for k, v in self.offsets.items() if v != torn}
+        if not readonly:
+            self.maybe_compact()
+        return self.offsets
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def keys(self) -> List[str]:
+        return list(self.offsets)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        off = self.offsets.get(key)
+        if off is None:
+            return None
+        with self._lock:
+            if self._rh is None:
+                self._rh = self.path.open("rb")
+            self._rh.seek(off)
+            return json.loads(self._rh.readline())
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for key in list(self.offsets):
+            rec = self.get(key)
+            if rec is not None:
+                yield rec
+
+    def append(self, key: str, row: List[str], oov: List[str]) -> None:
+        self.offsets[key] = self._write({"key": key, "row": row, "oov": oov})
+
+    def remove(self, key: str) -> None:
+        if key in self.offsets:
+            self._write({"key": key, "removed": True})
+            self.offsets.pop(key, None)
+
+    def _write(self, rec: Dict[str, Any]) -> int:
+        with self._lock:
+            if self._fh is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fh = self.path.open("ab")
+                self._fh.seek(0, 2)
+            start = self._fh.tell()
+            self._fh.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._fh.flush()
+            self._lines += 1
+            return start
+
+    def maybe_compact(self) -> bool:
+        if self._lines <= 2 * len(self.offsets) + 100:
+            return False
+        self.compact()
+        return True
+
+    def compact(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        offsets: Dict[str, int] = {}
+        with tmp.open("wb") as f:
+            for rec in self.records():
+                offsets[rec["key"]] = f.tell()
+                f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+        with self._lock:
+            for fh in (self._fh, self._rh):
+                if fh is not None:
+                    fh.close()
+            self._fh = self._rh = None
+            tmp.replace(self.path)
+            logger.info(f"Journal compacted: {self._lines} → {len(offsets)} lines ({self.path})")
+            self.offsets = offsets
+            self._lines = len(offsets)
+
+    def close(self) -> None:
+        self.maybe_compact()
+        with self._lock:
+            for fh in (self._fh, self._rh):
+                if fh is not None:
+                    fh.close()
+            self._fh = self._rh = None
@@ -0,0 +1,120 @@
+# src/media_manifest.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger("flashcard_lingua")
+
+
+def file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MediaManifest:
+    """
+    Index of the files in the media directory, keyed by their media_hash filename.
+
+    Each entry records size, sha1, the source text, the voice/model that produced it and
+    the tempo applied to it, so warm runs decide what to synthesize and what to package
+    without a stat() per file. On load the manifest is reconciled with a single directory
+    listing (skipped with trust=True): entries whose file is gone are dropped, files the
+    manifest does not know are indexed once.
+    """
+
+    def __init__(self, path: Path, media_dir: Path, trust: bool = False, save_every: int = 200):
+        self.path = path
+        self.media_dir = media_dir
+        self.save_every = save_every
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = 0
+        self._lock = threading.Lock()
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entries = {}
+        if not trust:
+            self.reconcile()
+
+    def reconcile(self) -> None:
+        try:
+            names = set(os.listdir(self.media_dir))
+        except FileNotFoundError:
+            names = set()
+        gone = [n for n in self.entries if n not in names]
+        for n in gone:
+            del self.entries[n]
+        new = [n for n in names if n not in self.entries and not n.startswith(".") and ".rate_tmp." not in n]
+        for n in new:
+            p = self.media_dir / n
+            if p.is_file():
+                self.entries[n] = {"size": p.stat().st_size, "sha1": file_sha1(p), "tempo": None}
+        if gone or new:
+            self._dirty += len(gone) + len(new)
+            logger.info(f"Media manifest: {len(new)} files indexed, {len(gone)} missing entries dropped")
+            self.save()
+
+    def has(self, name: str) -> bool:
+        return bool(name) and name in self.entries
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(name)
+
+    def record(self, name: str, text: str = "", voice: str = "", tempo: float = 1.0, **extra) -> None:
+        """Index a file that was just written to the media directory."""
+        p = self.media_dir / name
+        entry = {
+            "size": p.stat().st_size,
+            "sha1": file_sha1(p),
+            "text": text,
+            "voice": voice,
+            "tempo": tempo,
+            "ts": int(time.time()),
+        }
+        entry.update(extra)
+        with self._lock:
+            old = self.entries.get(name) or {}
+            # Re-timing a file keeps what produced it
+            entry["text"] = entry["text"] or old.get("text", "")
+            entry["voice"] = entry["voice"] or old.get("voice", "")
+            self.entries[name] = entry
+            self._dirty += 1
+            flush = self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def adopt(self, name: str, entry: Dict[str, Any]) -> None:
+        """Index a file copied in from another media directory, reusing the entry made there."""
+        with self._lock:
+            self.entries[name] = dict(entry)
+            self._dirty += 1
+            flush = self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def forget(self, name: str) -> None:
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._dirty += 1
+
+    def existing(self, names: Iterable[str]) -> list:
+        return [n for n in names if self.has(n)]
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self.entries, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+            tmp.replace(self.path)
+            self._dirty = 0
@@ -0,0 +1,165 @@
+# src/merge.py
+import csv
+import logging
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .cache_utils import OOVDictionary, oov_dict_path
+from .config_loader import load_config
+from .io_utils import iter_wordlist, read_tsv_rows
+from .journal import RunJournal
+from .media_manifest import MediaManifest
+from .packaging import build_apkgs
+from .runner import format_new_words, setup_logging
+from .shard import find_shards, shard_config, shard_of
+from .word_index import WordIndex
+
+logger = logging.getLogger("flashcard_lingua")
+
+_SOUND_RE = re.compile(r"\[sound:([^\]]+)\]", re.IGNORECASE)
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def merge_shards(cfg: Dict, input_path: Path, count: Optional[int] = None, partial: bool = False) -> Dict[str, Any]:
+    """
+    Combine the shard directories of one word list into a single deck in OUTPUT_DIR.
+
+    Rows come from each shard's journal and are written in input order; media are
+    copied in once per (content-addressed) file name; New words are filled in from the
+    shards' OOV dictionaries. Returns {words, rows, missing, media_copied, shards}.
+    """
+    found = find_shards(cfg)
+    counts = {n for n, _ in found.values()}
+    if count is None:
+        if len(counts) != 1:
+            raise ValueError(f"Kan het aantal shards niet bepalen uit {sorted(counts) or 'geen shard-mappen'}; gebruik --shards N")
+        count = counts.pop()
+    shards = {i: shard_config(cfg, i, count) for i, (n, _) in found.items() if n == count}
+    absent = [i for i in range(count) if i not in shards]
+    if absent and not partial:
+        raise ValueError(f"Shards ontbreken: {', '.join(f'{i}/{count}' for i in absent)} (gebruik --partial om toch samen te voegen)")
+
+    out_dir = Path(cfg.get("OUTPUT_DIR", "out"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    media_dir = out_dir / cfg.get("OUTPUT_MEDIA_DIR", "media")
+    media_dir.mkdir(parents=True, exist_ok=True)
+    manifest = MediaManifest(Path(cfg.get("MEDIA_MANIFEST", str(out_dir / "media_manifest.json"))), media_dir)
+
+    journals: Dict[int, RunJournal] = {}
+    shard_media: Dict[int, MediaManifest] = {}
+    oov_dict = OOVDictionary(oov_dict_path(cfg))
+    for i, scfg in shards.items():
+        sdir = Path(scfg["OUTPUT_DIR"])
+        journals[i] = RunJournal(Path(scfg.get("JOURNAL_FILE", str(sdir / "journal.jsonl"))))
+        journals[i].load(readonly=True)
+        shard_media[i] = MediaManifest(
+            Path(scfg.get("MEDIA_MANIFEST", str(sdir / "media_manifest.json"))),
+            sdir / scfg.get("OUTPUT_MEDIA_DIR", "media"),
+            trust=True,
+        )
+        oov_dict.update(OOVDictionary(oov_dict_path(scfg)).entries)
+    oov_dict.save()
+
+    show_new_on_back = bool(cfg.get("SHOW_NEW_WORDS_ON_BACK", True))
+    oov_translate = bool(cfg.get("OOV_TRANSLATE", True))
+    out_tsv = out_dir / cfg.get("OUTPUT_TSV", "anki_notes.tsv")
+    extra_path = Path(cfg.get("EXTRA_WORDS_FILE", "out/extra_words.txt"))
+
+    word_index = WordIndex(Path(cfg.get("WORD_INDEX_FILE", str(out_dir / "words.sqlite"))))
+    word_index.build(iter_wordlist(input_path, cfg.get("CSV_COLUMNS") or None))
+    n_words = n_rows = media_copied = 0
+    missing: Dict[int, int] = {}
+    extra_words = set()
+    with out_tsv.open("w", newline="", encoding="utf-8") as f:
+        wri = csv.writer(f, delimiter="\t")
+        wri.writerow(["Front", "Back", "Example Source", "Example Target", "Note", "New Words"])
+        for w in word_index.iter_words():
+            n_words += 1
+            i = shard_of(w, count)
+            rec = journals[i].get(w.strip().lower()) if i in journals else None
+            if rec is None:
+                missing[i] = missing.get(i, 0) + 1
+                continue
+            row = list(rec["row"])
+            toks = rec.get("oov", [])
+            extra_words.update(toks)
+            if show_new_on_back:
+                row[5] = format_new_words(toks, oov_dict if oov_translate else None)
+            # Media names are content-addressed: a name already present is the same file
+            for name in _SOUND_RE.findall(" ".join(str(c) for c in row)):
+                if manifest.has(name):
+                    continue
+                src = shard_media[i].media_dir / name
+                if not src.exists():
+                    logger.warning(f"Merge: {name} missing in shard {i}/{count}")
+                    continue
+                _link_or_copy(src, media_dir / name)
+                entry = shard_media[i].get(name)
+                if entry is not None:
+                    manifest.adopt(name, entry)
+                else:
+                    manifest.record(name)
+                media_copied += 1
+            wri.writerow(row)
+            n_rows += 1
+    word_index.close()
+    for j in journals.values():
+        j.close()
+    manifest.save()
+
+    if missing:
+        print(f"⚠️ {sum(missing.values())} words have no row yet: " + ", ".join(
+            f"shard {i}/{count}: {n}" for i, n in sorted(missing.items())))
+    print(f"✅ TSV ready: {out_tsv} ({n_rows} rows from {len(shards)} shards, {media_copied} media files copied)")
+
+    if missing and not partial:
+        print("📦 APKG skipped: the deck is incomplete (use --partial to build it anyway)")
+    elif cfg.get("CREATE_APKG", True):
+        for apkg in build_apkgs(cfg, read_tsv_rows(out_tsv), media_dir, manifest=manifest):
+            print("📦 APKG created:", apkg)
+
+    if extra_words:
+        extra_path.parent.mkdir(parents=True, exist_ok=True)
+        extra_path.write_text("\n".join(sorted(extra_words)) + "\n", encoding="utf-8")
+        print(f"📝 Extra words written: {extra_path} ({len(extra_words)} items)")
+
+    return {
+        "words": n_words,
+        "rows": n_rows,
+        "missing": sum(missing.values()),
+        "media_copied": media_copied,
+        "shards": len(shards),
+    }
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(
+        description="Merge the shards of a run (runner --shard i/N) into one TSV, extra_words.txt and APKG."
+    )
+    ap.add_argument("input", help="The full word list the shards were built from")
+    ap.add_argument("--shards", type=int, help="Number of shards (default: detected from SHARD_DIR)")
+    ap.add_argument("--partial", action="store_true", help="Merge even if shards or rows are missing")
+    ap.add_argument("--config", default="config.json")
+    args = ap.parse_args()
+
+    cfg = load_config(Path(args.config))
+    setup_logging(cfg)
+    stats = merge_shards(cfg, Path(args.input), count=args.shards, partial=args.partial)
+    if stats["missing"] and not args.partial:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
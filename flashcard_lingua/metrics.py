@@ -0,0 +1,216 @@
+# src/metrics.py
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("flashcard_lingua")
+
+# Seconds; wide enough for a cache hit (ms) as well as a slow LLM call or APKG build (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _prom_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds), as Prometheus expects it."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets (linear within the bucket), like histogram_quantile()."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if n and seen + n >= rank:
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+            lower = upper
+        return self.max
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, total = [], 0
+        for le, n in zip(self.buckets, self.counts):
+            total += n
+            out.append((repr(float(le)), total))
+        out.append(("+Inf", self.count))
+        return out
+
+
+class Metrics:
+    """
+    Counters, gauges and latency histograms for one run.
+
+    Everything is keyed by name and labels, e.g. inc("api_calls_total", endpoint="tts",
+    outcome="ok") or observe("stage_seconds", 0.8, stage="generate"). Collectors added
+    with add_collector() run before every export and set gauges from other components
+    (rate limiters, pipeline stages). write() exports a JSON snapshot and a Prometheus
+    textfile (node_exporter textfile collector format); start() repeats it on an interval.
+    """
+
+    def __init__(self, prefix: str = "flashcard_lingua"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], Histogram] = {}
+        self._collectors: List[Callable[["Metrics"], None]] = []
+        self._lock = threading.Lock()
+        self._stop: Optional[threading.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def add_collector(self, fn: Callable[["Metrics"], None]) -> None:
+        self._collectors.append(fn)
+
+    def _collect(self) -> None:
+        for fn in self._collectors:
+            try:
+                fn(self)
+            except Exception as e:
+                logger.debug(f"Metrics collector failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._collect()
+        with self._lock:
+            return {
+                "started": int(self.started),
+                "elapsed_s": round(time.time() - self.started, 3),
+                "counters": [
+                    {"name": n, "labels": dict(lb), "value": v} for (n, lb), v in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": n, "labels": dict(lb), "value": v} for (n, lb), v in sorted(self._gauges.items())
+                ],
+                "histograms": [
+                    {
+                        "name": n,
+                        "labels": dict(lb),
+                        "count": h.count,
+                        "sum": round(h.sum, 6),
+                        "max": round(h.max, 6),
+                        "p50": round(h.quantile(0.5), 6),
+                        "p95": round(h.quantile(0.95), 6),
+                        "p99": round(h.quantile(0.99), 6),
+                        "buckets": dict(h.cumulative()),
+                    }
+                    for (n, lb), h in sorted(self._hists.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        self._collect()
+        lines: List[str] = []
+        with self._lock:
+            def block(kind: str, items: Dict[Tuple[str, Labels], Any]) -> None:
+                last = None
+                for (n, lb), v in sorted(items.items()):
+                    full = f"{self.prefix}_{n}"
+                    if n != last:
+                        lines.append(f"# TYPE {full} {kind}")
+                        last = n
+                    if kind != "histogram":
+                        lines.append(f"{full}{_prom_labels(lb)} {v}")
+                        continue
+                    for le, total in v.cumulative():
+                        lines.append(f"{full}_bucket{_prom_labels(lb, ('le', le))} {total}")
+                    lines.append(f"{full}_sum{_prom_labels(lb)} {v.sum:.6f}")
+                    lines.append(f"{full}_count{_prom_labels(lb)} {v.count}")
+
+            block("counter", self._counters)
+            block("gauge", self._gauges)
+            block("histogram", self._hists)
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: Optional[Path] = None, prom_path: Optional[Path] = None) -> None:
+        # Written under a temp name and renamed, so a scraper never reads half a file
+        for path, render in ((json_path, lambda: json.dumps(self.snapshot(), indent=2)), (prom_path, self.to_prometheus)):
+            if path is None:
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_text(render(), encoding="utf-8")
+            tmp.replace(path)
+
+    def start(self, interval: float, json_path: Optional[Path] = None, prom_path: Optional[Path] = None) -> None:
+        """Export every interval seconds in a background thread until stop()."""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop = threading.Event()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.write(json_path, prom_path)
+                except Exception as e:
+                    logger.warning(f"Metrics export failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="metrics-export", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
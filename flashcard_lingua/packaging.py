@@ -1,33 +1,111 @@
 # src/packaging.py
-import genanki
 import hashlib
+import itertools
+import json
+import os
 import re
+import sqlite3
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Tuple, TYPE_CHECKING
+
+from .audio_utils import encode_many, encode_settings
+from .media_manifest import file_sha1
+
+if TYPE_CHECKING:
+    import genanki
+
+    from .media_manifest import MediaManifest
+
+# Bump when the package layout changes, so old fingerprints stop matching
+_PACKAGE_FORMAT = 2
 
 def _stable_id(text: str) -> int:
     h = hashlib.sha1(text.encode("utf-8")).hexdigest()
     return int(h[:8], 16)
 
-def _collect_media_from_rows(rows: List[List[str]]) -> List[str]:
-    sound_re = re.compile(r"\[sound:([^\]]+)\]", re.IGNORECASE)
-    seen = set()
-    ordered = []
+_SOUND_RE = re.compile(r"\[sound:([^\]]+)\]", re.IGNORECASE)
+
+def _collect_media_from_rows(rows: Iterable[List[str]], seen: Optional[set] = None, ordered: Optional[List[str]] = None) -> List[str]:
+    seen = set() if seen is None else seen
+    ordered = [] if ordered is None else ordered
     for r in rows:
         for cell in (r or []):
-            for f in sound_re.findall(cell or ""):
+            for f in _SOUND_RE.findall(cell or ""):
                 if f not in seen:
                     seen.add(f)
                     ordered.append(f)
     return ordered
 
-def build_apkg(cfg: Dict, rows: List[List[str]], media_dir: Path) -> Path:
+def _rename_media(row: List[str], mapping: Dict[str, str]) -> List[str]:
+    def sub(m: "re.Match") -> str:
+        return f"[sound:{mapping.get(m.group(1), m.group(1))}]"
+
+    return [_SOUND_RE.sub(sub, cell) if cell else cell for cell in row]
+
+def _media_info(media_dir: Path, names: List[str], manifest: Optional["MediaManifest"], workers: int) -> Dict[str, Tuple[int, str]]:
+    """name -> (size, sha1) for every file that exists; from the manifest, or hashed in parallel without one."""
+    if manifest is not None:
+        return {n: (manifest.get(n)["size"], manifest.get(n)["sha1"]) for n in manifest.existing(names)}
+
+    def probe(name: str) -> Optional[Tuple[int, str]]:
+        p = media_dir / name
+        if not p.is_file():
+            return None
+        return p.stat().st_size, file_sha1(p)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        return {n: info for n, info in zip(names, ex.map(probe, names)) if info is not None}
+
+def _part_paths(apkg_path: Path, n: int) -> List[Path]:
+    if n == 1:
+        return [apkg_path]
+    return [apkg_path.with_name(f"{apkg_path.stem}.part{i + 1}{apkg_path.suffix}") for i in range(n)]
+
+def _write_package(deck: "genanki.Deck", media_paths: List[Path], out_path: Path) -> None:
+    """Like genanki.Package.write_to_file, but media are streamed in stored (audio is already compressed)."""
+    import genanki
+
+    fd, db_name = tempfile.mkstemp(suffix=".anki2")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(db_name)
+        ts = time.time()
+        genanki.Package(deck).write_to_db(conn.cursor(), ts, itertools.count(int(ts * 1000)))
+        conn.commit()
+        conn.close()
+
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out_path.with_name(out_path.name + ".tmp")
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as z:
+            z.write(db_name, "collection.anki2", compress_type=zipfile.ZIP_DEFLATED)
+            z.writestr("media", json.dumps({str(i): p.name for i, p in enumerate(media_paths)}))
+            for i, p in enumerate(media_paths):
+                # ZipFile.write copies in chunks; the file is never read into memory whole
+                z.write(p, str(i))
+        tmp.replace(out_path)
+    finally:
+        os.unlink(db_name)
+
+def build_apkgs(cfg: Dict, rows: Iterable[List[str]], media_dir: Path, manifest: Optional["MediaManifest"] = None) -> List[Path]:
+    """
+    Build the deck package(s); returns the written (or still current) .apkg paths.
+
+    The rows, note model and media checksums are fingerprinted; when the fingerprint
+    matches the previous build the existing package is kept. With APKG_MAX_MB the deck
+    is split into parts (same deck id, importable one after another) whose media stay
+    under that size.
+    """
     deck_name   = cfg.get("DECK_NAME", "My Deck")
     model_name  = cfg.get("MODEL_NAME", "My Model")
     apkg_path   = Path(cfg.get("APKG_PATH", "out/anki_deck.apkg"))
     source_lang = cfg.get("SOURCE_LANG", "Bron")
     target_lang = cfg.get("TARGET_LANG", "Doel")
     show_new    = bool(cfg.get("SHOW_NEW_WORDS_ON_BACK", True))
+    max_mb      = float(cfg.get("APKG_MAX_MB", 0) or 0)
 
     fields = [
         {"name": f"Front ({source_lang} + Audio)"},
@@ -57,6 +135,78 @@ hr#answer { margin: 16px 0; }
 pre { white-space: pre-wrap; font-family: ui-monospace, SFMono-Regular, Menlo, Consolas, monospace; font-size: 0.95em; }
 '''  # noqa
 
+    fp = hashlib.sha256()
+    fp.update(json.dumps([_PACKAGE_FORMAT, deck_name, model_name, fields, front_tmpl, back_tmpl, css, max_mb]).encode("utf-8"))
+
+    # Single pass, so rows can be a stream (e.g. read back from the TSV); genanki notes are
+    # only made if the deck changed
+    notes: List[Tuple[List[str], List[str]]] = []
+    seen: set = set()
+    media_files_used: List[str] = []
+    for r in rows:
+        fp.update(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n")
+        note_media = _collect_media_from_rows([r])
+        for n in note_media:
+            if n not in seen:
+                seen.add(n)
+                media_files_used.append(n)
+        notes.append((r, note_media))
+
+    hash_workers = int(cfg.get("APKG_HASH_WORKERS", os.cpu_count() or 4))
+    settings = encode_settings(cfg)
+    if settings is not None:
+        # Package encoded copies instead of the originals (the TSV keeps the original names)
+        fp.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        mapping, st = encode_many(
+            media_files_used, media_dir, settings, manifest, workers=int(cfg.get("AUDIO_ENCODE_WORKERS", os.cpu_count() or 4))
+        )
+        if mapping:
+            notes = [(_rename_media(r, mapping), [mapping.get(n, n) for n in m]) for r, m in notes]
+            media_files_used = list(dict.fromkeys(mapping.get(n, n) for n in media_files_used))
+        saved = st["bytes_in"] - st["bytes_out"]
+        print(
+            f"🗜️ Audio ({settings['codec']} {settings['bitrate']}): {st['encoded']} encoded, {st['cached']} cached, "
+            f"{st['failed']} failed; {st['bytes_in'] / 1e6:.1f} MB → {st['bytes_out'] / 1e6:.1f} MB"
+            + (f" ({saved / 1e6:.1f} MB saved, -{100 * saved / st['bytes_in']:.0f}%)" if st["bytes_in"] else "")
+        )
+
+    info = _media_info(media_dir, media_files_used, manifest, hash_workers)
+    for name in media_files_used:
+        if name in info:
+            fp.update(f"{name}:{info[name][1]}\n".encode("utf-8"))
+    fingerprint = fp.hexdigest()
+
+    # Split notes into parts whose new media stay under APKG_MAX_MB
+    limit = int(max_mb * 1024 * 1024)
+    parts: List[Tuple[List[List[str]], List[str]]] = [([], [])]
+    part_seen: set = set()
+    part_bytes = 0
+    for r, note_media in notes:
+        new_media = [n for n in note_media if n in info and n not in part_seen]
+        note_bytes = sum(info[n][0] for n in new_media)
+        if limit and parts[-1][0] and part_bytes + note_bytes > limit:
+            parts.append(([], []))
+            part_seen = set()
+            part_bytes = 0
+            new_media = [n for n in note_media if n in info]
+            note_bytes = sum(info[n][0] for n in new_media)
+        parts[-1][0].append(r)
+        parts[-1][1].extend(new_media)
+        part_seen.update(new_media)
+        part_bytes += note_bytes
+    paths = _part_paths(apkg_path, len(parts))
+
+    fp_path = apkg_path.with_name(apkg_path.name + ".fingerprint")
+    try:
+        previous = json.loads(fp_path.read_text(encoding="utf-8"))
+    except Exception:
+        previous = {}
+    if previous.get("fingerprint") == fingerprint and all(p.exists() for p in paths):
+        print(f"📦 Deck unchanged since last build ({fingerprint[:12]}), keeping {len(paths)} package(s)")
+        return paths
+
+    import genanki
+
     model = genanki.Model(
         model_id=_stable_id("model:" + model_name),
         name=model_name,
@@ -64,18 +214,19 @@ pre { white-space: pre-wrap; font-family: ui-monospace, SFMono-Regular, Menlo, C
         templates=[{"name": "Card 1", "qfmt": front_tmpl, "afmt": back_tmpl}],
         css=css
     )
+    deck_id = _stable_id("deck:" + deck_name)
+    for (part_rows, part_media), path in zip(parts, paths):
+        deck = genanki.Deck(deck_id, deck_name)
+        for r in part_rows:
+            deck.add_note(genanki.Note(model=model, fields=r))
+        _write_package(deck, [media_dir / n for n in part_media], path)
 
-    deck = genanki.Deck(_stable_id("deck:" + deck_name), deck_name)
-
-    for r in rows:
-        deck.add_note(genanki.Note(model=model, fields=r))
-
-    media_files_used = _collect_media_from_rows(rows)
-    media_paths = [str(media_dir / f) for f in media_files_used if (media_dir / f).exists()]
+    # Parts left over from an earlier, larger split would be imported twice
+    for stale in previous.get("files", []):
+        if Path(stale) not in paths:
+            Path(stale).unlink(missing_ok=True)
+    fp_path.write_text(json.dumps({"fingerprint": fingerprint, "files": [str(p) for p in paths]}), encoding="utf-8")
+    return paths
 
-    pkg = genanki.Package(deck)
-    if media_paths:
-        pkg.media_files = media_paths
-    apkg_path.parent.mkdir(parents=True, exist_ok=True)
-    pkg.write_to_file(str(apkg_path))
-    return apkg_path
+def build_apkg(cfg: Dict, rows: Iterable[List[str]], media_dir: Path, manifest: Optional["MediaManifest"] = None) -> Path:
+    return build_apkgs(cfg, rows, media_dir, manifest)[0]
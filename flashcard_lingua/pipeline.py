@@ -0,0 +1,305 @@
+# src/pipeline.py
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger("flashcard_lingua")
+
+_DONE = object()
+
+
+class _Failed:
+    """Carries an exception raised by a stage down the pipeline to the consumer."""
+
+    def __init__(self, exc: BaseException, stage: str):
+        self.exc = exc
+        self.stage = stage
+
+
+class Stage:
+    """
+    A named step with its own worker pool.
+
+    With batch_size > 1, fn receives a list of up to batch_size payloads (whatever is
+    queued, after waiting at most batch_wait seconds for more) and returns a list of
+    results in the same order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        batch_size: int = 1,
+        batch_wait: float = 0.05,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = batch_wait
+        self._lock = threading.Lock()
+        self.done = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.max_s = 0.0
+        self.inbox: Optional[queue.Queue] = None
+
+    def _record(self, dt: float, ok: bool, n: int = 1) -> None:
+        with self._lock:
+            self.done += n
+            self.busy_s += dt
+            self.max_s = max(self.max_s, dt)
+            if not ok:
+                self.errors += n
+
+    def call(self, payload: Any) -> Any:
+        if isinstance(payload, _Failed):
+            return payload
+        t0 = time.perf_counter()
+        try:
+            out = self.fn(payload)
+        except Exception as e:
+            self._record(time.perf_counter() - t0, ok=False)
+            return _Failed(e, self.name)
+        self._record(time.perf_counter() - t0, ok=True)
+        return out
+
+    def call_batch(self, payloads: List[Any]) -> List[Any]:
+        if self.batch_size <= 1:
+            return [self.call(p) for p in payloads]
+        live = [p for p in payloads if not isinstance(p, _Failed)]
+        results: List[Any] = []
+        if live:
+            t0 = time.perf_counter()
+            try:
+                results = list(self.fn(live))
+                if len(results) != len(live):
+                    raise RuntimeError(f"stage '{self.name}' returned {len(results)} results for {len(live)} items")
+            except Exception as e:
+                self._record(time.perf_counter() - t0, ok=False, n=len(live))
+                results = [_Failed(e, self.name)] * len(live)
+            else:
+                self._record(time.perf_counter() - t0, ok=True, n=len(live))
+        it = iter(results)
+        return [p if isinstance(p, _Failed) else next(it) for p in payloads]
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "queued": self.inbox.qsize() if self.inbox is not None else 0,
+                "done": self.done,
+                "errors": self.errors,
+                "avg_ms": round(1000 * self.busy_s / self.done, 1) if self.done else 0.0,
+                "max_ms": round(1000 * self.max_s, 1),
+                "per_s": round(self.done / elapsed, 2) if elapsed > 0 else 0.0,
+                # share of the pool's wall-clock time spent working; ~1.0 means this stage is the bottleneck
+                "utilization": round(self.busy_s / (elapsed * self.workers), 2) if elapsed > 0 else 0.0,
+            }
+
+
+class StagePipeline:
+    """
+    Runs items through a chain of stages, each with its own worker pool.
+
+    Stages are connected by bounded queues, so a CPU-bound stage (ffmpeg) works on
+    item N while an I/O-bound stage (LLM call) already handles item N+5. Results are
+    yielded in input order. An exception raised by a stage is re-raised by run()
+    when its item's turn comes.
+
+    With inline=True every item runs through all stages in the calling thread.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = 0,
+        inline: bool = False,
+        stats_interval: float = 0.0,
+    ):
+        self.stages = stages
+        self.inline = inline
+        self.queue_size = queue_size or 2 * max(s.workers for s in stages)
+        self.stats_interval = stats_interval
+        # A batching stage needs room in its inbox to fill a batch for every worker
+        self.inbox_sizes = [max(self.queue_size, s.batch_size * s.workers) for s in stages]
+        # Items admitted but not yet yielded; bounds the reorder buffer as well as the queues
+        self.max_in_flight = sum(self.inbox_sizes) + sum(s.workers * s.batch_size for s in stages)
+        self._t0 = time.perf_counter()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        elapsed = time.perf_counter() - self._t0
+        return [s.stats(elapsed) for s in self.stages]
+
+    def format_stats(self) -> str:
+        return " | ".join(
+            f"{st['stage']}: q={st['queued']} done={st['done']} err={st['errors']} "
+            f"avg={st['avg_ms']}ms {st['per_s']}/s util={st['utilization']}"
+            for st in self.stats()
+        )
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        self._t0 = time.perf_counter()
+        if self.inline:
+            yield from self._run_inline(items)
+        else:
+            yield from self._run_threaded(items)
+
+    def _run_inline(self, items: Iterable[Any]) -> Iterator[Any]:
+        last_log = time.perf_counter()
+        chunk_size = max(st.batch_size for st in self.stages)
+        chunk: List[Any] = []
+        for it in items:
+            chunk.append(it)
+            if len(chunk) < chunk_size:
+                continue
+            yield from self._run_chunk(chunk)
+            chunk = []
+            last_log = self._maybe_log(last_log)
+        if chunk:
+            yield from self._run_chunk(chunk)
+
+    def _run_chunk(self, chunk: List[Any]) -> Iterator[Any]:
+        payloads = chunk
+        for st in self.stages:
+            payloads = st.call_batch(payloads)
+        for payload in payloads:
+            if isinstance(payload, _Failed):
+                raise payload.exc
+            yield payload
+
+    def _maybe_log(self, last_log: float) -> float:
+        now = time.perf_counter()
+        if self.stats_interval and now - last_log >= self.stats_interval:
+            logger.info("Pipeline: %s", self.format_stats())
+            return now
+        return last_log
+
+    def _run_threaded(self, items: Iterable[Any]) -> Iterator[Any]:
+        stop = threading.Event()
+        slots = threading.Semaphore(self.max_in_flight)
+        queues = [queue.Queue(maxsize=size) for size in self.inbox_sizes]
+        out_q: queue.Queue = queue.Queue()
+        for st, q in zip(self.stages, queues):
+            st.inbox = q
+
+        def put(q: queue.Queue, obj: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(obj, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def feed():
+            try:
+                for idx, it in enumerate(items):
+                    while not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    if not put(queues[0], (idx, it)):
+                        return
+            except Exception as e:
+                out_q.put((-1, _Failed(e, "input")))
+                return
+            finally:
+                put(queues[0], _DONE)
+
+        def work(pos: int):
+            st = self.stages[pos]
+            inbox = queues[pos]
+            outbox = queues[pos + 1] if pos + 1 < len(queues) else out_q
+            while not stop.is_set():
+                try:
+                    msg = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                batch = []
+                saw_done = msg is _DONE
+                if not saw_done:
+                    batch.append(msg)
+                while not saw_done and len(batch) < st.batch_size:
+                    try:
+                        msg = inbox.get(timeout=st.batch_wait)
+                    except queue.Empty:
+                        break
+                    if msg is _DONE:
+                        saw_done = True
+                    else:
+                        batch.append(msg)
+                if batch:
+                    results = st.call_batch([payload for _, payload in batch])
+                    for (idx, _), res in zip(batch, results):
+                        if not put(outbox, (idx, res)):
+                            return
+                if saw_done:
+                    # Pass the sentinel back for sibling workers; the last one forwards it
+                    with finish_lock:
+                        finished[pos] += 1
+                        last = finished[pos] == st.workers
+                    if last:
+                        put(outbox, _DONE)
+                    else:
+                        put(inbox, _DONE)
+                    return
+
+        finish_lock = threading.Lock()
+        finished = [0] * len(self.stages)
+        threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+        for pos, st in enumerate(self.stages):
+            for n in range(st.workers):
+                threads.append(
+                    threading.Thread(target=work, args=(pos,), name=f"pipeline-{st.name}-{n}", daemon=True)
+                )
+        for t in threads:
+            t.start()
+
+        buffer: Dict[int, Any] = {}
+        next_idx = 0
+        last_log = time.perf_counter()
+        try:
+            while True:
+                try:
+                    msg = out_q.get(timeout=0.5)
+                except queue.Empty:
+                    last_log = self._maybe_log(last_log)
+                    continue
+                if msg is _DONE:
+                    break
+                idx, payload = msg
+                if idx < 0:
+                    raise payload.exc
+                buffer[idx] = payload
+                while next_idx in buffer:
+                    payload = buffer.pop(next_idx)
+                    next_idx += 1
+                    slots.release()
+                    if isinstance(payload, _Failed):
+                        raise payload.exc
+                    yield payload
+                last_log = self._maybe_log(last_log)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join(timeout=5)
+
+
+class KeyedLocks:
+    """One lock per key (e.g. a media filename), created on demand."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+
+    @contextmanager
+    def hold(self, key: str):
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
@@ -0,0 +1,283 @@
+# src/planner.py
+import json
+import math
+import os
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .audio_utils import tempo_variant_name
+from .cache_store import open_cache_store
+from .cache_utils import OOVDictionary, cache_aliases, lang_pair, make_cache_key, oov_dict_path
+from .io_utils import example_audio_filename, iter_wordlist, oov_tokens, word_audio_filename
+from .journal import RunJournal
+from .media_manifest import MediaManifest
+from .ratelimit import RateLimiters
+from .shard import shard_of
+from .word_index import WordIndex
+
+# Seconds per call until a real run has measured them
+DEFAULT_LATENCY_S = {"text": 3.0, "tts": 1.5, "translate": 3.0, "audio": 0.3}
+
+_CARD_FIELDS = ("translation", "example_src", "example_tgt", "note")
+
+
+class LatencyHistory:
+    """
+    Mean seconds per successful call for each endpoint, carried across runs in a small
+    JSON file. Older runs weigh at most `memory` calls, so the mean follows changes.
+    """
+
+    def __init__(self, path: Path, memory: int = 1000):
+        self.path = path
+        self.memory = memory
+        self.entries: Dict[str, Dict[str, float]] = {}
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entries = {}
+
+    def get(self, endpoint: str) -> Optional[float]:
+        e = self.entries.get(endpoint)
+        return e["avg_s"] if e else None
+
+    def record(self, endpoint: str, calls: int, total_s: float) -> None:
+        if calls <= 0:
+            return
+        old = self.entries.get(endpoint, {"avg_s": 0.0, "calls": 0})
+        w_old = min(old["calls"], self.memory)
+        avg = (old["avg_s"] * w_old + total_s) / (w_old + calls)
+        self.entries[endpoint] = {"avg_s": round(avg, 4), "calls": int(old["calls"] + calls)}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+def latency_history_path(cfg: Dict) -> Path:
+    return Path(cfg.get("LATENCY_HISTORY_FILE", str(Path(cfg.get("CACHE_DIR", "cache")) / "latency_history.json")))
+
+
+def plan_job(
+    cfg: Dict,
+    input_path: Path,
+    usage_notes: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Any]:
+    """
+    Predict what a run would do, from local state only: the cache, the media directory,
+    the resume journal and the OOV dictionary. No backend is created and nothing is
+    sent over the network. With shard=(i, N) only that shard's words are planned, as
+    run_job() would build them.
+    """
+    t0 = time.perf_counter()
+    usage_notes = usage_notes or cfg.get("USAGE_NOTES_DEF", "auto")
+    backend_name = cfg.get("BACKEND", "openai").lower()
+    out_dir = Path(cfg.get("OUTPUT_DIR", "out"))
+    media_dir = out_dir / cfg.get("OUTPUT_MEDIA_DIR", "media")
+    audio_ext = cfg.get("AUDIO_EXT", "mp3")
+    source_lang = cfg.get("SOURCE_LANG", "Source")
+    add_example_audio = bool(cfg.get("ADD_EXAMPLE_AUDIO", True))
+    regenerate_audio = bool(cfg.get("REGENERATE_AUDIO_ALWAYS", False))
+    new_words = bool(cfg.get("SHOW_NEW_WORDS_ON_BACK", True)) and bool(cfg.get("OOV_TRANSLATE", True))
+    example_rate = float(cfg.get("EXAMPLE_AUDIO_RATE", 1.0))
+    batch_size = max(1, int(cfg.get("GENERATE_BATCH_SIZE", 1)))
+    oov_batch_size = max(1, int(cfg.get("OOV_BATCH_SIZE", 100)))
+    tsv_flush_rows = max(1, int(cfg.get("TSV_FLUSH_ROWS", 500)))
+    workers = max(1, int(max_concurrency or cfg.get("MAX_CONCURRENCY", 1)))
+    stage_workers = cfg.get("STAGE_WORKERS", {}) or {}
+    csv_columns = cfg.get("CSV_COLUMNS") or None
+
+    # Read-only, like the journal: a plan migrates, evicts and touches nothing
+    cache = open_cache_store(cfg, readonly=True) if bool(cfg.get("ENABLE_CACHE", True)) else None
+    legacy_keys = bool(cfg.get("CACHE_LEGACY_KEYS", True))
+    journal = None
+    if bool(cfg.get("RESUME_ENABLED", True)):
+        journal = RunJournal(Path(cfg.get("JOURNAL_FILE", str(out_dir / "journal.jsonl"))))
+        journal.load(readonly=True)
+    # One directory listing answers every "is this file there?" question
+    media_names = set(os.listdir(media_dir)) if media_dir.is_dir() else set()
+    manifest = MediaManifest(Path(cfg.get("MEDIA_MANIFEST", str(out_dir / "media_manifest.json"))), media_dir, trust=True)
+    oov_dict = OOVDictionary(oov_dict_path(cfg))
+    for pack in (cache.packs if cache is not None else ()):
+        media_names.update(pack.media_names())
+        oov_dict.seed(pack.oov(lang_pair(cfg)))
+
+    n = {"rows": 0, "resumed": 0, "cache_hits": 0, "cache_misses": 0, "audio_hits": 0, "tts_calls": 0,
+         "tempo_conversions": 0, "oov_tokens_seen": 0}
+    unknown_tokens = set()
+
+    def audio_needed(name: str) -> bool:
+        if not regenerate_audio and name in media_names:
+            n["audio_hits"] += 1
+            return False
+        n["tts_calls"] += 1
+        return True
+
+    def tempo_needed(name: str, fresh: bool) -> None:
+        if abs(example_rate - 1.0) <= 1e-6:
+            return
+        entry = manifest.get(name)
+        if fresh or entry is None:
+            n["tempo_conversions"] += 1
+        elif entry.get("tempo") in (None, example_rate) or entry.get("source"):
+            return  # AudioEngine.tempo_many leaves these as they are
+        elif tempo_variant_name(name, entry["sha1"], example_rate) not in media_names:
+            n["tempo_conversions"] += 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = WordIndex(Path(tmp) / "words.sqlite")
+        n_input, n_unique = index.build(iter_wordlist(input_path, csv_columns))
+        words = index.iter_words() if journal is not None else iter_wordlist(input_path, csv_columns)
+        if shard is not None:
+            # Only this shard's words become rows; the whole list stays the OOV vocabulary
+            words = (w for w in words if shard_of(w, shard[1]) == shard[0])
+            n_unique = sum(1 for w in index.iter_words() if shard_of(w, shard[1]) == shard[0])
+        while True:
+            chunk = list(islice(words, 500))
+            if not chunk:
+                break
+            n["rows"] += len(chunk)
+            todo = []
+            for w in chunk:
+                key = w.strip().lower()
+                rec = journal.get(key) if journal is not None else None
+                if rec is None:
+                    todo.append(w)
+                    continue
+                n["resumed"] += 1
+                for t in oov_dict.missing(rec.get("oov", [])):
+                    unknown_tokens.add(t)
+
+            keys = {w: make_cache_key(w, cfg, usage_notes, backend_name) for w in todo}
+            old = {keys[w]: cache_aliases(w, cfg, usage_notes, backend_name, legacy_keys) for w in todo}
+            cached = cache.lookup(keys.values(), old, promote=False) if cache is not None else {}
+            for w in todo:
+                data = cached.get(keys[w])
+                if not (data and all(k in data for k in _CARD_FIELDS)):
+                    data = None
+                n["cache_hits" if data else "cache_misses"] += 1
+
+                audio_needed(word_audio_filename(w, source_lang, audio_ext))
+                if not add_example_audio:
+                    continue
+                if data is None:
+                    # The example sentence is not known yet: it will need audio (and tempo)
+                    n["tts_calls"] += 1
+                    tempo_needed("", fresh=True)
+                    continue
+                if data["example_src"].strip():
+                    ex_name = example_audio_filename(data["example_src"], source_lang, audio_ext)
+                    tempo_needed(ex_name, fresh=audio_needed(ex_name))
+                toks = oov_tokens(data["example_src"], w.strip().lower(), index)
+                n["oov_tokens_seen"] += len(toks)
+                unknown_tokens.update(oov_dict.missing(toks))
+        index.close()
+    if cache is not None:
+        cache.close()
+    journal_rows = n["resumed"]
+
+    # Cards still to be generated get as many unknown tokens as the cached ones had, on average
+    known_cards = n["cache_hits"] + journal_rows
+    per_card = len(unknown_tokens) / known_cards if known_cards else 0.0
+    est_tokens = len(unknown_tokens) + int(round(per_card * n["cache_misses"])) if new_words else 0
+    chunks = math.ceil(n["rows"] / tsv_flush_rows)
+    translate_calls = max(math.ceil(est_tokens / oov_batch_size), min(chunks, est_tokens)) if est_tokens else 0
+
+    text_calls = n["cache_misses"] if batch_size == 1 else math.ceil(n["cache_misses"] / batch_size)
+    calls = {"text": text_calls, "tts": n["tts_calls"], "translate": translate_calls}
+
+    # Time: each stage is bounded by its latency over its workers and by the rate limit;
+    # stages overlap, new-word translation happens in between TSV chunks
+    history = LatencyHistory(latency_history_path(cfg))
+    limiters = RateLimiters(cfg)
+    latency = {ep: (history.get(ep), "history") if history.get(ep) is not None else (s, "default")
+               for ep, s in DEFAULT_LATENCY_S.items()}
+    per_call_text = latency["text"][0] * (1 + 0.5 * (batch_size - 1))
+
+    def stage_s(ep: str, count: int, per_call: float, n_workers: int) -> float:
+        return max(count * per_call / max(1, n_workers), count / limiters.get(ep).max_rate)
+
+    audio_workers = int(stage_workers.get("audio", min(workers, os.cpu_count() or 1)))
+    times = {
+        "text": stage_s("text", text_calls, per_call_text, int(stage_workers.get("text", workers))),
+        "tts": stage_s("tts", calls["tts"], latency["tts"][0], int(stage_workers.get("tts", workers))),
+        "audio": n["tempo_conversions"] * latency["audio"][0] / max(1, audio_workers),
+        "translate": max(translate_calls * latency["translate"][0], translate_calls / limiters.get("translate").max_rate),
+    }
+    total_s = max(times["text"], times["tts"], times["audio"]) + times["translate"]
+
+    todo_cards = n["rows"] - journal_rows
+    return {
+        "input_words": n_input,
+        "unique_words": n_unique,
+        "shard": f"{shard[0]}/{shard[1]}" if shard is not None else None,
+        "rows": n["rows"],
+        "resumed": journal_rows,
+        "cards_to_build": todo_cards,
+        "cache_hits": n["cache_hits"],
+        "cache_misses": n["cache_misses"],
+        "cache_hit_rate": round(n["cache_hits"] / todo_cards, 3) if todo_cards else 1.0,
+        "audio_hits": n["audio_hits"],
+        "audio_hit_rate": round(n["audio_hits"] / (n["audio_hits"] + n["tts_calls"]), 3) if (n["audio_hits"] + n["tts_calls"]) else 1.0,
+        "tempo_conversions": n["tempo_conversions"],
+        "oov_tokens_unknown": len(unknown_tokens),
+        "oov_tokens_estimated": est_tokens,
+        "calls": calls,
+        "latency_s": {ep: {"per_call": round(v, 3), "source": src} for ep, (v, src) in latency.items()},
+        "time_s": {k: round(v, 1) for k, v in times.items()},
+        "estimated_total_s": round(total_s, 1),
+        "workers": workers,
+        "plan_s": round(time.perf_counter() - t0, 2),
+    }
+
+
+def _fmt_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h{m:02d}m{s:02d}s" if h else (f"{m}m{s:02d}s" if m else f"{s}s")
+
+
+def format_plan(plan: Dict[str, Any]) -> str:
+    c, lat, t = plan["calls"], plan["latency_s"], plan["time_s"]
+
+    def ep(name: str) -> str:
+        return f"{name}: {c[name]} call(s) × {lat[name]['per_call']}s ({lat[name]['source']}) ≈ {_fmt_duration(t[name])}"
+
+    return "\n".join(
+        [
+            f"📋 Plan (no API calls made, {plan['plan_s']}s)",
+            f"  Words: {plan['input_words']} read, {plan['unique_words']} unique"
+            + (f" in shard {plan['shard']}" if plan.get("shard") else "")
+            + f" → {plan['rows']} rows",
+            f"  Resume: {plan['resumed']} rows from the journal, {plan['cards_to_build']} cards to build",
+            f"  Cache: {plan['cache_hits']} hits, {plan['cache_misses']} misses (hit rate {plan['cache_hit_rate']:.0%})",
+            f"  Audio: {plan['audio_hits']} files present (hit rate {plan['audio_hit_rate']:.0%}), "
+            f"{plan['tempo_conversions']} tempo conversion(s)",
+            f"  New words: {plan['oov_tokens_unknown']} unknown tokens seen, ~{plan['oov_tokens_estimated']} expected",
+            "  Calls per endpoint:",
+            "    " + ep("text"),
+            "    " + ep("tts"),
+            "    " + ep("translate"),
+            f"    audio (ffmpeg): {plan['tempo_conversions']} file(s) ≈ {_fmt_duration(t['audio'])}",
+            f"  ⏱️ Estimated wall-clock: ~{_fmt_duration(plan['estimated_total_s'])} with {plan['workers']} worker(s)",
+        ]
+    )
+
+
+def record_latency(cfg: Dict, before: Dict[str, Tuple[int, float]], after: Dict[str, Tuple[int, float]], audio: Tuple[int, float]) -> None:
+    """Fold this run's measured call latencies into the history used by --plan."""
+    history = LatencyHistory(latency_history_path(cfg))
+    for ep, (calls, total) in after.items():
+        c0, t0 = before.get(ep, (0, 0.0))
+        history.record(ep, calls - c0, total - t0)
+    history.record("audio", *audio)
+    if any(after[ep][0] - before.get(ep, (0, 0.0))[0] for ep in after) or audio[0]:
+        history.save()
@@ -16,13 +16,57 @@ Taken:
 1) Vertaal het {source_lang}-woord naar {target_lang}.
 2) Maak één natuurlijke voorbeeldzin in het {source_lang}.
 3) Geef de {target_lang}-vertaling van die zin.
-4) OPMERKING: alleen indien relevant (kort en duidelijk).
+4) OPMERKING: alleen indien relevant (kort en duidelijk), anders een lege string.
 
 JSON-output:
 {{
   "translation": "...",
   "example_src": "...",
   "example_tgt": "...",
-  "note": "..."  // mag leeg zijn
+  "note": "..."
 }}
 """
+
+BATCH_PROMPT_TEMPLATE = """Bron-taal (SOURCE_LANG): {source_lang}
+Doel-taal (TARGET_LANG): {target_lang}
+Gebruik van usage notes: {usage_notes}
+
+Doelwoorden (één per regel):
+{words}
+
+Taken, voor ELK doelwoord afzonderlijk:
+1) Vertaal het {source_lang}-woord naar {target_lang}.
+2) Maak één natuurlijke voorbeeldzin in het {source_lang}.
+3) Geef de {target_lang}-vertaling van die zin.
+4) OPMERKING: alleen indien relevant (kort en duidelijk), anders een lege string.
+
+JSON-output: één object met elk doelwoord, exact zoals hierboven geschreven, als sleutel:
+{{
+  "<doelwoord>": {{
+    "translation": "...",
+    "example_src": "...",
+    "example_tgt": "...",
+    "note": "..."
+  }}
+}}
+"""
+
+# Targeted retry: only the fields a response left out or left empty
+FIELD_DESCRIPTIONS = {
+    "translation": "vertaling van het doelwoord naar {target_lang}",
+    "example_src": "één natuurlijke voorbeeldzin in het {source_lang} met het doelwoord",
+    "example_tgt": "{target_lang}-vertaling van de voorbeeldzin",
+    "note": "korte opmerking, alleen indien relevant, anders een lege string",
+}
+
+MISSING_FIELDS_TEMPLATE = """Bron-taal (SOURCE_LANG): {source_lang}
+Doel-taal (TARGET_LANG): {target_lang}
+
+Doelwoord: "{word}"
+
+Deze velden van de flashcard zijn al bekend:
+{known}
+
+Geef alleen de ontbrekende velden als JSON-object, passend bij de bekende velden:
+{missing}
+"""
@@ -0,0 +1,275 @@
+# src/ratelimit.py
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+logger = logging.getLogger("flashcard_lingua")
+
+ENDPOINTS = ("text", "tts", "translate")
+
+_DEFAULT_LIMITS = {"rps": 5.0, "max_rps": 50.0, "min_rps": 0.2, "burst": 5, "increase": 0.05, "decrease": 0.5}
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """'1s', '6m0s', '20ms' or a plain number of seconds."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+
+def _headers_of(exc: BaseException) -> Optional[Mapping[str, str]]:
+    resp = getattr(exc, "response", None)
+    headers = getattr(resp, "headers", None) or getattr(exc, "headers", None)
+    return headers if headers is not None else None
+
+
+def status_of(exc: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        v = getattr(exc, attr, None)
+        if isinstance(v, int):
+            return v
+    resp = getattr(exc, "response", None)
+    v = getattr(resp, "status_code", None)
+    return v if isinstance(v, int) else None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Server-provided back-off for a failed call: Retry-After(-ms) or the rate-limit reset headers."""
+    headers = _headers_of(exc)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    ra = headers.get("retry-after")
+    if ra:
+        try:
+            return max(0.0, float(ra))
+        except ValueError:
+            # HTTP date form (rare); email.utils is slow to import, so only here
+            import email.utils
+
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(ra).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return parse_duration(headers.get("x-ratelimit-reset-requests", ""))
+
+
+def is_throttle_exception(exc: BaseException) -> bool:
+    if status_of(exc) == 429:
+        return True
+    s = str(exc).lower()
+    return "429" in s or "rate limit" in s or "resource exhausted" in s or "quota" in s
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate follows AIMD: every success raises it by a small step,
+    every throttle (429) halves it. Retry-After and rate-limit headers pause the
+    bucket until the server says it is ready again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rps: float,
+        max_rps: float,
+        min_rps: float = 0.2,
+        burst: float = 5,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+    ):
+        self.name = name
+        self.rate = float(rps)
+        self.max_rate = max(float(max_rps), self.rate)
+        self.min_rate = min(float(min_rps), self.rate)
+        self.burst = max(1.0, float(burst))
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.tokens = self.burst
+        self.blocked_until = 0.0
+        self.calls = 0
+        self.throttles = 0
+        # Successful calls and their summed duration (for the --plan latency history)
+        self.ok_calls = 0
+        self.busy_s = 0.0
+        self._last = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    self.calls += 1
+                    return
+                else:
+                    wait = (1.0 - self.tokens) / self.rate
+            time.sleep(min(wait, 5.0))
+
+    def on_success(self, duration: float = 0.0) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.ok_calls += 1
+            self.busy_s += duration
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            # Workers that hit the same burst of 429s count as one signal
+            if now - self._last_decrease > 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            self.tokens = 0.0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+        logger.info(f"Rate limit hit on '{self.name}': {self.rate:.2f}/s, pausing {retry_after or 0:.1f}s")
+
+    def on_headers(self, headers: Mapping[str, str]) -> None:
+        """x-ratelimit-* hints from a successful response."""
+        limit = headers.get("x-ratelimit-limit-requests")
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests", ""))
+        with self._lock:
+            if limit:
+                try:
+                    # Published per minute; never go above it, whatever max_rps says
+                    self.max_rate = max(self.min_rate, min(self.max_rate, float(limit) / 60.0))
+                    self.rate = min(self.rate, self.max_rate)
+                except ValueError:
+                    pass
+            if remaining is not None and reset:
+                try:
+                    if int(remaining) <= 0:
+                        self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+                except ValueError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"endpoint": self.name, "rate": round(self.rate, 2), "calls": self.calls, "throttles": self.throttles}
+
+
+class CallBudget:
+    """
+    Bounds the API calls in flight across threads. Re-entrant per thread: a batch call
+    whose per-word fallback makes nested calls holds one slot, not several.
+    """
+
+    def __init__(self, size: int):
+        self.size = int(size)
+        self._sem = threading.BoundedSemaphore(self.size)
+        self._local = threading.local()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._sem.acquire()
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self._sem.release()
+
+    @contextmanager
+    def held(self) -> Iterator[None]:
+        """Mark this thread as working under a slot another thread holds (hedged attempts)."""
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+
+
+class RateLimiters:
+    """
+    One limiter per endpoint ("text", "tts", "translate"), shared by all workers.
+
+    RATE_LIMITS in config.json overrides the defaults per endpoint, e.g.
+    {"text": {"rps": 2, "max_rps": 8}, "tts": {"rps": 10}}.
+
+    budget, when set, is a CallBudget bounding the calls in flight across every
+    limiter that shares it (the batch runner's global concurrency budget).
+    """
+
+    def __init__(self, cfg: Dict):
+        conf = cfg.get("RATE_LIMITS", {}) or {}
+        self.limiters: Dict[str, AdaptiveRateLimiter] = {}
+        for ep in ENDPOINTS:
+            opts = dict(_DEFAULT_LIMITS)
+            opts.update(conf.get(ep, {}) or {})
+            self.limiters[ep] = AdaptiveRateLimiter(ep, **opts)
+        self.budget: Optional[CallBudget] = None
+
+    def get(self, endpoint: str) -> AdaptiveRateLimiter:
+        return self.limiters[endpoint]
+
+    def hints(self, endpoint: str, headers: Mapping[str, str]) -> None:
+        if headers:
+            self.limiters[endpoint].on_headers(headers)
+
+    def slot(self):
+        return self.budget.slot() if self.budget is not None else nullcontext()
+
+    def held(self):
+        return self.budget.held() if self.budget is not None else nullcontext()
+
+    def call(self, endpoint: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self.slot():
+            return self.attempt(endpoint, fn, *args, **kwargs)
+
+    def attempt(self, endpoint: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """One rate-limited call, outside the budget (the caller holds a slot)."""
+        lim = self.limiters[endpoint]
+        lim.acquire()
+        t0 = time.perf_counter()
+        try:
+            out = fn(*args, **kwargs)
+        except Exception as e:
+            if is_throttle_exception(e) or status_of(e) == 503:
+                lim.on_throttle(retry_after_seconds(e))
+            raise
+        lim.on_success(time.perf_counter() - t0)
+        return out
+
+    def latency(self) -> Dict[str, Tuple[int, float]]:
+        """endpoint -> (successful calls, summed seconds) so far."""
+        return {ep: (lim.ok_calls, lim.busy_s) for ep, lim in self.limiters.items()}
+
+    def format_stats(self) -> str:
+        return " | ".join(
+            f"{st['endpoint']}: {st['rate']}/s calls={st['calls']} throttled={st['throttles']}"
+            for st in (lim.stats() for lim in self.limiters.values())
+        )
@@ -0,0 +1,126 @@
+# src/resources.py
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .cache_store import CacheStore, open_cache_store
+from .cache_utils import OOVDictionary
+from .journal import RunJournal
+from .media_manifest import MediaManifest
+from .ratelimit import CallBudget, RateLimiters
+
+
+def make_backend(cfg: Dict, name: Optional[str] = None):
+    backend_name = (name or cfg.get("BACKEND", "openai")).lower()
+    if backend_name == "openai":
+        from .backends.openai_backend import OpenAIBackend as Backend
+    elif backend_name == "google":
+        from .backends.google_backend import GoogleBackend as Backend
+    elif backend_name == "fake":
+        from .backends.fake_backend import FakeBackend as Backend
+    elif backend_name == "router":
+        from .backends.router import RouterBackend as Backend
+    else:
+        raise ValueError("BACKEND must be 'openai', 'google', 'fake' or 'router'.")
+    return Backend(cfg)
+
+
+class SharedResources:
+    """
+    Process-wide registry of what jobs can share: pooled backend clients (per provider
+    and credentials), rate limiters (per provider and model), cache stores (per cache
+    location) and OOV dictionaries (per file).
+
+    A single run uses a private instance. The batch runner passes one instance to every
+    job, optionally with a global budget: the maximum number of API calls in flight
+    across all jobs. With keep_state (the daemon) journals and media manifests also stay
+    loaded, so repeated jobs on one deck skip re-reading them.
+    """
+
+    def __init__(self, budget: int = 0, keep_state: bool = False):
+        self.budget = CallBudget(budget) if budget > 0 else None
+        self.keep_state = keep_state
+        self._lock = threading.Lock()
+        self._clients: Dict[Any, Any] = {}
+        self._limiters: Dict[Any, RateLimiters] = {}
+        self._caches: Dict[Any, CacheStore] = {}
+        self._oov: Dict[Path, OOVDictionary] = {}
+        self._journals: Dict[Path, RunJournal] = {}
+        self._manifests: Dict[Path, MediaManifest] = {}
+
+    def backend(self, cfg: Dict, name: Optional[str] = None):
+        """A backend configured for this job, on the pooled clients of an earlier one with the same credentials."""
+        backend = make_backend(cfg, name)
+        with self._lock:
+            donor = self._clients.setdefault(backend.client_key(), backend)
+        if donor is not backend:
+            backend.adopt_clients(donor)
+        return backend
+
+    def limiters(self, cfg: Dict, backend) -> RateLimiters:
+        key = backend.model_key()
+        with self._lock:
+            lim = self._limiters.get(key)
+            if lim is None:
+                lim = self._limiters[key] = RateLimiters(cfg)
+                lim.budget = self.budget
+            return lim
+
+    def cache(self, cfg: Dict) -> CacheStore:
+        cache_dir = Path(cfg.get("CACHE_DIR", "cache"))
+        key = (
+            (cfg.get("CACHE_BACKEND", "sqlite") or "sqlite").lower(),
+            Path(cfg.get("CACHE_DB", str(cache_dir / "cache.sqlite3"))).resolve(),
+            cache_dir.resolve(),
+        )
+        with self._lock:
+            store = self._caches.get(key)
+            if store is None:
+                store = self._caches[key] = open_cache_store(cfg)
+            return store
+
+    def oov_dict(self, path: Path) -> OOVDictionary:
+        key = path.resolve()
+        with self._lock:
+            d = self._oov.get(key)
+            if d is None:
+                d = self._oov[key] = OOVDictionary(path)
+            return d
+
+    def journal(self, path: Path) -> RunJournal:
+        """A loaded journal; a fresh one per call unless keep_state."""
+        if not self.keep_state:
+            j = RunJournal(path)
+            j.load()
+            return j
+        key = path.resolve()
+        with self._lock:
+            j = self._journals.get(key)
+            if j is None:
+                j = self._journals[key] = RunJournal(path)
+                j.load()
+            return j
+
+    def manifest(self, path: Path, media_dir: Path, trust: bool = False) -> MediaManifest:
+        if not self.keep_state:
+            return MediaManifest(path, media_dir, trust=trust)
+        key = path.resolve()
+        with self._lock:
+            m = self._manifests.get(key)
+            if m is None:
+                m = self._manifests[key] = MediaManifest(path, media_dir, trust=trust)
+            return m
+
+    def close(self) -> None:
+        with self._lock:
+            for j in self._journals.values():
+                j.close()
+            self._journals.clear()
+            for m in self._manifests.values():
+                m.save()
+            self._manifests.clear()
+            for store in self._caches.values():
+                store.close()
+            self._caches.clear()
+            for d in self._oov.values():
+                d.save()
@@ -1,27 +1,41 @@
 # flashcard_lingua/runner.py
+import os
 import sys
-import time
 import csv
 import logging
-import subprocess
+import time
 from pathlib import Path
-from typing import List, Dict, Any
-from tqdm import tqdm
-
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception, before_sleep_log
+from typing import Any, Callable, Container, Dict, Iterable, Iterator, List, Optional, Tuple
 
+# tqdm, tenacity, genanki and the provider SDKs are imported where they are used, so
+# --help, --plan and other short invocations start without them
 from .config_loader import load_config
 from .io_utils import (
-    read_wordlist,
-    tokenize_words,
+    iter_wordlist,
+    read_tsv_rows,
+    oov_tokens,
     word_audio_filename,
     example_audio_filename,
 )
-from .packaging import build_apkg
-from .cache_utils import make_cache_key, cache_read, cache_write, load_state, save_state
+from .pipeline import Stage, StagePipeline, KeyedLocks
+from .cache_utils import cache_aliases, make_cache_key, lang_pair, load_state, oov_dict_path, OOVDictionary
+from .cache_store import CacheStore
+from .journal import RunJournal
+from .media_manifest import MediaManifest
+from .word_index import WordIndex
+from .ratelimit import RateLimiters, retry_after_seconds
+from .resources import SharedResources
+from .planner import format_plan, plan_job, record_latency
+from .bulk import BulkRunner
+from .metrics import Metrics
+from .hedging import Hedger
+from .shard import parse_shard, shard_config, shard_of
+from .audio_utils import AudioEngine, adjust_audio_rate  # noqa: F401 (adjust_audio_rate re-exported)
 
 logger = logging.getLogger("flashcard_lingua")
 
+TSV_HEADER = ["Front", "Back", "Example Source", "Example Target", "Note", "New Words"]
+
 
 class RetryableError(Exception):
     pass
@@ -46,47 +60,51 @@ def is_retryable_exception(e: Exception) -> bool:
     )
 
 
-def make_retry_decorator(max_attempts: int):
+def make_retry_decorator(max_attempts: int, on_retry: Optional[Any] = None):
+    from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception, before_sleep_log
+
+    backoff = wait_exponential(multiplier=1, min=1, max=60)
+    log_retry = before_sleep_log(logger, logging.WARNING)
+
+    def before_sleep(retry_state) -> None:
+        if on_retry is not None:
+            on_retry(retry_state)
+        log_retry(retry_state)
+
+    def wait(retry_state) -> float:
+        # Prefer the server's Retry-After over our own exponential guess
+        exc = retry_state.outcome.exception()
+        hint = retry_after_seconds(exc.__cause__ or exc) if exc is not None else None
+        return min(hint, 300.0) if hint is not None else backoff(retry_state)
+
     return retry(
         retry=retry_if_exception(is_retryable_exception),
-        wait=wait_exponential(multiplier=1, min=1, max=60),
+        wait=wait,
         stop=stop_after_attempt(max_attempts),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
+        before_sleep=before_sleep,
     )
 
 
-def _ffmpeg_available() -> bool:
-    try:
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=False,
-        )
-        return True
-    except Exception:
-        return False
-
+def format_new_words(tokens: List[str], oov_dict: Optional[OOVDictionary]) -> str:
+    lines = []
+    for t in tokens:
+        tr = oov_dict.get(t) if oov_dict is not None else ""
+        lines.append(f"{t} = {tr}" if tr else t)
+    return "\n".join(lines)
 
-def adjust_audio_rate(in_path: Path, out_path: Path, rate: float) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    if not _ffmpeg_available():
-        raise RuntimeError("ffmpeg niet gevonden. Installeer met: sudo apt-get install -y ffmpeg")
+def setup_logging(cfg: Dict) -> None:
+    log_level = getattr(logging, cfg.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    third_party_level = getattr(
+        logging, cfg.get("THIRD_PARTY_LOG_LEVEL", "WARNING").upper(), logging.WARNING
+    )
+    logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s: %(message)s")
+    logger.setLevel(log_level)
 
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-i",
-        str(in_path),
-        "-filter:a",
-        f"atempo={rate}",
-        str(out_path),
-    ]
-    subprocess.run(cmd, check=True)
+    for _name in ("httpx", "httpcore", "openai", "urllib3"):
+        _lg = logging.getLogger(_name)
+        _lg.setLevel(third_party_level)
+        _lg.propagate = False
 
 
 def main():
@@ -97,64 +115,197 @@ def main():
     )
     ap.add_argument("input", help="Word list file (.txt or .csv)")
     ap.add_argument("--usage-notes", choices=["auto", "always", "never"])
+    ap.add_argument("--max-concurrency", type=int, help="Words processed in parallel (overrides MAX_CONCURRENCY)")
+    ap.add_argument("--bulk", action="store_true", help="Generate cache-missing cards through the OpenAI Batch API first")
+    ap.add_argument("--bulk-oov", action="store_true", help="With --bulk: also translate OOV tokens through the Batch API")
+    ap.add_argument("--plan", action="store_true", help="Predict API calls, cache hits and runtime without calling any API")
+    ap.add_argument("--shard", help="Only build shard i/N (0-based) into its own directory; combine with flashcard_lingua.merge")
     args = ap.parse_args()
 
     cfg = load_config(Path("config.json"))
-
-    # Logging
-    log_level = getattr(logging, cfg.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
-    third_party_level = getattr(
-        logging, cfg.get("THIRD_PARTY_LOG_LEVEL", "WARNING").upper(), logging.WARNING
+    setup_logging(cfg)
+    shard = parse_shard(args.shard) if args.shard else None
+    if shard is not None:
+        cfg = shard_config(cfg, *shard)
+
+    if args.plan:
+        plan = plan_job(cfg, Path(args.input), usage_notes=args.usage_notes, max_concurrency=args.max_concurrency, shard=shard)
+        print(format_plan(plan))
+        return
+
+    stats = run_job(
+        cfg,
+        Path(args.input),
+        usage_notes=args.usage_notes,
+        max_concurrency=args.max_concurrency,
+        bulk=args.bulk,
+        bulk_oov=args.bulk_oov,
+        shard=shard,
     )
-    logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s: %(message)s")
-    logger.setLevel(log_level)
+    # An empty shard of a non-empty list is fine
+    if not stats["words"] and shard is None:
+        sys.exit(1)
 
-    for _name in ("httpx", "httpcore", "openai", "urllib3"):
-        _lg = logging.getLogger(_name)
-        _lg.setLevel(third_party_level)
-        _lg.propagate = False
 
-    usage_notes = args.usage_notes or cfg.get("USAGE_NOTES_DEF", "auto")
+class Job:
+    """
+    One deck's card machinery, set up by open_job(). cards() runs words through the stage
+    pipeline (the journal is not consulted), fill_new_words() fills the "New words" column
+    of [row, tokens] pairs, and close() prints the summary and writes the metrics.
+    run_job() opens one per run; the daemon keeps one open between requests.
+    """
+
+    def __init__(
+        self,
+        cfg: Dict,
+        usage_notes: Optional[str],
+        backend: Any,
+        backend_name: str,
+        limiters: RateLimiters,
+        latency_before: Dict[str, Tuple[int, float]],
+        metrics: Metrics,
+        metrics_json: Path,
+        metrics_prom: Optional[Path],
+        media_dir: Path,
+        manifest: MediaManifest,
+        cache: Optional[CacheStore],
+        journal: Optional[RunJournal],
+        oov_dict: OOVDictionary,
+        old_keys: Callable[[List[str]], Dict[str, List[str]]],
+        audio: AudioEngine,
+        example_rate: float,
+        hedger: Hedger,
+        pipeline: StagePipeline,
+        oov_stats: Dict[str, int],
+        fill_new_words: Callable[[List[List[Any]]], None],
+        show_new_on_back: bool,
+        oov_translate: bool,
+        source_lang: str,
+        target_lang: str,
+        oov_batch_size: int,
+    ):
+        self.cfg = cfg
+        self.usage_notes = usage_notes
+        self.backend = backend
+        self.backend_name = backend_name
+        self.limiters = limiters
+        self.latency_before = latency_before
+        self.metrics = metrics
+        self.metrics_json = metrics_json
+        self.metrics_prom = metrics_prom
+        self.media_dir = media_dir
+        self.manifest = manifest
+        self.cache = cache
+        self.journal = journal
+        self.oov_dict = oov_dict
+        self.old_keys = old_keys
+        self.audio = audio
+        self.example_rate = example_rate
+        self.hedger = hedger
+        self.pipeline = pipeline
+        self.oov_stats = oov_stats
+        self.fill_new_words = fill_new_words
+        self.show_new_on_back = show_new_on_back
+        self.oov_translate = oov_translate
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.oov_batch_size = oov_batch_size
+
+    def cards(self, words: Iterable[str]) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """(word key, row, OOV tokens) per word, in order; "New words" (row[5]) is left empty."""
+        return self.pipeline.run(words)
+
+    def close(self) -> None:
+        print(f"⏱️ Pipeline: {self.pipeline.format_stats()}")
+        self.audio.close()
+        if self.audio.converted or self.audio.failed:
+            print(f"🎚️ Audio tempo {self.example_rate}: {self.audio.converted} variants written, {self.audio.failed} failed")
+        self.manifest.save()
+        if self.oov_stats["tokens"]:
+            print(
+                f"🔤 OOV: {self.oov_stats['tokens']} new tokens translated in {self.oov_stats['calls']} call(s) → {self.oov_dict.path}"
+            )
+        print(f"🚦 Rate limits: {self.limiters.format_stats()}")
+        if hasattr(self.backend, "route_stats"):
+            print(f"🔀 Routing: {self.backend.format_stats() or 'no calls'}")
+        self.hedger.close()
+        if self.hedger.policies:
+            print(f"⏩ Hedging: {self.hedger.format_stats()}")
+        parse_stats = getattr(self.backend, "parse_stats", None)
+        if parse_stats is not None:
+            ps = parse_stats.snapshot()
+            if ps["repaired"] or ps["failed"] or ps["field_retries"]:
+                print(
+                    f"🧩 JSON: {ps['parsed']} parsed ({ps['repaired']} repaired locally), {ps['failed']} unusable, "
+                    f"{ps['field_retries']} targeted retries, {ps['wasted_tokens']} tokens wasted"
+                )
+        print(f"📁 Media: {self.media_dir} ({len(self.manifest.entries)} files in {self.manifest.path.name})")
+        if self.journal is not None:
+            print(f"💾 Journal: {self.journal.path} (cards={len(self.journal)})")
+
+        record_latency(self.cfg, self.latency_before, self.limiters.latency(), (self.audio.converted, self.audio.busy_s))
+        self.metrics.stop()
+        self.metrics.write(self.metrics_json, self.metrics_prom)
+        print(f"📊 Metrics: {self.metrics_json}" + (f", {self.metrics_prom}" if self.metrics_prom else ""))
+
+
+def open_job(
+    cfg: Dict,
+    vocab: Container[str],
+    shared: SharedResources,
+    usage_notes: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+) -> Job:
+    """
+    Set up backend, rate limiters, cache, journal, media, OOV dictionary, stage pipeline and
+    metrics for one deck. vocab holds the deck's words (lowercased): example tokens found
+    in it are not "New words".
+    """
+    usage_notes = usage_notes or cfg.get("USAGE_NOTES_DEF", "auto")
     max_retries = int(cfg.get("MAX_RETRIES", 6))
-    retry_deco = make_retry_decorator(max_retries)
+    metrics = Metrics()
 
-    # Backend
-    backend_name = cfg.get("BACKEND", "openai").lower()
-    if backend_name == "openai":
-        from .backends.openai_backend import OpenAIBackend as Backend
-    elif backend_name == "google":
-        from .backends.google_backend import GoogleBackend as Backend
-    else:
-        raise ValueError("BACKEND must be 'openai' or 'google'.")
+    def retry_deco_for(endpoint: str):
+        return make_retry_decorator(max_retries, on_retry=lambda _s: metrics.inc("api_retries_total", endpoint=endpoint))
 
-    backend = Backend(cfg)
-
-    # Input
-    words: List[str] = read_wordlist(Path(args.input))
-    if not words:
-        print("No words found in input.")
-        sys.exit(1)
+    # Backend (pooled clients are shared with other jobs on the same provider and credentials)
+    backend_name = cfg.get("BACKEND", "openai").lower()
+    backend = shared.backend(cfg, backend_name)
 
-    vocab = {w.strip().lower() for w in words}
-    extra_words_global = set()
+    # One adaptive limiter per endpoint, shared by every worker (and by jobs on the same model)
+    limiters = shared.limiters(cfg, backend)
+    backend.rate_hints = limiters.hints
+    latency_before = limiters.latency()
 
     # Output paths
     out_dir = Path(cfg.get("OUTPUT_DIR", "out"))
-    out_dir.mkdir(exist_ok=True)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Metrics: JSON + Prometheus textfile at the end of the run, and every METRICS_INTERVAL seconds if set
+    metrics_json = Path(cfg.get("METRICS_JSON", str(out_dir / "metrics.json")))
+    metrics_prom = cfg.get("METRICS_PROM", str(out_dir / "metrics.prom"))
+    metrics_prom = Path(metrics_prom) if metrics_prom else None
+    metrics.start(float(cfg.get("METRICS_INTERVAL", 0)), metrics_json, metrics_prom)
 
     media_dir = out_dir / cfg.get("OUTPUT_MEDIA_DIR", "media")
     media_dir.mkdir(parents=True, exist_ok=True)
-
-    out_tsv = out_dir / cfg.get("OUTPUT_TSV", "anki_notes.tsv")
-    extra_path = Path(cfg.get("EXTRA_WORDS_FILE", "out/extra_words.txt"))
-
+    # What is in media_dir (and how it was made) comes from the manifest, not from a stat() per file
+    manifest = shared.manifest(
+        Path(cfg.get("MEDIA_MANIFEST", str(out_dir / "media_manifest.json"))),
+        media_dir,
+        trust=bool(cfg.get("MEDIA_MANIFEST_TRUST", False)),
+    )
     # Cache & resume
     cache_enabled = bool(cfg.get("ENABLE_CACHE", True))
-    cache_dir = Path(cfg.get("CACHE_DIR", "cache"))
+    cache = shared.cache(cfg) if cache_enabled else None
     resume_enabled = bool(cfg.get("RESUME_ENABLED", True))
-    state_path = Path(cfg.get("STATE_FILE", "out/state.json"))
-    state: Dict[str, Any] = load_state(state_path) if resume_enabled else {}
-    processed = set(state.get("processed", [])) if state else set()
+    journal = None
+    if resume_enabled:
+        journal = shared.journal(Path(cfg.get("JOURNAL_FILE", str(out_dir / "journal.jsonl"))))
+        state_path = Path(cfg.get("STATE_FILE", "out/state.json"))
+        if not len(journal) and load_state(state_path).get("processed"):
+            # The old state file has keys but no rows; those words are rebuilt (from cache where possible)
+            print(f"ℹ️ {state_path} has no stored rows; rebuilding its words into {journal.path}")
 
     # Config labels
     audio_ext = cfg.get("AUDIO_EXT", "mp3")
@@ -162,11 +313,12 @@ def main():
     target_lang = cfg.get("TARGET_LANG", "Target")
     source_code = (cfg.get("SOURCE_LANG_CODE", "") or "")
     target_code = (cfg.get("TARGET_LANG_CODE", "") or "")
-    sleep_between = float(cfg.get("SLEEP_BETWEEN_CALLS", 0.03))
     add_example_audio = bool(cfg.get("ADD_EXAMPLE_AUDIO", True))
     show_new_on_back = bool(cfg.get("SHOW_NEW_WORDS_ON_BACK", True))
     oov_translate = bool(cfg.get("OOV_TRANSLATE", True))
     regenerate_audio = bool(cfg.get("REGENERATE_AUDIO_ALWAYS", False))
+    max_concurrency = max(1, int(max_concurrency or cfg.get("MAX_CONCURRENCY", 1)))
+    media_locks = KeyedLocks()
 
     # Example audio speed
     example_rate = float(cfg.get("EXAMPLE_AUDIO_RATE", 1.0))
@@ -175,198 +327,532 @@ def main():
 
     print(f"Backend: {backend_name} | Source: {source_lang} → Target: {target_lang}")
 
+    oov_batch_size = max(1, int(cfg.get("OOV_BATCH_SIZE", 100)))
+    oov_dict = shared.oov_dict(oov_dict_path(cfg))
+    # Read-only cache packs (CACHE_PACKS) also supply OOV translations and audio
+    packs = cache.packs if cache is not None else ()
+    for pack in packs:
+        oov_dict.seed(pack.oov(lang_pair(cfg)))
+
+    def from_pack(name: str) -> bool:
+        return any(pack.restore_media(name, manifest) for pack in packs)
+
     # Optional TTS override
     tts_override = (cfg.get("OVERRIDE_TTS_BACKEND", "openai") or "openai").lower()
     google_tts_client = None
     if tts_override in ("auto", "google"):
         if tts_override == "google" or (tts_override == "auto" and source_code.lower() == "id"):
             try:
-                from .backends.google_backend import GoogleBackend as GTT
-
-                google_tts_client = GTT(cfg)
+                google_tts_client = shared.backend(cfg, "google")
+                google_tts_client.rate_hints = limiters.hints
             except Exception as e:
                 print("[WARNING] Google TTS init failed, falling back to OpenAI:", e)
                 google_tts_client = None
 
-    @retry_deco
+    # Optional hedging of slow calls (HEDGE per endpoint); attempts run on the hedger's own pool
+    hedger = Hedger(cfg, workers=2 * max_concurrency + 2, metrics=metrics)
+
+    def api_call(endpoint: str, fn, *args, out_path: Optional[Path] = None, **kwargs) -> Any:
+        """
+        One API call through the rate limiters, hedged if HEDGE has a policy for the endpoint.
+        fn(*args, out_path) writes a file: hedged attempts each write to their own temp
+        file and the winner is renamed to out_path.
+        """
+        hedged = hedger.enabled(endpoint)
+
+        def attempt(i: int) -> Any:
+            if out_path is None:
+                return limiters.attempt(endpoint, fn, *args, **kwargs)
+            target = out_path.with_name(f".{out_path.name}.{i}.part") if hedged else out_path
+            limiters.attempt(endpoint, fn, *args, target, **kwargs)
+            return target
+
+        def hedged_attempt(i: int) -> Any:
+            # Runs on a hedger thread on behalf of the caller's budget slot
+            with limiters.held():
+                return attempt(i)
+
+        def discard(result: Any) -> None:
+            if out_path is not None:
+                result.unlink(missing_ok=True)
+
+        t0 = time.perf_counter()
+        try:
+            with limiters.slot():
+                out = hedger.call(endpoint, hedged_attempt, discard) if hedged else attempt(0)
+            if hedged and out_path is not None:
+                out.replace(out_path)
+        except Exception:
+            metrics.inc("api_calls_total", endpoint=endpoint, outcome="error")
+            raise
+        finally:
+            metrics.observe("api_call_seconds", time.perf_counter() - t0, endpoint=endpoint)
+        metrics.inc("api_calls_total", endpoint=endpoint, outcome="ok")
+        return out
+
+    @retry_deco_for("text")
     def safe_generate(word: str) -> Dict[str, Any]:
         try:
-            return backend.generate_card(word, usage_notes)
+            return api_call("text", backend.generate_card, word, usage_notes)
         except Exception as e:
             if is_retryable_exception(e):
-                raise RetryableError(str(e))
+                raise RetryableError(str(e)) from e
             raise
 
-    @retry_deco
+    @retry_deco_for("text")
+    def _generate_batch(batch: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            return api_call("text", backend.generate_cards, batch, usage_notes, fallback=safe_generate)
+        except Exception as e:
+            if is_retryable_exception(e):
+                raise RetryableError(str(e)) from e
+            raise
+
+    def safe_generate_batch(batch: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            return _generate_batch(batch)
+        except Exception as e:
+            logger.warning(f"Batch generation failed for {len(batch)} words, falling back to single requests: {e}")
+            return {w: safe_generate(w) for w in batch}
+
+    @retry_deco_for("tts")
     def safe_tts(text: str, out_path: Path) -> None:
         try:
-            backend.tts_word(text, out_path)
+            api_call("tts", backend.tts_word, text, out_path=out_path)
         except Exception as e:
             if is_retryable_exception(e):
-                raise RetryableError(str(e))
+                raise RetryableError(str(e)) from e
             raise
 
-    @retry_deco
+    @retry_deco_for("translate")
     def safe_translate_oov(tokens: List[str]) -> Dict[str, str]:
         try:
-            return backend.translate_oov_list(tokens, source_lang, target_lang, source_code, target_code)
+            return api_call(
+                "translate", backend.translate_oov_list, tokens, source_lang, target_lang, source_code, target_code
+            )
         except Exception as e:
             if is_retryable_exception(e):
-                raise RetryableError(str(e))
+                raise RetryableError(str(e)) from e
             raise
 
-    rows = []
+    def backend_voice(b, text: str = "") -> str:
+        if hasattr(b, "voice_for"):
+            return b.voice_for(text)
+        if hasattr(b, "tts_voice"):
+            return f"google:{b.tts_voice}"
+        return f"openai:{getattr(b, 'tts_model', '')}:{getattr(b, 'voice', '')}"
+
+    def tts_with_fallback(text: str, out_path: Path, what: str) -> bool:
+        voice = ""
+        try:
+            if google_tts_client is not None:
+                api_call("tts", google_tts_client.tts_word, text, out_path=out_path)
+                voice = backend_voice(google_tts_client)
+            else:
+                safe_tts(text, out_path)
+                voice = backend_voice(backend, text)
+        except Exception as e:
+            print(f"[TTS error] {what}: {e}")
+            if google_tts_client is not None:
+                try:
+                    safe_tts(text, out_path)
+                    voice = backend_voice(backend, text)
+                except Exception as e2:
+                    print(f"[TTS error] (OpenAI fallback) {what}: {e2}")
+        if not voice:
+            return False
+        manifest.record(out_path.name, text=text, voice=voice, tempo=1.0)
+        metrics.inc("bytes_written_total", manifest.get(out_path.name)["size"], kind="audio")
+        return True
+
+    stage_workers = cfg.get("STAGE_WORKERS", {}) or {}
 
-    for w in tqdm(words):
-        lw = w.strip().lower()
-        if resume_enabled and lw in processed:
-            continue
+    # Cards cached under the unversioned key of earlier releases, or by the router's backends,
+    # are still found (and re-keyed)
+    legacy_keys = bool(cfg.get("CACHE_LEGACY_KEYS", True))
 
-        # 1) Generate card data
+    def old_keys(words: List[str]) -> Dict[str, List[str]]:
+        return {
+            make_cache_key(w, cfg, usage_notes, backend_name): cache_aliases(w, cfg, usage_notes, backend_name, legacy_keys)
+            for w in words
+        }
+
+    # Stage 1: card text (cache or LLM)
+    def stage_text(w: str) -> Dict[str, Any]:
         data = None
         cache_key = make_cache_key(w, cfg, usage_notes, backend_name)
 
-        if cache_enabled:
-            cached = cache_read(cache_dir, cache_key)
+        if cache is not None:
+            cached = cache.lookup([cache_key], old_keys([w])).get(cache_key)
             if cached and all(k in cached for k in ("translation", "example_src", "example_tgt", "note")):
                 data = cached
+        metrics.inc("cache_lookups_total", result="miss" if data is None else "hit")
 
         if data is None:
-            data = safe_generate(w)
-            if cache_enabled:
-                cache_write(cache_dir, cache_key, data)
-
-        # 2) Word audio: hash-based filename
+            with metrics.timer("stage_seconds", stage="generate"):
+                data = safe_generate(w)
+            if cache is not None:
+                cache.put(cache_key, data)
+
+        return {"word": w, "lw": w.strip().lower(), "data": data}
+
+    # Stage 1 (batched): look up the whole batch in the cache, send only the misses in one request
+    def stage_text_batch(batch: List[str]) -> List[Dict[str, Any]]:
+        keys = {w: make_cache_key(w, cfg, usage_notes, backend_name) for w in batch}
+        cached = cache.lookup(keys.values(), old_keys(batch)) if cache is not None else {}
+
+        found: Dict[str, Dict[str, Any]] = {}
+        misses: List[str] = []
+        for w, k in keys.items():
+            data = cached.get(k)
+            if data and all(f in data for f in ("translation", "example_src", "example_tgt", "note")):
+                found[w] = data
+            else:
+                misses.append(w)
+
+        metrics.inc("cache_lookups_total", len(found), result="hit")
+        metrics.inc("cache_lookups_total", len(misses), result="miss")
+        if misses:
+            with metrics.timer("stage_seconds", stage="generate"):
+                generated = safe_generate_batch(misses) if len(misses) > 1 else {misses[0]: safe_generate(misses[0])}
+            found.update((w, generated[w]) for w in misses)
+            if cache is not None:
+                cache.put_many((keys[w], generated[w]) for w in misses)
+
+        return [{"word": w, "lw": w.strip().lower(), "data": found[w]} for w in batch]
+
+    # Stage 2: word + example audio (hash-based filenames)
+    def stage_tts(card: Dict[str, Any]) -> Dict[str, Any]:
+        w = card["word"]
         word_audio_name = word_audio_filename(w, source_lang, audio_ext)
         word_audio_path = media_dir / word_audio_name
 
-        if regenerate_audio or not word_audio_path.exists():
-            try:
-                if google_tts_client is not None:
-                    google_tts_client.tts_word(w, word_audio_path)
-                else:
-                    safe_tts(w, word_audio_path)
-            except Exception as e:
-                print(f"[TTS error] word '{w}': {e}")
-                if google_tts_client is not None:
-                    try:
-                        safe_tts(w, word_audio_path)
-                    except Exception as e2:
-                        print(f"[TTS error] (OpenAI fallback) word '{w}': {e2}")
-                        word_audio_name = ""
-
-        # 3) Example audio: hash-based filename on sentence content
-        example_src = data["example_src"]
-        example_src_with_audio = example_src
-
+        with media_locks.hold(word_audio_name):
+            if not regenerate_audio and not manifest.has(word_audio_name) and from_pack(word_audio_name):
+                metrics.inc("media_lookups_total", kind="word", result="pack")
+            elif regenerate_audio or not manifest.has(word_audio_name):
+                metrics.inc("media_lookups_total", kind="word", result="miss")
+                with metrics.timer("stage_seconds", stage="tts_word"):
+                    ok = tts_with_fallback(w, word_audio_path, f"word '{w}'")
+                if not ok and google_tts_client is not None:
+                    word_audio_name = ""
+            else:
+                metrics.inc("media_lookups_total", kind="word", result="hit")
+        card["word_audio_name"] = word_audio_name
+
+        example_src = card["data"]["example_src"]
+        card["ex_audio_name"] = ""
         if add_example_audio and example_src.strip():
             ex_audio_name = example_audio_filename(example_src, source_lang, audio_ext)
             ex_audio_path = media_dir / ex_audio_name
 
-            need_synthesize = regenerate_audio or not ex_audio_path.exists()
+            with media_locks.hold(ex_audio_name):
+                if not regenerate_audio and not manifest.has(ex_audio_name) and from_pack(ex_audio_name):
+                    metrics.inc("media_lookups_total", kind="example", result="pack")
+                elif regenerate_audio or not manifest.has(ex_audio_name):
+                    metrics.inc("media_lookups_total", kind="example", result="miss")
+                    with metrics.timer("stage_seconds", stage="tts_example"):
+                        tts_with_fallback(example_src, ex_audio_path, f"example '{w}'")
+                else:
+                    metrics.inc("media_lookups_total", kind="example", result="hit")
+            card["ex_audio_name"] = ex_audio_name
+        return card
+
+    # Stage 3: example audio speed (ffmpeg, CPU-bound), written to separate tempo variants
+    audio_workers = stage_workers.get("audio", min(max_concurrency, os.cpu_count() or 1))
+    audio = AudioEngine(
+        media_dir,
+        manifest,
+        workers=int(cfg.get("AUDIO_WORKERS", audio_workers)),
+        batch_files=int(cfg.get("AUDIO_BATCH_FILES", 8)),
+        metrics=metrics,
+    )
+
+    def stage_audio(cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if abs(example_rate - 1.0) > 1e-6:
+            variants = audio.tempo_many((c["ex_audio_name"] for c in cards), example_rate)
+            for c in cards:
+                c["ex_audio_name"] = variants.get(c["ex_audio_name"], c["ex_audio_name"])
+        return cards
 
-            if need_synthesize:
-                try:
-                    if google_tts_client is not None:
-                        google_tts_client.tts_word(example_src, ex_audio_path)
-                    else:
-                        safe_tts(example_src, ex_audio_path)
-                except Exception as e:
-                    print(f"[TTS error] example '{w}': {e}")
-                    if google_tts_client is not None:
-                        try:
-                            safe_tts(example_src, ex_audio_path)
-                        except Exception as e2:
-                            print(f"[TTS error] (OpenAI fallback) example '{w}': {e2}")
-
-            # Apply example audio speed in-place
-            if ex_audio_path.exists() and abs(example_rate - 1.0) > 1e-6:
-                tmp_path = ex_audio_path.with_suffix(f".rate_tmp.{ex_audio_path.suffix[1:]}")
+    # Stage 4: OOV tokens and the final row ("New words" is filled in after the run)
+    def stage_oov(card: Dict[str, Any]):
+        w, lw, data = card["word"], card["lw"], card["data"]
+
+        oov_local = oov_tokens(data["example_src"], lw, vocab)
+
+        word_audio_name = card["word_audio_name"]
+        front = f"{w}<br>[sound:{word_audio_name}]" if manifest.has(word_audio_name) else w
+
+        example_src = data["example_src"]
+        example_src_with_audio = example_src
+        ex_audio_name = card["ex_audio_name"]
+        if manifest.has(ex_audio_name):
+            example_src_with_audio = f"{example_src}<br>[sound:{ex_audio_name}]"
+
+        row = [
+            front,
+            data["translation"],
+            example_src_with_audio,
+            data["example_tgt"],
+            data.get("note", ""),
+            "",
+        ]
+
+        return lw, row, oov_local
+
+    batch_size = max(1, int(cfg.get("GENERATE_BATCH_SIZE", 1)))
+    pipeline = StagePipeline(
+        [
+            Stage(
+                "text",
+                stage_text_batch if batch_size > 1 else stage_text,
+                stage_workers.get("text", max_concurrency),
+                batch_size=batch_size,
+            ),
+            Stage("tts", stage_tts, stage_workers.get("tts", max_concurrency)),
+            Stage("audio", stage_audio, audio_workers, batch_size=int(cfg.get("AUDIO_BATCH_FILES", 8))),
+            Stage("oov", stage_oov, stage_workers.get("oov", max_concurrency)),
+        ],
+        queue_size=int(cfg.get("STAGE_QUEUE_SIZE", 0)),
+        inline=max_concurrency <= 1 and not stage_workers,
+        stats_interval=float(cfg.get("STAGE_STATS_INTERVAL", 0)),
+    )
+
+    def collect(m: Metrics) -> None:
+        for st in pipeline.stats():
+            m.set("pipeline_stage_utilization", st["utilization"], stage=st["stage"])
+            m.set("pipeline_stage_queued", st["queued"], stage=st["stage"])
+            m.set("pipeline_stage_errors", st["errors"], stage=st["stage"])
+        for st in (lim.stats() for lim in limiters.limiters.values()):
+            m.set("rate_limit_rps", st["rate"], endpoint=st["endpoint"])
+            m.set("rate_limit_throttles", st["throttles"], endpoint=st["endpoint"])
+        for name, kinds in (("cache", [{}]), ("media", [{"kind": "word"}, {"kind": "example"}])):
+            for lb in kinds:
+                hits = m.counter(f"{name}_lookups_total", result="hit", **lb)
+                hits += m.counter(f"{name}_lookups_total", result="pack", **lb)
+                total = hits + m.counter(f"{name}_lookups_total", result="miss", **lb)
+                if total:
+                    m.set(f"{name}_hit_ratio", round(hits / total, 4), **lb)
+        for st in hedger.stats():
+            if st["delay_ms"] is not None:
+                m.set("hedge_delay_seconds", st["delay_ms"] / 1000.0, endpoint=st["endpoint"])
+        # Router: breaker state (0 closed, 1 half open, 2 open), latency and error rate per backend and endpoint
+        if hasattr(backend, "route_stats"):
+            for st in backend.route_stats():
+                lb = {"backend": st["backend"], "endpoint": st["endpoint"]}
+                m.set("router_state", st["state_code"], **lb)
+                m.set("router_calls", st["calls"], **lb)
+                m.set("router_error_rate", st["error_rate"], **lb)
+                if st["latency_s"] is not None:
+                    m.set("router_latency_seconds", st["latency_s"], **lb)
+        # Response parsing: repaired locally, unusable, targeted retries, tokens of unusable responses
+        parse_stats = getattr(backend, "parse_stats", None)
+        if parse_stats is not None:
+            for k, v in parse_stats.snapshot().items():
+                m.set(f"llm_{k}", v)
+
+    metrics.add_collector(collect)
+    if not pipeline.inline:
+        print("Stages: " + ", ".join(f"{s.name}×{s.workers}" for s in pipeline.stages))
+    # New words: translate only tokens the shared dictionary does not know yet, in large batches
+    oov_stats = {"tokens": 0, "calls": 0}
+
+    def fill_new_words(chunk: List[List[Any]]) -> None:
+        if oov_translate:
+            unknown = oov_dict.missing(t for _, toks in chunk for t in toks)
+            for i in range(0, len(unknown), oov_batch_size):
+                part = unknown[i:i + oov_batch_size]
                 try:
-                    adjust_audio_rate(ex_audio_path, tmp_path, example_rate)
-                    ex_audio_path.unlink(missing_ok=True)
-                    tmp_path.rename(ex_audio_path)
+                    with metrics.timer("stage_seconds", stage="oov"):
+                        oov_dict.update(safe_translate_oov(part))
+                    oov_stats["calls"] += 1
                 except Exception as e:
-                    print(f"[Audio rate error] example '{w}': {e}")
+                    logger.warning(f"OOV translation skipped for {len(part)} words: {e}")
+            if unknown:
+                oov_stats["tokens"] += len(unknown)
+                oov_dict.save()
+        for row, toks in chunk:
+            row[5] = format_new_words(toks, oov_dict if oov_translate else None)
+    return Job(
+        cfg=cfg,
+        usage_notes=usage_notes,
+        backend=backend,
+        backend_name=backend_name,
+        limiters=limiters,
+        latency_before=latency_before,
+        metrics=metrics,
+        metrics_json=metrics_json,
+        metrics_prom=metrics_prom,
+        media_dir=media_dir,
+        manifest=manifest,
+        cache=cache,
+        journal=journal,
+        oov_dict=oov_dict,
+        old_keys=old_keys,
+        audio=audio,
+        example_rate=example_rate,
+        hedger=hedger,
+        pipeline=pipeline,
+        oov_stats=oov_stats,
+        fill_new_words=fill_new_words,
+        show_new_on_back=show_new_on_back,
+        oov_translate=oov_translate,
+        source_lang=source_lang,
+        target_lang=target_lang,
+        oov_batch_size=oov_batch_size,
+    )
+
+
+def run_job(
+    cfg: Dict,
+    input_path: Path,
+    usage_notes: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+    bulk: bool = False,
+    bulk_oov: bool = False,
+    shared: Optional[SharedResources] = None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Any]:
+    """
+    Build one deck; returns a summary (words, rows, generated, elapsed_s, rows_per_s, stages).
+
+    With shard=(i, N) only the words that shard_of() puts in shard i are generated (cfg
+    should come from shard_config()); the whole list still serves as the OOV vocabulary.
+    """
+    t_start = time.perf_counter()
+    own_shared = shared is None
+    if shared is None:
+        shared = SharedResources()
+
+    out_dir = Path(cfg.get("OUTPUT_DIR", "out"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Input: streamed into an on-disk index that doubles as the vocabulary for OOV filtering
+    csv_columns = cfg.get("CSV_COLUMNS") or None
+    word_index = WordIndex(Path(cfg.get("WORD_INDEX_FILE", str(out_dir / "words.sqlite"))))
+    n_input, n_unique = word_index.build(iter_wordlist(input_path, csv_columns))
 
-            if ex_audio_path.exists():
-                example_src_with_audio = f"{example_src}<br>[sound:{ex_audio_name}]"
+    def in_shard(w: str) -> bool:
+        return shard is None or shard_of(w, shard[1]) == shard[0]
 
-        # 4) OOV tokens
-        oov_local = []
-        for tok in tokenize_words(data["example_src"]):
-            if len(tok) < 2:
+    def my_words():
+        """Unique input words in input order (only this shard's, when sharded)."""
+        words = word_index.iter_words()
+        return words if shard is None else (w for w in words if in_shard(w))
+
+    if shard is not None:
+        n_unique = sum(1 for _ in my_words())
+        print(f"Shard {shard[0]}/{shard[1]}: {n_unique} of {len(word_index)} words")
+    if not n_input:
+        print("No words found in input.")
+        word_index.close()
+        return {"words": 0, "rows": 0, "generated": 0, "elapsed_s": 0.0, "rows_per_s": 0.0}
+
+    extra_words_global = set()
+    out_tsv = out_dir / cfg.get("OUTPUT_TSV", "anki_notes.tsv")
+    extra_path = Path(cfg.get("EXTRA_WORDS_FILE", "out/extra_words.txt"))
+
+    job = open_job(cfg, word_index, shared, usage_notes=usage_notes, max_concurrency=max_concurrency)
+    journal = job.journal
+
+    def todo_words():
+        if journal is None:
+            # Without resume every input line becomes a row, duplicates included
+            return (w for w in iter_wordlist(input_path, csv_columns) if in_shard(w))
+        # One card per word; words already in the journal are replayed instead of regenerated
+        return (w for w in my_words() if w.strip().lower() not in journal)
+
+    if journal is not None:
+        n_rows = n_unique
+        n_done = sum(1 for w in my_words() if w.strip().lower() in journal)
+        if n_done:
+            print(f"Resume: {n_done} cards from {journal.path}, {n_rows - n_done} to generate")
+    else:
+        n_rows = n_input
+
+    # Offline bulk mode: fill the cache through the Batch API, then build the deck from it below
+    if bulk:
+        if job.backend_name != "openai":
+            raise ValueError("--bulk requires BACKEND 'openai'.")
+        if job.cache is None:
+            raise ValueError("--bulk requires ENABLE_CACHE.")
+        bulk = BulkRunner(cfg, job.backend, Path(cfg.get("BULK_DIR", str(out_dir / "bulk"))))
+        key_fn = lambda w: make_cache_key(w, cfg, job.usage_notes, job.backend_name)  # noqa: E731
+        bulk.run_cards(todo_words(), job.usage_notes, job.cache, key_fn, job.old_keys)
+        if bulk_oov and job.show_new_on_back and job.oov_translate:
+            bulk.run_oov(
+                my_words(), job.cache, key_fn, word_index, job.oov_dict,
+                job.source_lang, job.target_lang, job.oov_batch_size, job.old_keys,
+            )
+
+    produced_count = {"n": 0}
+
+    def ordered_rows():
+        """(row, oov tokens) for every card in input order, replayed from the journal or fresh from the pipeline."""
+        produced = job.cards(todo_words())
+        if journal is None:
+            for _lw, row, oov_local in produced:
+                produced_count["n"] += 1
+                yield row, oov_local
+            return
+        for w in my_words():
+            key = w.strip().lower()
+            rec = journal.get(key)
+            if rec is not None:
+                yield list(rec["row"]), rec.get("oov", [])
                 continue
-            if tok != lw and tok not in vocab:
-                oov_local.append(tok)
-                extra_words_global.add(tok)
-
-        # 5) New words field
-        new_words_field = ""
-        if show_new_on_back and oov_local:
-            mapping: Dict[str, str] = {}
-            if oov_translate:
-                try:
-                    mapping = safe_translate_oov(oov_local)
-                except Exception as e:
-                    logger.warning(f"OOV translation skipped: {e}")
-                    mapping = {}
-
-            lines, done = [], set()
-            for t in oov_local:
-                if t in done:
-                    continue
-                done.add(t)
-                tr = mapping.get(t, "")
-                lines.append(f"{t} = {tr}" if tr else t)
-
-            new_words_field = "\n".join(lines)
-
-        # 6) Build row
-        front = f"{w}<br>[sound:{word_audio_name}]" if (media_dir / word_audio_name).exists() else w
-
-        rows.append(
-            [
-                front,
-                data["translation"],
-                example_src_with_audio,
-                data["example_tgt"],
-                data.get("note", ""),
-                new_words_field,
-            ]
-        )
-
-        # 7) Update resume state
-        if resume_enabled:
-            processed.add(lw)
-            save_state(state_path, {"processed": sorted(list(processed))})
-
-        time.sleep(sleep_between)
-
-    # 8) Write TSV
+            lw, row, oov_local = next(produced)
+            produced_count["n"] += 1
+            journal.append(lw, row, oov_local)
+            yield row, oov_local
+
+    # Write TSV: rows are flushed in chunks as they complete, so a crash keeps what was done
+    tsv_flush_rows = max(1, int(cfg.get("TSV_FLUSH_ROWS", 500)))
+    rows_written = 0
     with out_tsv.open("w", newline="", encoding="utf-8") as f:
         wri = csv.writer(f, delimiter="\t")
-        wri.writerow(
-            [
-                "Front",
-                "Back",
-                "Example Source",
-                "Example Target",
-                "Note",
-                "New Words",
-            ]
-        )
-        wri.writerows(rows)
+        wri.writerow(TSV_HEADER)
+        chunk: List[List[Any]] = []
+
+        def flush() -> None:
+            if job.show_new_on_back:
+                job.fill_new_words(chunk)
+            wri.writerows(row for row, _ in chunk)
+            f.flush()
+
+        from tqdm import tqdm
+
+        for row, toks in tqdm(ordered_rows(), total=n_rows):
+            extra_words_global.update(toks)
+            chunk.append([row, toks])
+            if len(chunk) >= tsv_flush_rows:
+                flush()
+                rows_written += len(chunk)
+                chunk = []
+        if chunk:
+            flush()
+            rows_written += len(chunk)
+        job.metrics.inc("bytes_written_total", f.tell(), kind="tsv")
+
+    if journal is not None:
+        journal.close()
+    word_index.close()
 
     print("✅ TSV ready:", out_tsv)
 
-    # 9) Build APKG
+    # Build APKG (rows streamed back from the TSV)
     if cfg.get("CREATE_APKG", True):
-        print(f"Rows count: {len(rows)}")
-        apkg = build_apkg(cfg, rows, media_dir)
-        print("📦 APKG created:", apkg)
+        print(f"Rows count: {rows_written}")
+        from .packaging import build_apkgs
+
+        with job.metrics.timer("stage_seconds", stage="packaging"):
+            apkgs = build_apkgs(cfg, read_tsv_rows(out_tsv), job.media_dir, manifest=job.manifest)
+        for apkg in apkgs:
+            job.metrics.set("output_bytes", apkg.stat().st_size, kind="apkg", file=apkg.name)
+            print("📦 APKG created:", apkg)
 
-    # 10) Extra words file
+    # Extra words file
     if extra_words_global:
         extra_path.parent.mkdir(parents=True, exist_ok=True)
         extra_path.write_text("\n".join(sorted(extra_words_global)) + "\n", encoding="utf-8")
@@ -374,9 +860,18 @@ def main():
     else:
         print("📝 No extra words found.")
 
-    print(f"📁 Media: {media_dir}")
-    if resume_enabled:
-        print(f"💾 State: {state_path} (processed={len(processed)})")
+    job.close()
+    if own_shared:
+        shared.close()
+    elapsed = time.perf_counter() - t_start
+    return {
+        "words": n_unique,
+        "rows": rows_written,
+        "generated": produced_count["n"],
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(rows_written / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": job.pipeline.stats(),
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+# src/shard.py
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, Tuple
+
+from .config_loader import _PATH_KEYS
+
+_SHARD_RE = re.compile(r"^(\d+)/(\d+)$")
+_SHARD_DIR_RE = re.compile(r"^(\d+)-of-(\d+)$")
+
+
+def shard_of(word: str, count: int) -> int:
+    """Stable shard of a word: a hash of its normalized form, the same on every machine and rerun."""
+    key = word.strip().lower().encode("utf-8")
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % count
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' (0-based index) -> (i, N)."""
+    m = _SHARD_RE.match((spec or "").strip())
+    if not m:
+        raise ValueError(f"Ongeldige shard '{spec}': verwacht i/N, bijv. 0/4")
+    index, count = int(m.group(1)), int(m.group(2))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Ongeldige shard '{spec}': index moet tussen 0 en {count - 1} liggen")
+    return index, count
+
+
+def shards_root(cfg: Dict) -> Path:
+    return Path(cfg.get("SHARD_DIR", str(Path(cfg.get("OUTPUT_DIR", "out")) / "shards")))
+
+
+def shard_dir(cfg: Dict, index: int, count: int) -> Path:
+    return shards_root(cfg) / f"{index}-of-{count}"
+
+
+def find_shards(cfg: Dict) -> Dict[int, Tuple[int, Path]]:
+    """Shard directories on disk: index -> (shard count, path)."""
+    root = shards_root(cfg)
+    found: Dict[int, Tuple[int, Path]] = {}
+    if root.is_dir():
+        for p in sorted(root.iterdir()):
+            m = _SHARD_DIR_RE.match(p.name)
+            if m and p.is_dir():
+                found.setdefault(int(m.group(1)), (int(m.group(2)), p))
+    return found
+
+
+def shard_config(cfg: Dict, index: int, count: int) -> Dict:
+    """
+    Config for one shard: output, cache, media and journal all live under the shard's own
+    directory (SHARD_DIR/<i>-of-<N>, default OUTPUT_DIR/shards). The journal is always on,
+    since merge reads the rows from it, and no APKG is built per shard.
+    """
+    base = shard_dir(cfg, index, count)
+    out = {k: v for k, v in cfg.items() if k not in _PATH_KEYS or k == "GOOGLE_APPLICATION_CREDENTIALS"}
+    for k in ("METRICS_JSON", "METRICS_PROM", "LATENCY_HISTORY_FILE"):
+        out.pop(k, None)
+    out.update(
+        {
+            "OUTPUT_DIR": str(base),
+            "CACHE_DIR": str(base / "cache"),
+            "EXTRA_WORDS_FILE": str(base / "extra_words.txt"),
+            "STATE_FILE": str(base / "state.json"),
+            "RESUME_ENABLED": True,
+            "CREATE_APKG": False,
+        }
+    )
+    return out
@@ -0,0 +1,71 @@
+# src/word_index.py
+import sqlite3
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+
+class WordIndex:
+    """
+    The input word list as a single-file SQLite table, so neither the list nor the
+    vocabulary set has to live in RAM.
+
+    build() streams words in and keeps the first occurrence of every key (lowercased
+    word) in input order; iter_words() streams them back out. `token in index` is the
+    vocabulary lookup used for OOV filtering. The file is rebuilt on every run.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def build(self, words: Iterable[str], chunk: int = 1000) -> Tuple[int, int]:
+        """Load the word stream; returns (words read, unique words)."""
+        self.close()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            Path(str(self.db_path) + suffix).unlink(missing_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE words (key TEXT PRIMARY KEY, word TEXT NOT NULL)")
+        total = 0
+        it = iter(words)
+        while True:
+            batch = list(islice(it, chunk))
+            if not batch:
+                break
+            total += len(batch)
+            conn.executemany("INSERT OR IGNORE INTO words (key, word) VALUES (?, ?)", ((w.strip().lower(), w) for w in batch))
+        conn.commit()
+        return total, len(self)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        return self._conn
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM words WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM words").fetchone()[0]
+
+    def iter_words(self) -> Iterator[str]:
+        """Unique words in input order; own connection, so several iterations can run side by side."""
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        try:
+            for (w,) in conn.execute("SELECT word FROM words ORDER BY rowid"):
+                yield w
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
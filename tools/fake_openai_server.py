@@ -0,0 +1,194 @@
+# tools/fake_openai_server.py
+"""
+Local stand-in for the parts of the OpenAI API that flashcard_lingua uses:
+chat completions, audio/speech, files and batches. Responses are canned but
+well-formed, so bulk mode and the live pipeline can be exercised without a key.
+
+    python tools/fake_openai_server.py --port 8787 --batch-delay 2
+    # config.json: "OPENAI_BASE_URL": "http://127.0.0.1:8787/v1", "OPENAI_API_KEY": "test"
+
+--fail-rate makes that share of batch requests come back malformed, to exercise
+the live fallback.
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ids = itertools.count(1)
+_lock = threading.Lock()
+FILES = {}
+BATCHES = {}
+OPTS = {"batch_delay": 1.0, "fail_rate": 0.0}
+
+
+def _card(word: str) -> dict:
+    return {
+        "translation": f"<{word}>",
+        "example_src": f"Saya suka {word} setiap hari.",
+        "example_tgt": f"Ik hou elke dag van {word}.",
+        "note": "",
+    }
+
+
+def fake_content(messages) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    if "Woorden: " in prompt:
+        words = [w.strip() for w in prompt.split("Woorden: ", 1)[1].split(",") if w.strip()]
+        return json.dumps({w: f"~{w}" for w in words}, ensure_ascii=False)
+    if "Doelwoorden" in prompt:
+        block = prompt.split("):\n", 1)[1].split("\n\n", 1)[0]
+        words = [json.loads(ln) for ln in block.splitlines() if ln.strip()]
+        return json.dumps({w: _card(w) for w in words}, ensure_ascii=False)
+    m = re.search(r'Doelwoord: "(.*)"', prompt)
+    return json.dumps(_card(m.group(1) if m else "?"), ensure_ascii=False)
+
+
+def completion(body: dict) -> dict:
+    return {
+        "id": f"chatcmpl-{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": fake_content(body.get("messages", []))},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+
+def _file_obj(fid: str) -> dict:
+    f = FILES[fid]
+    return {
+        "id": fid, "object": "file", "bytes": len(f["data"]), "created_at": f["created_at"],
+        "filename": f["filename"], "purpose": f["purpose"], "status": "processed",
+    }
+
+
+def _add_file(data: bytes, filename: str, purpose: str) -> str:
+    fid = f"file-{next(_ids)}"
+    FILES[fid] = {"data": data, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+    return fid
+
+
+def _run_batch(bid: str) -> None:
+    time.sleep(OPTS["batch_delay"])
+    b = BATCHES[bid]
+    lines = FILES[b["input_file_id"]]["data"].decode("utf-8").splitlines()
+    out = []
+    for ln in lines:
+        if not ln.strip():
+            continue
+        req = json.loads(ln)
+        body = completion(req["body"])
+        if random.random() < OPTS["fail_rate"]:
+            body["choices"][0]["message"]["content"] = "sorry, no JSON today"
+        out.append({"id": f"req-{next(_ids)}", "custom_id": req["custom_id"],
+                    "response": {"status_code": 200, "request_id": "fake", "body": body}, "error": None})
+    with _lock:
+        b["output_file_id"] = _add_file(
+            "".join(json.dumps(o) + "\n" for o in out).encode("utf-8"), f"{bid}_output.jsonl", "batch_output"
+        )
+        b["request_counts"] = {"total": len(out), "completed": len(out), "failed": 0}
+        b["status"] = "completed"
+        b["completed_at"] = int(time.time())
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status: int, payload, ctype: str = "application/json") -> None:
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("x-ratelimit-limit-requests", "6000")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        raw = self._body()
+        if self.path.endswith("/chat/completions"):
+            return self._send(200, completion(json.loads(raw)))
+        if self.path.endswith("/audio/speech"):
+            text = json.loads(raw).get("input", "")
+            return self._send(200, b"ID3" + text.encode("utf-8"), "audio/mpeg")
+        if self.path.endswith("/files"):
+            msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + raw
+            )
+            data, filename, purpose = b"", "upload.jsonl", "batch"
+            for part in msg.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if name == "file":
+                    data = part.get_payload(decode=True)
+                    filename = part.get_filename() or filename
+                elif name == "purpose":
+                    purpose = part.get_content().strip()
+            with _lock:
+                fid = _add_file(data, filename, purpose)
+                return self._send(200, _file_obj(fid))
+        if self.path.endswith("/batches"):
+            req = json.loads(raw)
+            bid = f"batch_{next(_ids)}"
+            with _lock:
+                BATCHES[bid] = {
+                    "id": bid, "object": "batch", "endpoint": req["endpoint"],
+                    "input_file_id": req["input_file_id"], "completion_window": req["completion_window"],
+                    "status": "in_progress", "created_at": int(time.time()), "metadata": req.get("metadata"),
+                    "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                }
+            threading.Thread(target=_run_batch, args=(bid,), daemon=True).start()
+            return self._send(200, BATCHES[bid])
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_GET(self):
+        m = re.search(r"/batches/([^/]+)$", self.path)
+        if m and m.group(1) in BATCHES:
+            with _lock:
+                return self._send(200, BATCHES[m.group(1)])
+        m = re.search(r"/files/([^/]+)/content$", self.path)
+        if m and m.group(1) in FILES:
+            return self._send(200, FILES[m.group(1)]["data"], "application/octet-stream")
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+
+def serve(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in in a background thread; returns the server (see server_address)."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--batch-delay", type=float, default=1.0, help="Seconds before a batch completes")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Share of batch items returned malformed")
+    args = ap.parse_args()
+    OPTS.update(batch_delay=args.batch_delay, fail_rate=args.fail_rate)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Fake OpenAI API on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()